@@ -5,8 +5,8 @@
 Executes an example task on a Celery worker in the background. Before this file
 is executed, the worker instance has to be started. In this example a single
 solution for a given task is compiled, executed and tested. While building and
-testing runs in the background, this files process sleeps and waits for the
-worker to finish.
+testing runs in the background, this files process blocks until the worker
+announces that the job is finished.
 
 Start this example task:
     ./celery_run.py
@@ -15,7 +15,6 @@ Authors: Christian Wichmann
 """
 
 import celery_tasks
-import time
 import os
 
 
@@ -23,12 +22,10 @@ def build_example():
     # Available tasks: leapyear greaterZero, fizzbuzz
     task_directory = os.path.join('tasks', 'fizzbuzz')
     solution_file = (os.path.join('solutions', 'fizzbuzz', 'user1', 'solution.c'), )
-    building = celery_tasks.build_and_check_task_with_solution.delay(task_directory,
-                                                                     solution_file)
-    while not building.ready():
-        print('Waiting...')
-        time.sleep(0.2)
-    print(building.get())
+    print('Waiting...')
+    report = celery_tasks.submit_and_wait(celery_tasks.submit_solution, task_directory, solution_file,
+                                          user='user1', job_class='interactive', timeout=60)
+    print(report)
 
 
 if __name__ == '__main__':
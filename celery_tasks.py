@@ -15,50 +15,378 @@ Start this worker in background with:
 Stop all workers with:
     ps auxww | grep 'celery worker' | awk '{print $2}' | xargs kill -9
 
+Jobs are divided in two classes with their own queues: "interactive" for
+single submissions by students and "batch" for bulk regrades. Start dedicated
+workers for each queue so that a regrade never starves interactive jobs:
+    celery worker -A celery_tasks -Q interactive &
+    celery worker -A celery_tasks -Q batch,interactive &
+
+Interactive jobs of a single user are rate limited (see FairShareLimiter). If
+jobs are queued by several processes, CONCOCT_FAIR_SHARE_DB has to name a
+database file shared by all of them. Otherwise every process applies the
+limit on its own.
+
+The broker and result backend can be changed through the environment variables
+CONCOCT_BROKER_URL and CONCOCT_RESULT_BACKEND, e.g. to "memory://" for tests.
+
+Workers do not need a shared file system if tasks are sent as bundles (see
+submit_solution_bundle()). Only the digest of the task bundle and the
+compressed solution travel in the message. Every worker fetches a bundle once
+from the bundle store (CONCOCT_BUNDLE_STORE) and caches it on its local disk
+(CONCOCT_BUNDLE_CACHE).
+
+Workers can be started with a high concurrency. The admission controller
+decides how many checks really run at the same time on a host. It adapts this
+limit to the latency of checks and to CPU and memory load (see
+AdmissionController). Interactive jobs are admitted before batch jobs and have
+a reserved slot, so that a regrade never takes all slots of a host. The upper
+bound is set with CONCOCT_MAX_CHECKS and the latency target in seconds with
+CONCOCT_LATENCY_TARGET.
+
+Clients should not poll the result backend while waiting for a job. Workers
+announce every finished job with a message on the exchange "grading.done",
+routed by the Celery task id, and submit_and_wait() blocks until this message
+arrives.
+
 Authors: Christian Wichmann
 """
 
 
+import os
 import sys
+import time
+import socket
+import tempfile
 from celery import Celery
+from celery.signals import task_postrun
+from celery.utils import uuid
+from kombu import Exchange, Queue, Consumer
 from libConCoct.concoct import Task, Solution, ConCoCt
+from libConCoct.store import ReportStore
+from libConCoct.bundle import BundleStore, BundleCache, pack_solution, unpack_solution
+from libConCoct.admission import AdmissionController
+from libConCoct.fairshare import FairShareLimiter
 
 
 # CELERY SETTINGS
-BROKER_URL = 'amqp://'
-BACKEND = 'amqp'
+BROKER_URL = os.environ.get('CONCOCT_BROKER_URL', 'amqp://')
+BACKEND = os.environ.get('CONCOCT_RESULT_BACKEND', 'amqp')
+# directory for reusing unit test results of equivalent submissions, disabled
+# if not set
+RESULT_CACHE_PATH = os.environ.get('CONCOCT_RESULT_CACHE', None)
+# SQLite database file in which all reports are stored, disabled if not set
+REPORT_STORE_PATH = os.environ.get('CONCOCT_REPORT_STORE', None)
+# directory containing all task bundles and local directory of every worker
+# for unpacked bundles
+BUNDLE_STORE_PATH = os.environ.get('CONCOCT_BUNDLE_STORE', 'bundles')
+BUNDLE_CACHE_PATH = os.environ.get('CONCOCT_BUNDLE_CACHE', os.path.join(tempfile.gettempdir(), 'concoct-bundles'))
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 
+# JOB CLASSES
+# Every job class has its own queue and a message priority (0 is lowest, 9 is
+# highest). Priorities only take effect on brokers supporting them (RabbitMQ
+# >= 3.5 with "x-max-priority" set on the queue).
+JOB_CLASSES = {'interactive': {'queue': 'interactive', 'priority': 9},
+               'batch':       {'queue': 'batch',       'priority': 0}}
+DEFAULT_JOB_CLASS = 'interactive'
+
+# FAIR SHARE SETTINGS
+# Every user may submit USER_RATE interactive jobs per second on average with
+# bursts of up to USER_BURST jobs. Further jobs are delayed, not rejected.
+USER_RATE = 0.2
+USER_BURST = 3
+# SQLite database file shared by all processes queueing jobs, without it the
+# limit applies to every process on its own
+FAIR_SHARE_PATH = os.environ.get('CONCOCT_FAIR_SHARE_DB', None)
+
+# ADMISSION SETTINGS
+# maximum number of checks running at the same time on a host (default is two
+# per CPU) and latency of a check that should not be exceeded
+MAX_CHECKS = int(os.environ['CONCOCT_MAX_CHECKS']) if 'CONCOCT_MAX_CHECKS' in os.environ else None
+LATENCY_TARGET = float(os.environ.get('CONCOCT_LATENCY_TARGET', 60))
+
 
 app = Celery('tasks', backend=BACKEND, broker=BROKER_URL)
+grading_exchange = Exchange('grading', type='direct')
+app.conf.update(
+    CELERY_ACCEPT_CONTENT=CELERY_ACCEPT_CONTENT,
+    CELERY_TASK_SERIALIZER=CELERY_TASK_SERIALIZER,
+    CELERY_RESULT_SERIALIZER=CELERY_RESULT_SERIALIZER,
+    CELERY_QUEUES=[Queue(c['queue'], grading_exchange, routing_key=c['queue'],
+                         queue_arguments={'x-max-priority': 10})
+                   for c in JOB_CLASSES.values()],
+    CELERY_DEFAULT_QUEUE=JOB_CLASSES[DEFAULT_JOB_CLASS]['queue'],
+    CELERY_DEFAULT_EXCHANGE=grading_exchange.name,
+    CELERY_DEFAULT_ROUTING_KEY=JOB_CLASSES[DEFAULT_JOB_CLASS]['queue'],
+    # do not let a worker reserve a bunch of long running batch jobs while
+    # interactive jobs are waiting in the queue
+    CELERYD_PREFETCH_MULTIPLIER=1,
+    CELERY_ACKS_LATE=True,
+)
+# exchange on which workers announce finished jobs, routed by the task id
+notify_exchange = Exchange('grading.done', type='direct', durable=False)
+
+
+limiter = FairShareLimiter(rate=USER_RATE, burst=USER_BURST, path=FAIR_SHARE_PATH)
+admission = AdmissionController(max_slots=MAX_CHECKS, latency_target=LATENCY_TARGET)
 
 
 # TODO Remove name parameter here and cleanup imports in Celery worker (this
 #      file) and 'entry' controller.
 @app.task(name='applications.ConCoct.modules.celery_tasks.build_and_check_task_with_solution')
-def build_and_check_task_with_solution(task_store_path, solution_file_list):
+def build_and_check_task_with_solution(task_store_path, solution_file_list, user=None):
     """
     Builds a given task with a given solution by a user. The task defines unit
     tests and helper function that are used to determine, if the task has been
-    sucessfully solved.
+    sucessfully solved. If a report store is configured, the report is stored
+    under the name of the task directory and the given user.
 
     :param task_store_path: path to the task directory containing the task
                             description, configuration file and all source
                             files necessary to build and test the task
     :param solution_file_list: list of files submitted as possible solution for
-                               the given task
+                               the given task or a dictionary with file names
+                               and contents
+    :param user: name of the user who submitted the solution
+    """
+    task_name = os.path.basename(os.path.normpath(task_store_path))
+    return check_solution(task_store_path, solution_file_list, user, task_name)
+
+
+@app.task(name='applications.ConCoct.modules.celery_tasks.build_and_check_task_bundle')
+def build_and_check_task_bundle(task_digest, packed_solution, user=None, task_name=None):
+    """
+    Builds a task given as bundle with a solution sent inline in the message.
+    The bundle is fetched from the bundle store once and cached on the local
+    disk of the worker.
+
+    :param task_digest: digest of the task bundle (see BundleStore)
+    :param packed_solution: files of the solution (see pack_solution())
+    :param user: name of the user who submitted the solution
+    :param task_name: name of the task for storing the report
+    """
+    cache = BundleCache(BUNDLE_CACHE_PATH, BundleStore(BUNDLE_STORE_PATH))
+    try:
+        task_store_path = cache.task_path(task_digest)
+    except FileNotFoundError as e:
+        sys.exit(e)
+    return check_solution(task_store_path, unpack_solution(packed_solution), user, task_name or task_digest)
+
+
+def check_solution(task_store_path, solution_files, user, task_name):
+    """
+    Builds and tests a solution for a task and stores the report if a report
+    store is configured.
+
+    :param solution_files: list of paths or dictionary with file names and
+                           contents of the solution
+    :returns: report as JSON string
     """
     try:
         t = Task(task_store_path)
     except FileNotFoundError as e:
         sys.exit(e)
-    s = Solution(t, solution_file_list)
+    s = create_solution(t, solution_files)
     try:
-        w = ConCoCt()
+        w = ConCoCt(cache_dir=RESULT_CACHE_PATH)
     except FileNotFoundError as e:
         sys.exit(e)
     p = t.get_test_project(s)
-    r = w.check_project(p)
+    # the program of the student is built together with the unit tests, so
+    # that it can be run later
+    m = t.get_main_project(s)
+    # checks of students are admitted before bulk regrades on this host
+    with admission.admit(priority=current_job_class() == 'interactive'):
+        r = w.check_project(p, main_project=m)
+    if REPORT_STORE_PATH:
+        with ReportStore(REPORT_STORE_PATH) as store:
+            store.add(task_name, user, r)
     return r.to_json()
+
+
+def current_job_class():
+    """
+    Determines the job class of the running Celery task by the queue it has
+    been delivered from. Outside of a worker the default class is returned.
+    """
+    from celery import current_task
+    info = current_task.request.delivery_info if current_task else None
+    routing_key = (info or {}).get('routing_key')
+    for name, job_class in JOB_CLASSES.items():
+        if job_class['queue'] == routing_key:
+            return name
+    return DEFAULT_JOB_CLASS
+
+
+def create_solution(task, solution_files):
+    """
+    Creates a solution from a list of paths or, if the solution was sent
+    inline, from a dictionary with file names and contents.
+    """
+    if isinstance(solution_files, dict):
+        return Solution(task, solution_files=solution_files)
+    return Solution(task, solution_files)
+
+
+@app.task(name='applications.ConCoct.modules.celery_tasks.quick_check_task_with_solution')
+def quick_check_task_with_solution(task_store_path, solution_file_list):
+    """
+    Checks a given solution for a task only for errors and warnings of the
+    compiler and CppCheck. Nothing is linked or executed, so this task returns
+    much faster than build_and_check_task_with_solution().
+
+    :param task_store_path: path to the task directory
+    :param solution_file_list: list of files submitted as possible solution for
+                               the given task or a dictionary with file names
+                               and contents
+    """
+    try:
+        t = Task(task_store_path)
+    except FileNotFoundError as e:
+        sys.exit(e)
+    s = create_solution(t, solution_file_list)
+    try:
+        w = ConCoCt(sandbox=False)
+    except FileNotFoundError as e:
+        sys.exit(e)
+    p = t.get_test_project(s)
+    r = w.quick_check(p)
+    return r.to_json()
+
+
+# names of all Celery tasks whose completion is announced
+GRADING_TASKS = frozenset([build_and_check_task_with_solution.name, build_and_check_task_bundle.name,
+                           quick_check_task_with_solution.name])
+
+
+@task_postrun.connect
+def notify_completion(sender=None, task_id=None, retval=None, state=None, **kwargs):
+    """
+    Announces a finished job to the client waiting for it (see
+    submit_and_wait()). If no client is waiting, the broker drops the message.
+    """
+    if sender is None or sender.name not in GRADING_TASKS:
+        return
+    body = {'task_id': task_id, 'state': state}
+    if state == 'SUCCESS':
+        body['report'] = retval
+    else:
+        body['error'] = str(retval)
+    with app.producer_or_acquire() as producer:
+        producer.publish(body, exchange=notify_exchange, routing_key=task_id, declare=[notify_exchange],
+                         serializer='json', retry=True)
+
+
+def submit_and_wait(submit, *args, timeout=None, **kwargs):
+    """
+    Queues a job with the given submit function and blocks until the worker
+    announces that it is finished. Instead of polling the result backend, the
+    client waits for the message of the worker on its own queue, which is
+    declared before the job is queued.
+
+        report = submit_and_wait(submit_solution, task_dir, files, user='user1')
+
+    :param submit: either submit_solution() or submit_solution_bundle()
+    :param timeout: maximum time to wait in seconds or None for no limit
+    :returns: report as JSON string
+    """
+    task_id = uuid()
+    results = []
+
+    def on_message(body, message):
+        results.append(body)
+        message.ack()
+
+    with app.connection() as connection:
+        channel = connection.channel()
+        try:
+            queue = Queue(task_id, notify_exchange, routing_key=task_id, durable=False,
+                          exclusive=True, auto_delete=True)
+            with Consumer(channel, [queue], callbacks=[on_message], accept=['json']):
+                submit(*args, task_id=task_id, **kwargs)
+                deadline = None if timeout is None else time.monotonic() + timeout
+                while not results:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError('Job {} did not finish in time.'.format(task_id))
+                    try:
+                        connection.drain_events(timeout=remaining)
+                    except socket.timeout:
+                        pass
+        finally:
+            channel.close()
+    body = results[0]
+    if body['state'] != 'SUCCESS':
+        raise RuntimeError('Job {} failed: {}'.format(task_id, body.get('error')))
+    return body['report']
+
+
+def submit_solution(task_store_path, solution_file_list, user=None, job_class=DEFAULT_JOB_CLASS, quick=False,
+                    task_id=None):
+    """
+    Puts a solution into the queue of the given job class. This is the entry
+    point that should be used by all clients instead of calling delay() on the
+    Celery task directly. Interactive jobs of a single user are rate limited,
+    batch jobs are not because they are running in their own queue anyway.
+
+    :param task_store_path: path to the task directory
+    :param solution_file_list: list of files submitted as possible solution or
+                               a dictionary with file names and contents
+    :param user: name of the user who submitted the solution
+    :param job_class: either "interactive" or "batch"
+    :param quick: only check the solution for errors without running the unit
+                  tests (see quick_check_task_with_solution())
+    :param task_id: id for the Celery task, generated if not given
+    :returns: AsyncResult object for the queued job
+    """
+    if quick:
+        task, args = quick_check_task_with_solution, (task_store_path, solution_file_list)
+    else:
+        task, args = build_and_check_task_with_solution, (task_store_path, solution_file_list, user)
+    return enqueue(task, args, user, job_class, task_id)
+
+
+def submit_solution_bundle(task_store_path, solution_files, user=None, job_class=DEFAULT_JOB_CLASS, task_id=None):
+    """
+    Puts a solution into the queue like submit_solution(), but sends the task
+    as bundle and the solution inline, so that workers need no access to the
+    file system of the client. The bundle is stored in the bundle store if it
+    is not already there.
+
+    :param task_store_path: path to the task directory
+    :param solution_files: list of files submitted as possible solution or a
+                           dictionary with file names and contents
+    :param user: name of the user who submitted the solution
+    :param job_class: either "interactive" or "batch"
+    :param task_id: id for the Celery task, generated if not given
+    :returns: AsyncResult object for the queued job
+    """
+    task_digest = BundleStore(BUNDLE_STORE_PATH).put_task(task_store_path)
+    task_name = os.path.basename(os.path.normpath(task_store_path))
+    args = (task_digest, pack_solution(solution_files), user, task_name)
+    return enqueue(build_and_check_task_bundle, args, user, job_class, task_id)
+
+
+def enqueue(task, args, user, job_class, task_id=None):
+    """
+    Puts a Celery task into the queue of the given job class. Interactive jobs
+    of a single user are rate limited, batch jobs are not because they are
+    running in their own queue anyway.
+
+    :returns: AsyncResult object for the queued job
+    """
+    try:
+        options = JOB_CLASSES[job_class]
+    except KeyError:
+        raise ValueError('Unknown job class: {}'.format(job_class))
+    countdown = 0
+    if user is not None and job_class == 'interactive':
+        countdown = limiter.acquire(user)
+    return task.apply_async(args,
+                            queue=options['queue'],
+                            routing_key=options['queue'],
+                            priority=options['priority'],
+                            countdown=countdown,
+                            task_id=task_id)
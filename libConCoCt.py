@@ -27,6 +27,8 @@ import argparse
 from libConCoct.concoct import Task
 from libConCoct.concoct import Solution
 from libConCoct.concoct import ConCoCt
+from libConCoct.watch import WatchSession
+from libConCoct.compiler import COMPILERS
 
 
 __version__ = '0.1.0'
@@ -36,10 +38,15 @@ def parse_args():
     parser = argparse.ArgumentParser(description='libConCoct - Builds simple C programs and runs unit tests.',
                                      epilog='Copyright 2015 by Martin and Christian Wichmann')
     parser.add_argument('-u', '--unittest', action='store_true', help='run unit tests on solution')
+    parser.add_argument('-q', '--quick', action='store_true', help='only check solution for errors without running unit tests')
     parser.add_argument('-p', '--project', action='store_true', help='create CodeBlocks project for task')
+    parser.add_argument('-w', '--watch', action='store_true', help='check again after every change of task or solution (with -u or -q)')
+    parser.add_argument('-c', '--calibrate', action='store_true', help='derive limits for task from its reference solution')
+    parser.add_argument('--runs', type=int, default=5, help='number of runs of the reference solution for calibration')
     parser.add_argument('--project-file-name', help='name of the ZIP file containing the CodeBlocks project')
     parser.add_argument('-t', '--task', required=True, help='task to run unit tests or create project file for')
     parser.add_argument('-s', '--solution', type=argparse.FileType('r'), help='solution to test against unit tests')
+    parser.add_argument('--compiler', choices=sorted(COMPILERS), help='compiler used instead of the one chosen by the task')
     parser.add_argument('-b', '--backend', choices=['vm', 'docker'], default='vm', help='backend used for running unit tests in secure environment')
     cmd_options = parser.parse_args()
     return cmd_options
@@ -88,8 +95,17 @@ def build_project_examples():
 
 def run_libconcoct():
     options = parse_args()
-    if not options.unittest and not options.project:
-        print('No action ("unittest" or "project") chosen!')
+    if not options.unittest and not options.quick and not options.project and not options.calibrate:
+        print('No action ("unittest", "quick", "project" or "calibrate") chosen!')
+        return
+    if options.watch and (options.unittest or options.quick):
+        try:
+            session = WatchSession(options.task, [options.solution.name] if options.solution else None,
+                                   backend=options.backend, quick=options.quick,
+                                   compiler=options.compiler)
+        except FileNotFoundError as e:
+            sys.exit(e)
+        session.run()
         return
     t = Task(options.task)
     if options.solution:
@@ -99,12 +115,31 @@ def run_libconcoct():
     if options.unittest:
         print('Using backend: {}'.format(options.backend))
         try:
-            w = ConCoCt(backend=options.backend)
+            w = ConCoCt(backend=options.backend, compiler=options.compiler)
+        except FileNotFoundError as e:
+            sys.exit(e)
+        p = t.get_test_project(s)
+        r = w.check_project(p, main_project=t.get_main_project(s))
+        print(r)
+    elif options.quick:
+        try:
+            w = ConCoCt(sandbox=False, compiler=options.compiler)
         except FileNotFoundError as e:
             sys.exit(e)
         p = t.get_test_project(s)
-        r = w.check_project(p)
+        r = w.quick_check(p)
         print(r)
+    elif options.calibrate:
+        # the reference solution is run on the local host, not in the sandbox
+        try:
+            w = ConCoCt(sandbox=False, compiler=options.compiler)
+        except FileNotFoundError as e:
+            sys.exit(e)
+        limits = w.calibrate_task(t, runs=options.runs)
+        if limits is None:
+            sys.exit('Calibration failed!')
+        print('Limits: {}'.format(limits))
+        t.save_limits(limits)
     elif options.project:
         p = t.get_main_project(s)
         if 'project-file-name' in options:
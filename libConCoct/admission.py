@@ -0,0 +1,325 @@
+"""
+Contains a class to adapt the number of checks running at the same time on a
+host to its load.
+
+Workers are started with more processes than the host can serve. Every check
+has to be admitted before it starts. The number of admitted checks is limited
+and the limit is adapted to the load like the congestion window of TCP: it is
+raised by one while checks are waiting and the host is healthy, and cut by a
+factor as soon as the host is overloaded. The host counts as overloaded if the
+latency of recent checks exceeds a target, the load average per CPU is too
+high or too little memory is available.
+
+Checks with priority, e.g. submissions of students, are admitted before all
+other checks, e.g. bulk regrades. Other checks are not admitted while a check
+with priority is waiting, and the highest slots below the limit are reserved
+for checks with priority, so that they never wait until a regrade has left.
+
+The limit, the recent latencies and all admitted and waiting checks are shared
+by all worker processes on a host through lock and state files. Locks of
+crashed processes are released automatically by the kernel.
+
+The admission controller limits whole checks, i.e. building and testing. The
+CpuPlacer of the Docker runner additionally gives every running container its
+own CPU core. With more slots than cores, admitted checks compile in parallel
+and may wait for a free core before their tests run. This waiting time counts
+as latency, so the limit is cut if checks pile up in front of the cores.
+
+Authors: Martin Wichmann, Christian Wichmann
+"""
+
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+def load_per_cpu():
+    """
+    :returns: load average of the last minute divided by the number of CPUs
+    """
+    return os.getloadavg()[0] / (os.cpu_count() or 1)
+
+
+def available_memory():
+    """
+    :returns: fraction of the memory that is available for new processes or
+              None if it can not be determined
+    """
+    info = {}
+    try:
+        with open('/proc/meminfo', 'r') as fd:
+            for line in fd:
+                key, value = line.split(':', 1)
+                info[key] = int(value.split()[0])
+    except (OSError, ValueError):
+        return None
+    if 'MemAvailable' not in info or not info.get('MemTotal'):
+        return None
+    return info['MemAvailable'] / info['MemTotal']
+
+
+class AdmissionController(object):
+    """
+    Admits checks on this host, waiting if the current limit is reached.
+
+    >>> with controller.admit():
+    ...     report = concoct.check_project(project)
+
+    :ivar max_slots:      upper bound for the limit
+    :ivar min_slots:      lower bound for the limit
+    :ivar initial_slots:  limit before any check has finished
+    :ivar latency_target: latency of checks in seconds that should not be
+                          exceeded by the 90th percentile of recent checks
+    :ivar max_load:       load average per CPU above which the host counts as
+                          overloaded
+    :ivar min_memory:     fraction of available memory below which the host
+                          counts as overloaded
+    :ivar interval:       minimum time between two changes of the limit
+    :ivar reserved_slots: number of slots below the limit only used by checks
+                          with priority, checks without priority get at least
+                          one slot
+    """
+    def __init__(self, max_slots=None, min_slots=1, initial_slots=None, latency_target=60.0, max_load=1.5,
+                 min_memory=0.1, state_dir=None, window=20, interval=5.0, decrease=0.75, poll_interval=0.1,
+                 reserved_slots=1):
+        cpus = len(os.sched_getaffinity(0))
+        if max_slots is None:
+            max_slots = 2 * cpus
+        if initial_slots is None:
+            initial_slots = cpus
+        if state_dir is None:
+            state_dir = os.path.join(tempfile.gettempdir(), 'concoct-admission')
+        self.max_slots = max_slots
+        self.min_slots = min(min_slots, max_slots)
+        self.initial_slots = max(self.min_slots, min(initial_slots, max_slots))
+        self.latency_target = latency_target
+        self.max_load = max_load
+        self.min_memory = min_memory
+        self.state_dir = state_dir
+        self.window = window
+        self.interval = interval
+        self.decrease = decrease
+        self.poll_interval = poll_interval
+        self.reserved_slots = reserved_slots
+        os.makedirs(self.state_dir, exist_ok=True)
+
+    def admit(self, priority=True):
+        """
+        Returns a context manager that waits until the check is admitted on
+        entering and records its latency on exit.
+
+        :param priority: whether the check is admitted before checks without
+                         priority and may use the reserved slots
+        """
+        return _Admission(self, priority)
+
+    def try_acquire(self, limit):
+        """
+        Tries to lock a free slot below the limit without waiting.
+
+        :returns: file descriptor of the locked slot or None
+        """
+        for slot in range(limit):
+            fd = os.open(os.path.join(self.state_dir, 'slot{}.lock'.format(slot)), os.O_RDWR | os.O_CREAT, 0o666)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                continue
+            return fd
+        return None
+
+    def acquire(self, priority=True):
+        """
+        Locks a slot and waits while the limit is reached. Waiting checks
+        announce themselves with a lock file, so that they are counted as
+        queue depth by all processes.
+
+        :param priority: whether the check has priority (see admit())
+        :returns: file descriptor of the locked slot
+        """
+        waiter = None
+        try:
+            while True:
+                fd = None
+                limit = self.limit()
+                if priority:
+                    fd = self.try_acquire(limit)
+                elif not self.waiting(priority=True):
+                    fd = self.try_acquire(max(1, limit - self.reserved_slots))
+                if fd is not None:
+                    return fd
+                if waiter is None:
+                    path = os.path.join(self.state_dir, 'wait-{}-{}-{}.lock'.format(
+                                        'p' if priority else 'n', os.getpid(), threading.get_ident()))
+                    waiter_fd = self._create_locked(path)
+                    waiter = path
+                    print('Host at its limit for concurrent checks, waiting...')
+                time.sleep(self.poll_interval)
+        finally:
+            if waiter is not None:
+                self._remove(waiter)
+                os.close(waiter_fd)
+
+    def release(self, fd, latency):
+        """
+        Unlocks a slot and adapts the limit to the latency of the check and
+        the load of the host.
+
+        :param fd: file descriptor returned by acquire()
+        :param latency: time in seconds the check needed after its admission
+        """
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+        self.update_state(lambda state: self.adapt(state, latency))
+
+    def limit(self):
+        """
+        :returns: current number of checks admitted at the same time
+        """
+        return self.update_state()['limit']
+
+    def waiting(self, priority=False):
+        """
+        :param priority: count only checks with priority
+        :returns: number of checks of all processes waiting for admission
+        """
+        count = 0
+        for name in os.listdir(self.state_dir):
+            if not name.startswith('wait-p-' if priority else 'wait-'):
+                continue
+            path = os.path.join(self.state_dir, name)
+            try:
+                fd = os.open(path, os.O_RDWR)
+            except FileNotFoundError:
+                continue
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                # not counted if the check has just been admitted
+                if os.fstat(fd).st_nlink > 0:
+                    count += 1
+            else:
+                # lock file of a crashed process, unless the check has removed
+                # its file after it was opened here
+                if self._is_same_file(fd, path):
+                    self._remove(path)
+            finally:
+                os.close(fd)
+        return count
+
+    def _create_locked(self, path):
+        """
+        Creates a lock file that is already locked when it appears under its
+        name, so that no other process takes it for the file of a crashed
+        process.
+
+        :returns: file descriptor of the locked file
+        """
+        fd, temp = tempfile.mkstemp(prefix='new-', dir=self.state_dir)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            os.rename(temp, path)
+        except BaseException:
+            os.close(fd)
+            self._remove(temp)
+            raise
+        return fd
+
+    @staticmethod
+    def _is_same_file(fd, path):
+        try:
+            info = os.stat(path)
+        except FileNotFoundError:
+            return False
+        current = os.fstat(fd)
+        return (info.st_dev, info.st_ino) == (current.st_dev, current.st_ino)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    def overloaded(self, latencies):
+        """
+        :param latencies: latencies of recent checks in seconds
+        :returns: reason why the host is overloaded or None
+        """
+        if latencies:
+            latency = sorted(latencies)[int(0.9 * (len(latencies) - 1))]
+            if latency > self.latency_target:
+                return 'latency {:.1f}s'.format(latency)
+        load = load_per_cpu()
+        if load > self.max_load:
+            return 'load {:.2f} per CPU'.format(load)
+        memory = available_memory()
+        if memory is not None and memory < self.min_memory:
+            return 'only {:.0%} memory available'.format(memory)
+        return None
+
+    def adapt(self, state, latency):
+        """
+        Records the latency of a check and changes the limit, if the last
+        change is long enough ago. The limit is cut if the host is overloaded
+        and raised by one if checks are waiting.
+        """
+        state['latencies'] = (state['latencies'] + [latency])[-self.window:]
+        now = time.time()
+        if now - state['changed'] < self.interval:
+            return
+        reason = self.overloaded(state['latencies'])
+        limit = state['limit']
+        if reason:
+            limit = max(self.min_slots, int(limit * self.decrease))
+            # only latencies with the new limit count for the next change
+            state['latencies'] = []
+        elif limit < self.max_slots and self.waiting() > 0:
+            limit += 1
+        if limit != state['limit']:
+            print('Limit for concurrent checks changed from {} to {}{}.'.format(
+                  state['limit'], limit, ' ({})'.format(reason) if reason else ''))
+            state['limit'] = limit
+            state['changed'] = now
+
+    def update_state(self, func=None):
+        """
+        Reads the state shared by all processes and optionally changes it
+        while holding a lock on the state file.
+
+        :param func: function called with the state dictionary to change it
+        :returns: state dictionary
+        """
+        with open(os.path.join(self.state_dir, 'state.json'), 'a+') as fd:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            fd.seek(0)
+            data = fd.read()
+            state = json.loads(data) if data else {'limit': self.initial_slots, 'latencies': [], 'changed': 0}
+            state['limit'] = max(self.min_slots, min(self.max_slots, state['limit']))
+            if func is not None:
+                func(state)
+                fd.seek(0)
+                fd.truncate()
+                json.dump(state, fd)
+        return state
+
+
+class _Admission(object):
+    def __init__(self, controller, priority=True):
+        self.controller = controller
+        self.priority = priority
+        self.fd = None
+        self.start = None
+
+    def __enter__(self):
+        self.fd = self.controller.acquire(self.priority)
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.controller.release(self.fd, time.monotonic() - self.start)
+        self.fd = None
@@ -0,0 +1,152 @@
+"""
+Contains a class to analyse the unit test results of many submissions for a
+task at once.
+
+All results are stored in a dense matrix with one row per submission and one
+column per unit test, so that all statistics can be computed with vectorized
+NumPy operations instead of looping over the dictionaries of single reports.
+
+Authors: Martin Wichmann, Christian Wichmann
+"""
+
+import numpy as np
+
+from .report import Report
+
+
+# values in the result matrix
+PASSED = 1
+FAILED = 0
+NOT_RUN = -1
+
+
+class ResultMatrix(object):
+    """
+    Holds the unit test results of many submissions for a single task.
+
+    :ivar results:   int8 array (submissions x tests) containing PASSED, FAILED
+                     or NOT_RUN (e.g. if the submission did not compile)
+    :ivar tests:     list of tuples (suite, test) naming the columns
+    :ivar users:     array with user of every submission
+    :ivar submitted: array with time of submission of every submission
+    """
+    def __init__(self, results, tests, users=None, submitted=None):
+        self.results = np.asarray(results, dtype=np.int8)
+        self.tests = list(tests)
+        count = self.results.shape[0]
+        self.users = np.asarray(users if users is not None else [None] * count, dtype=object)
+        self.submitted = np.asarray(submitted if submitted is not None else np.arange(count), dtype=float)
+
+    @classmethod
+    def from_reports(cls, reports, users=None, submitted=None):
+        """
+        Builds the matrix from a list of reports. Tests that are missing in a
+        report are marked as NOT_RUN.
+
+        :param reports: list of Report objects or their JSON representation
+        :param users: list with the user of every report
+        :param submitted: list with the time of submission of every report
+        """
+        rows = []
+        for report in reports:
+            if not isinstance(report, Report):
+                report = Report.from_json(report)
+            row = {}
+            for part in report.parts:
+                for suite, results in (part.tests or {}).items():
+                    for test, result in results.items():
+                        row[(suite, test)] = result
+            rows.append(row)
+        tests = sorted(set().union(*rows)) if rows else []
+        column = {t: i for i, t in enumerate(tests)}
+        results = np.full((len(rows), len(tests)), NOT_RUN, dtype=np.int8)
+        for i, row in enumerate(rows):
+            for t, result in row.items():
+                results[i, column[t]] = PASSED if result else FAILED
+        return cls(results, tests, users, submitted)
+
+    @classmethod
+    def from_store(cls, store, task):
+        """
+        Builds the matrix for all submissions of a task in a ReportStore
+        without loading the reports themselves.
+
+        :param store: ReportStore containing the submissions
+        :param task: name of the task
+        """
+        submissions = store.query_submissions(task=task)
+        ids = np.array([s['id'] for s in submissions], dtype=np.int64)
+        users = [s['user'] for s in submissions]
+        submitted = [s['submitted'] for s in submissions]
+        rows = store.query_tests(task=task)
+        names = np.array(['{}\0{}'.format(r['suite'], r['test']) for r in rows], dtype=object)
+        unique_names, columns = np.unique(names, return_inverse=True) if len(rows) else ([], np.array([], dtype=int))
+        tests = [tuple(n.split('\0', 1)) for n in unique_names]
+        # find the row of every test result by bisection in the sorted submission ids
+        order = np.argsort(ids)
+        test_ids = np.array([r['submission_id'] for r in rows], dtype=np.int64)
+        row_index = order[np.searchsorted(ids[order], test_ids)]
+        results = np.full((len(ids), len(tests)), NOT_RUN, dtype=np.int8)
+        results[row_index, columns] = np.array([r['result'] for r in rows], dtype=np.int8)
+        return cls(results, tests, users, submitted)
+
+    def pass_rates(self):
+        """
+        :returns: array with the fraction of submissions passing each test, only
+                  counting submissions in which the test has been run (NaN if
+                  a test has never been run)
+        """
+        run = (self.results != NOT_RUN).sum(axis=0)
+        passed = (self.results == PASSED).sum(axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(run > 0, passed / np.maximum(run, 1), np.nan)
+
+    def hardest_tests(self, count=10):
+        """
+        :param count: number of tests to return
+        :returns: list of tuples ((suite, test), pass rate) for the tests with
+                  the lowest pass rates, hardest test first
+        """
+        rates = self.pass_rates()
+        order = np.argsort(np.where(np.isnan(rates), np.inf, rates), kind='stable')[:count]
+        return [(self.tests[i], float(rates[i])) for i in order if not np.isnan(rates[i])]
+
+    def co_failure_correlation(self):
+        """
+        Calculates the Pearson correlation between the failures of all pairs of
+        tests. High values show tests that usually fail together, e.g. because
+        they depend on the same mistake.
+
+        :returns: array (tests x tests) of correlation coefficients, NaN for
+                  tests that always or never fail
+        """
+        failures = (self.results == FAILED).astype(float)
+        count = max(len(failures), 1)
+        centered = failures - failures.sum(axis=0) / count
+        covariance = np.dot(centered.T, centered) / count
+        deviation = np.sqrt(np.diag(covariance))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            correlation = covariance / np.outer(deviation, deviation)
+        correlation[(deviation == 0)[:, None] | (deviation == 0)[None, :]] = np.nan
+        return correlation
+
+    def user_progress(self):
+        """
+        Calculates the fraction of passed tests of every submission and groups
+        them by user in order of submission. Submissions without user are
+        skipped.
+
+        :returns: dictionary with an array of pass fractions for every user
+        """
+        if not self.tests:
+            fractions = np.zeros(len(self.results))
+        else:
+            fractions = (self.results == PASSED).sum(axis=1) / len(self.tests)
+        known = np.array([u is not None for u in self.users], dtype=bool)
+        if not known.any():
+            return {}
+        unique_users, codes = np.unique(self.users[known], return_inverse=True)
+        order = np.lexsort((self.submitted[known], codes))
+        starts = np.searchsorted(codes[order], np.arange(len(unique_users)))
+        groups = np.split(fractions[known][order], starts[1:])
+        return dict(zip(unique_users.tolist(), groups))
@@ -0,0 +1,173 @@
+"""
+Contains functions to distribute tasks as content-addressed bundles and to
+transfer solutions inline in compressed form.
+
+A bundle is a reproducible tar.gz archive of a task directory. It is named by
+the SHA-256 digest of its content, so a message only has to carry the digest.
+Workers fetch every bundle once from a bundle store and cache it unpacked on
+their local disk. No shared file system between the workers is necessary.
+
+Authors: Martin Wichmann, Christian Wichmann
+"""
+
+import base64
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import zlib
+
+
+def create_bundle(task_path):
+    """
+    Packs a task directory into a tar.gz archive. The archive only depends on
+    the names and contents of the files, so packing an unchanged task again
+    always results in the same digest.
+
+    :param task_path: path to the task directory
+    :returns: bytes containing the archive
+    """
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode='wb', mtime=0) as compressed:
+        with tarfile.open(fileobj=compressed, mode='w', format=tarfile.GNU_FORMAT) as tar:
+            for root, dirs, files in os.walk(task_path):
+                dirs.sort()
+                for f in sorted(files):
+                    path = os.path.join(root, f)
+                    info = tarfile.TarInfo(os.path.relpath(path, task_path).replace(os.sep, '/'))
+                    info.size = os.path.getsize(path)
+                    info.mode = 0o644
+                    with open(path, 'rb') as fd:
+                        tar.addfile(info, fd)
+    return buffer.getvalue()
+
+
+def bundle_digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class BundleStore(object):
+    """
+    Stores bundles by their digest in a local directory. This is a stand-in
+    for a central blob store (e.g. an object storage or HTTP server) that all
+    workers can reach.
+    """
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(self.path, exist_ok=True)
+
+    def put(self, data):
+        """
+        :param data: bytes containing a bundle
+        :returns: digest of the bundle
+        """
+        digest = bundle_digest(data)
+        file_name = os.path.join(self.path, digest + '.tar.gz')
+        if not os.path.exists(file_name):
+            fd, temp_name = tempfile.mkstemp(dir=self.path)
+            with os.fdopen(fd, 'wb') as temp_file:
+                temp_file.write(data)
+            os.replace(temp_name, file_name)
+        return digest
+
+    def put_task(self, task_path):
+        """
+        Packs a task directory and stores it as bundle.
+
+        :returns: digest of the bundle
+        """
+        return self.put(create_bundle(task_path))
+
+    def get(self, digest):
+        """
+        :returns: bytes containing the bundle
+        :raises FileNotFoundError: if there is no bundle with this digest
+        """
+        with open(os.path.join(self.path, digest + '.tar.gz'), 'rb') as fd:
+            return fd.read()
+
+
+class BundleCache(object):
+    """
+    Keeps unpacked bundles on the local disk of a worker. Every bundle is
+    fetched from the store only once and verified against its digest.
+    """
+    def __init__(self, path, store):
+        self.path = path
+        self.store = store
+        os.makedirs(self.path, exist_ok=True)
+
+    def task_path(self, digest):
+        """
+        Returns the path to the unpacked task directory of a bundle. If the
+        bundle is not cached yet, it is fetched from the store and unpacked.
+
+        :param digest: digest of the bundle
+        :returns: path to a task directory
+        """
+        if len(digest) != 64 or not all(c in '0123456789abcdef' for c in digest):
+            raise ValueError('Invalid bundle digest: {}'.format(digest))
+        target = os.path.join(self.path, digest)
+        if os.path.isdir(target):
+            return target
+        data = self.store.get(digest)
+        if bundle_digest(data) != digest:
+            raise ValueError('Bundle {} is corrupted.'.format(digest))
+        # unpack into a temporary directory and rename it afterwards, so that
+        # concurrent workers never see a partially unpacked task
+        temp_dir = tempfile.mkdtemp(dir=self.path)
+        try:
+            with tarfile.open(fileobj=io.BytesIO(data), mode='r:gz') as tar:
+                for member in tar:
+                    # only regular files inside the task directory, but names
+                    # like "..solution.c" are fine
+                    name = os.path.normpath(member.name)
+                    if (not member.isfile() or os.path.isabs(name) or name == os.curdir or
+                            os.pardir in name.split(os.sep)):
+                        raise ValueError('Invalid file in bundle: {}'.format(member.name))
+                    path = os.path.join(temp_dir, name)
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    with tar.extractfile(member) as src, open(path, 'wb') as dst:
+                        shutil.copyfileobj(src, dst)
+            os.rename(temp_dir, target)
+        except OSError:
+            # another worker has unpacked the same bundle in the meantime
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            if not os.path.isdir(target):
+                raise
+        except Exception:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
+        return target
+
+
+def pack_solution(solution_files):
+    """
+    Packs the files of a solution for sending them inline in a message. The
+    files are compressed and encoded as Base64, so they can be sent with the
+    JSON serializer of Celery.
+
+    :param solution_files: dictionary with file names and their contents as
+                           strings or a list of paths to files
+    :returns: string containing the packed solution
+    """
+    if not isinstance(solution_files, dict):
+        contents = {}
+        for f in solution_files:
+            with open(f, 'r') as fd:
+                contents[os.path.basename(f)] = fd.read()
+        solution_files = contents
+    data = json.dumps(solution_files).encode('utf-8')
+    return base64.b64encode(zlib.compress(data)).decode('ascii')
+
+
+def unpack_solution(packed):
+    """
+    :param packed: string returned by pack_solution()
+    :returns: dictionary with file names and their contents
+    """
+    return json.loads(zlib.decompress(base64.b64decode(packed)).decode('utf-8'))
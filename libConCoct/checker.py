@@ -11,6 +11,7 @@ import xml.etree.ElementTree
 
 from .report import Message
 from .report import ReportPart
+from .output import DEFAULT_OUTPUT_LIMIT, capture_process, truncation_info
 
 
 class CppCheckParser(object):
@@ -18,37 +19,56 @@ class CppCheckParser(object):
         # severity: error, warning, style, performance, portability, information
         # location: multiple locations possible, first is primary
         messages = []
-        tree = xml.etree.ElementTree.fromstring(data)
-        errors = tree.findall('errors/error')
-        for e in errors:
-            locations = e.findall('location')
-            _file = ''
-            line  = ''
-            for l in locations:
-                _file = l.attrib['file']
-                line  = l.attrib['line']
-                # first location is primary
-                break
-            messages.append(Message(_type=e.attrib['severity'], _file=_file, line=line, desc=e.attrib['verbose']))
+        # parse incrementally, so that all complete errors can be used even if
+        # the output has been truncated and is no valid XML anymore
+        parser = xml.etree.ElementTree.XMLPullParser(events=('end', ))
+        try:
+            parser.feed(data)
+            parser.close()
+        except xml.etree.ElementTree.ParseError:
+            pass
+        try:
+            for _, e in parser.read_events():
+                if e.tag != 'error':
+                    continue
+                locations = e.findall('location')
+                _file = ''
+                line  = ''
+                for l in locations:
+                    _file = l.attrib['file']
+                    line  = l.attrib['line']
+                    # first location is primary
+                    break
+                messages.append(Message(_type=e.attrib['severity'], _file=_file, line=line, desc=e.attrib['verbose']))
+        except xml.etree.ElementTree.ParseError:
+            pass
         return messages
 
 
 class CppCheck(object):
-    def __init__(self):
+    """
+    Runs CppCheck on all source files of a project. The checks to be enabled
+    can be chosen, e.g. "all" for a full check or "warning" for a reduced set
+    of checks that runs faster and only reports probable bugs.
+    """
+    def __init__(self, output_limit=DEFAULT_OUTPUT_LIMIT, enable='all'):
         self.parser = CppCheckParser()
+        self.output_limit = output_limit
+        self.enable = enable
 
     def check(self, project):
         cmd  = ['cppcheck']
         # do not let CppCheck complain when it is to stupid to find systems includes
         cmd += ['--suppress=missingIncludeSystem']
         cmd += ['-I{include}'.format(include=include) for include in project.include]
-        cmd += ['--std=c99', '--enable=all', '--xml-version=2']
+        cmd += ['--std=c99', '--enable={}'.format(self.enable), '--xml-version=2']
         cmd += project.file_list
 
-        proc = subprocess.Popen(cmd, universal_newlines=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        outs, errs = proc.communicate()
-        messages = self.parser.parse(errs)
-        return ReportPart('cppcheck', proc.returncode, messages)
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        outs, errs = capture_process(proc, self.output_limit)
+        messages = self.parser.parse(errs.getvalue())
+        return ReportPart('cppcheck', proc.returncode, messages,
+                          truncated=truncation_info(stdout=outs, stderr=errs))
 
 
 
@@ -1,21 +1,30 @@
 
 """
-Contains a frontend for the GCC compiler and a parser to get messages from
-standard output of the compiler.
+Contains frontends for C compilers and parsers to get messages from the
+standard output of the compilers.
+
+Besides GCC, which is used for graded runs by default, Clang and the Tiny C
+Compiler (TCC) are supported. TCC compiles small programs many times faster
+than GCC and is suited for quick feedback (see ConCoCt.quick_check()). Tasks
+choose compilers in their configuration file (see Task), all compilers can be
+created by name with get_compiler().
 
 Authors: Martin Wichmann, Christian Wichmann
 """
 
 import re
 import os
+import shutil
+import tempfile
 import subprocess
 
 from .report import Message
 from .report import ReportPart
+from .output import DEFAULT_OUTPUT_LIMIT, capture_process, truncation_info
 
 
 class CompilerGccParser(object):
-    gcc_patterns = [{'type': 'ignore',  'file': None, 'line': None, 'desc': None, 'pattern': r"""(.*?):(\d+):(\d+:)? .*\(Each undeclared identifier is reported only once.*"""},
+    gcc_patterns = [{'type': 'ignore',  'file': None, 'line': None, 'desc': None, 'pattern': r"""(.*?):(\d+):(\d+:)? .*\(?[Ee]ach undeclared identifier is reported only once.*"""},
                     {'type': 'ignore',  'file': None, 'line': None, 'desc': None, 'pattern': r"""(.*?):(\d+):(\d+:)? .*for each function it appears in.\).*"""},
                     {'type': 'ignore',  'file': None, 'line': None, 'desc': None, 'pattern': r"""(.*?):(\d+):(\d+:)? .*this will be reported only once per input file.*"""},
                     {'type': 'error',   'file': 0,    'line': 1,    'desc': 3,    'pattern': r"""(.*?):(\d+):(\d+:)? [Ee]rror: ([`'"](.*)['"] undeclared .*)"""},
@@ -29,12 +38,12 @@ class CompilerGccParser(object):
                     {'type': 'warning', 'file': 0,    'line': 1,    'desc': 6,    'pattern': r"""(.*?):(\d+):(\d+:)?\s*(([Ww]arning)|(WARNING)): (.*)"""},
                     {'type': 'info',    'file': 0,    'line': 1,    'desc': 8,    'pattern': r"""(.*?):(\d+):(\d+:)?\s*(([Nn]ote)|(NOTE)|([Ii]nfo)|(INFO)): (.*)"""},
                     {'type': 'error',   'file': 0,    'line': 1,    'desc': 3,    'pattern': r"""(.*?):(\d+):(\d+:)? (.*)"""}]
-    ld_patterns =  [{'type': 'ignore',  'file': 0,    'line': None, 'desc': 2,    'pattern': r"""(.*?):?(\(\.\w+\+.*\))?:\s*(In function [`'"](.*)['"]:)"""},
+    ld_patterns =  [{'type': 'ignore',  'file': 0,    'line': None, 'desc': 2,    'pattern': r"""(.*?):?(\(\.\w+\+.*\))?:\s*([Ii]n function [`'"](.*)['"]:)"""},
                     {'type': 'warning', 'file': 0,    'line': 1,    'desc': 4,    'pattern': r"""(.*?):(\d+):(\d+:)? ([Ww]arning:)?\s*(the use of [`'"](.*)['"] is dangerous, better use [`'"](.*)['"].*)"""},
                     {'type': 'warning', 'file': 0,    'line': None, 'desc': 1,    'pattern': r"""(.*?):?\(\.\w+\+.*\): [Ww]arning:? (.*)"""},
                     {'type': 'error',   'file': 0,    'line': None, 'desc': 1,    'pattern': r"""(.*?):?\(\.\w+\+.*\): (.*)"""},
-                    {'type': 'warning', 'file': None, 'line': None, 'desc': 2,    'pattern': r"""(.*[/\\])?ld(\.exe)?: [Ww]arning:? (.*)"""},
-                    {'type': 'error',   'file': None, 'line': None, 'desc': 2,    'pattern': r"""(.*[/\\])?ld(\.exe)?: (.*)"""}]
+                    {'type': 'warning', 'file': None, 'line': None, 'desc': 2,    'pattern': r"""(.*[/\\])?ld(?:\.\w+)?(\.exe)?: [Ww]arning:? (.*)"""},
+                    {'type': 'error',   'file': None, 'line': None, 'desc': 2,    'pattern': r"""(.*[/\\])?ld(?:\.\w+)?(\.exe)?: (?:[Ee]rror: )?(.*)"""}]
     for p in gcc_patterns:
         p['cpattern'] = re.compile(p['pattern'])
     for p in ld_patterns:
@@ -51,8 +60,8 @@ class CompilerGccParser(object):
                     _file = None if p['file'] is None else groups[p['file']]
                     line  = None if p['line'] is None else groups[p['line']]
                     desc  = None if p['desc'] is None else groups[p['desc']]
-                    m = Message(_type=_type, _file=_file, line=line, desc=desc)
-                    messages.append(m)
+                    if _type != 'ignore':
+                        messages.append(Message(_type=_type, _file=_file, line=line, desc=desc))
                     break
             for p in CompilerGccParser.ld_patterns:
                 match = p['cpattern'].match(l)
@@ -62,31 +71,277 @@ class CompilerGccParser(object):
                     _file = None if p['file'] is None else groups[p['file']]
                     line  = None if p['line'] is None else groups[p['line']]
                     desc  = None if p['desc'] is None else groups[p['desc']]
-                    m = Message(_type=_type, _file=_file, line=line, desc=desc)
-                    messages.append(m)
+                    if _type != 'ignore':
+                        messages.append(Message(_type=_type, _file=_file, line=line, desc=desc))
+                    break
+        return messages
+
+
+class CompilerClangParser(CompilerGccParser):
+    """
+    Parses messages of Clang. They have the same format as messages of GCC,
+    only the errors of the compiler driver itself, e.g. when the linker
+    failed, have to be handled additionally.
+    """
+    clang_patterns = [{'type': 'error', 'file': None, 'line': None, 'desc': 1, 'pattern': r"""clang(-[\d.]+)?: (?:fatal )?error: (.*)"""}]
+    for p in clang_patterns:
+        p['cpattern'] = re.compile(p['pattern'])
+
+    def parse(self, data):
+        messages = super(CompilerClangParser, self).parse(data)
+        for l in data.split('\n'):
+            for p in CompilerClangParser.clang_patterns:
+                match = p['cpattern'].match(l)
+                if match is not None:
+                    messages.append(Message(_type=p['type'], _file=None, line=None, desc=match.groups()[p['desc']]))
+                    break
+        return messages
+
+
+class CompilerTccParser(CompilerGccParser):
+    """
+    Parses messages of TCC. Messages for source files have the same format as
+    messages of GCC without column, errors of the linker are reported by tcc
+    itself.
+    """
+    tcc_patterns = [{'type': 'warning', 'file': None, 'line': None, 'desc': 0, 'pattern': r"""tcc: [Ww]arning: (.*)"""},
+                    {'type': 'error',   'file': None, 'line': None, 'desc': 0, 'pattern': r"""tcc: (?:[Ee]rror: )?(.*)"""}]
+    for p in tcc_patterns:
+        p['cpattern'] = re.compile(p['pattern'])
+
+    def parse(self, data):
+        messages = super(CompilerTccParser, self).parse(data)
+        for l in data.split('\n'):
+            for p in CompilerTccParser.tcc_patterns:
+                match = p['cpattern'].match(l)
+                if match is not None:
+                    messages.append(Message(_type=p['type'], _file=None, line=None, desc=match.groups()[p['desc']]))
                     break
         return messages
 
 
-class CompilerGcc(object):
-    def __init__(self, flags=None):
+class Compiler(object):
+    """
+    Base class for all compilers. Subclasses set the name of the executable,
+    the default flags and the parser for the messages of the compiler.
+
+    :param flags: flags for compiling and linking the executable
+    :param output_limit: maximum number of bytes retained from each output
+                         stream of the compiler
+    """
+    name = None
+    default_flags = []
+    # flags for only checking the syntax without generating any code
+    syntax_flags = []
+    # flags for the format of messages
+    message_flags = []
+    parser_class = CompilerGccParser
+    # whether the linker supports "-Wl,--wrap" needed by the fork harness
+    supports_wrap = True
+
+    def __init__(self, flags=None, output_limit=DEFAULT_OUTPUT_LIMIT):
         if flags is None:
-            flags = ['-static', '-std=c99', '-O0', '-g', '-Wall', '-Wextra']
+            flags = list(self.default_flags)
         self.flags = flags
-        self.parser = CompilerGccParser()
+        self.parser = self.parser_class()
+        self.output_limit = output_limit
+
+    @classmethod
+    def is_available(cls):
+        """
+        :returns: whether the compiler is installed
+        """
+        return shutil.which(cls.name) is not None
 
     def compile(self, project):
-        cmd  = ['gcc']
+        cmd  = [self.name]
         cmd += self.flags
-        cmd += ['-fmessage-length=0']
+        cmd += project.build_flags
+        cmd += self.message_flags
         # cmd += ['-I{project_include}'.format(project_include=project.target)]
         cmd += ['-I{include}'.format(include=include) for include in project.include]
         cmd += ['-o', os.path.join(project.tempdir, project.target)]
         cmd += project.file_list
+        cmd += project.harness
         cmd += ['-lcunit']
         cmd += ['-l{lib}'.format(lib=lib) for lib in project.libs]
+        return self.execute(cmd)
+
+    def compile_projects(self, projects, object_dir):
+        """
+        Builds the executables of several projects sharing source files, e.g.
+        the test and the main project of a task. Every unique translation unit
+        is compiled only once into an object file, then the executable of each
+        project is linked from the object files of its sources. The build
+        flags of a project only apply to its harness files and to linking.
+
+        Every project gets its own result, so that e.g. the unit tests can be
+        run although the main program could not be linked. Messages of shared
+        source files are only contained in the result of the first project.
+
+        :param projects: projects to be built, each with its own tempdir
+        :param object_dir: directory for the object files
+        :returns: list of ReportParts, one for each project, the return code
+                  is the one of the first failed step needed for the project
+        """
+        os.makedirs(object_dir, exist_ok=True)
+        # object file and return code of the compiler for every unit
+        objects = {}
+        results = []
+        for project in projects:
+            includes = ['-I{include}'.format(include=include) for include in project.include]
+            harness_flags = [f for f in project.build_flags if not f.startswith('-Wl,')]
+            # header files are only compiled as part of the sources
+            units = [(f, []) for f in project.file_list if f.endswith('.c')]
+            units += [(f, harness_flags) for f in project.harness]
+            parts = []
+            linked = []
+            returncode = 0
+            for source, flags in units:
+                key = (os.path.abspath(source), tuple(flags), tuple(includes))
+                if key not in objects:
+                    name = os.path.splitext(os.path.basename(source))[0]
+                    obj = os.path.join(object_dir, '{}-{}.o'.format(len(objects), name))
+                    cmd = [self.name] + self.flags + flags + self.message_flags + includes + ['-c', '-o', obj, source]
+                    parts.append(self.execute(cmd))
+                    objects[key] = (obj, parts[-1].returncode)
+                obj, unit_returncode = objects[key]
+                linked.append(obj)
+                returncode = returncode or unit_returncode
+            if returncode == 0:
+                cmd  = [self.name]
+                cmd += self.flags
+                cmd += project.build_flags
+                cmd += self.message_flags
+                cmd += ['-o', os.path.join(project.tempdir, project.target)]
+                cmd += linked
+                cmd += ['-lcunit']
+                cmd += ['-l{lib}'.format(lib=lib) for lib in project.libs]
+                parts.append(self.execute(cmd))
+            result = self.merge_parts(parts)
+            result.returncode = returncode or result.returncode
+            results.append(result)
+        return results
+
+    def merge_parts(self, parts):
+        """
+        Combines the results of several runs of the compiler.
+
+        :param parts: list of ReportParts returned by execute()
+        :returns: ReportPart containing the messages of all runs, the return
+                  code is the one of the first failed run
+        """
+        returncode = next((p.returncode for p in parts if p.returncode != 0), 0)
+        messages = [m for p in parts for m in p.messages]
+        truncated = {}
+        for p in parts:
+            for stream, dropped in (p.truncated or {}).items():
+                truncated[stream] = truncated.get(stream, 0) + dropped
+        return ReportPart(self.name, returncode, messages, truncated=truncated or None)
+
+    def execute(self, cmd):
+        """
+        Runs the compiler and parses its messages. If the compiler is not
+        installed, a failed ReportPart is returned instead of raising an
+        error, e.g. for a compiler chosen by a task.
+
+        :param cmd: command line of the compiler
+        :returns: ReportPart containing all messages of the compiler
+        """
+        try:
+            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except FileNotFoundError:
+            message = Message(_type='error', _file='', line='', desc='{} not found!'.format(self.name))
+            return ReportPart(self.name, -1, [message])
+        outs, errs = capture_process(proc, self.output_limit)
+        messages = self.parser.parse(errs.getvalue())
+        return ReportPart(self.name, proc.returncode, messages,
+                          truncated=truncation_info(stdout=outs, stderr=errs))
+
+    def check_syntax(self, project):
+        """
+        Checks the source files of a project for errors and warnings without
+        compiling and linking them. No executable is created.
+
+        :param project: project containing the source files to be checked
+        :returns: ReportPart containing all messages of the compiler
+        """
+        cmd  = [self.name]
+        cmd += self.syntax_flags
+        cmd += self.message_flags
+        cmd += ['-I{include}'.format(include=include) for include in project.include]
+        cmd += project.file_list
+        return self.execute(cmd)
+
+
+class CompilerGcc(Compiler):
+    name = 'gcc'
+    default_flags = ['-static', '-std=c99', '-O0', '-g', '-Wall', '-Wextra']
+    syntax_flags = ['-fsyntax-only', '-std=c99', '-Wall', '-Wextra']
+    message_flags = ['-fmessage-length=0']
+    parser_class = CompilerGccParser
+
+
+class CompilerClang(Compiler):
+    name = 'clang'
+    default_flags = ['-static', '-std=c99', '-O0', '-g', '-Wall', '-Wextra']
+    syntax_flags = ['-fsyntax-only', '-std=c99', '-Wall', '-Wextra']
+    message_flags = ['-fmessage-length=0', '-fno-color-diagnostics', '-fno-caret-diagnostics']
+    parser_class = CompilerClangParser
+
+
+class CompilerTcc(Compiler):
+    """
+    Tiny C Compiler. TCC does not support "-Wl,--wrap", so it can not be used
+    for tasks with the fork harness (see Task).
+    """
+    name = 'tcc'
+    default_flags = ['-static', '-g', '-Wall']
+    syntax_flags = ['-Wall', '-c']
+    parser_class = CompilerTccParser
+    supports_wrap = False
+
+    def check_syntax(self, project):
+        """
+        Checks the source files of a project for errors and warnings. TCC has
+        no flag for only checking the syntax and does not accept an output
+        file for several sources with "-c", so every source file is compiled
+        on its own into an object file that is discarded. The object file is
+        never written to /dev/null, because TCC removes its output file first.
+
+        :param project: project containing the source files to be checked
+        :returns: ReportPart containing all messages of the compiler
+        """
+        includes = ['-I{include}'.format(include=include) for include in project.include]
+        parts = []
+        with tempfile.TemporaryDirectory() as directory:
+            # header files are only checked as part of the sources
+            for source in [f for f in project.file_list if f.endswith('.c')]:
+                cmd  = [self.name]
+                cmd += self.syntax_flags
+                cmd += self.message_flags
+                cmd += includes
+                cmd += ['-o', os.path.join(directory, 'syntax.o'), source]
+                parts.append(self.execute(cmd))
+                if parts[-1].returncode < 0:
+                    break
+        return self.merge_parts(parts)
+
+
+# all supported compilers by name
+COMPILERS = {'gcc': CompilerGcc, 'clang': CompilerClang, 'tcc': CompilerTcc}
+
+
+def get_compiler(name='gcc', **kwargs):
+    """
+    Creates a compiler by its name.
 
-        proc = subprocess.Popen(cmd, universal_newlines=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        outs, errs = proc.communicate()
-        messages = self.parser.parse(errs)
-        return ReportPart('gcc', proc.returncode, messages)
+    :param name: name of the compiler, see COMPILERS
+    :param kwargs: further arguments for the compiler, e.g. output_limit
+    :returns: compiler object
+    """
+    try:
+        compiler_class = COMPILERS[name]
+    except KeyError:
+        raise ValueError('Unknown compiler: {}'.format(name))
+    return compiler_class(**kwargs)
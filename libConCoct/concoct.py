@@ -16,14 +16,23 @@ import subprocess
 import base64
 import glob
 import json
+import math
 import os
+import uuid
 from zipfile import ZipFile
-import docker
 
-from .report import Report
-from .unittest import CunitChecker
+from .report import Report, DEFAULT_MESSAGE_LIMIT
+from .unittest import CunitChecker, DockerRunner, VMRunner, FORK_HARNESS, FORK_HARNESS_FLAGS
 from .checker import CppCheck
-from .compiler import CompilerGcc
+from .compiler import COMPILERS, get_compiler
+from .output import DEFAULT_OUTPUT_LIMIT
+from .performance import PerformanceChecker, ResourceUsageParser, build_measure_program
+from .fingerprint import ResultCache, fingerprint_project, hash_project
+
+
+# default limits for running the unit tests of a task in the secure
+# environment: CPU time and wall clock time in seconds, memory in bytes
+DEFAULT_LIMITS = {'cpu_time': 2, 'wall_time': 10, 'memory': 2**22}
 
 
 class Project(object):
@@ -82,16 +91,39 @@ class Project(object):
     cb_unit_template = '<Unit filename="{filename}"><Option compilerVar="CC" /></Unit>'
     cb_unit_h_template = '<Unit filename="{filename}" />'
 
-    def __init__(self, target, file_list, libs=None, includes=None):
+    def __init__(self, target, file_list, libs=None, includes=None, limits=None, sources=None):
         if libs is None:
             libs = []
         if includes is None:
             includes = []
         self.project_name = target
-        self.file_list    = file_list
+        self.source_paths = list(file_list)
+        # source files given by name and content that are only written into
+        # the build directory when the project is checked (see write_sources())
+        self.sources      = dict(sources) if sources else {}
+        # paths in file_list that belong to the solution instead of the task,
+        # sources given by content always belong to the solution
+        self.solution_paths = []
+        self.source_dir   = None
         self.libs         = libs
         self.include      = includes
         self.tempdir      = None
+        self.limits       = dict(DEFAULT_LIMITS)
+        if limits:
+            self.limits.update(limits)
+        # additional source files linked into the executable that are not part
+        # of the task itself, e.g. to measure the resource usage of unit tests,
+        # and additional flags for building the executable
+        self.harness      = []
+        self.build_flags  = []
+        # names of the compilers for graded runs and quick checks chosen by the
+        # task, None for the default (see ConCoCt)
+        self.compiler       = None
+        self.quick_compiler = None
+        self.performance  = None
+        # whether the unit tests write their results on standard output
+        # instead of a result file (see CunitStreamParser)
+        self.stream_results = False
 
         # Workaround for Docker not handling spaces well. Also upper case
         # characters are a no go! Equal signs (used as padding in Base64) have
@@ -99,12 +131,44 @@ class Project(object):
         # name! (See: https://github.com/docker/docker/issues/2105)
         self.target = base64.b64encode(self.project_name.encode('utf-8')).decode('utf-8').lower().replace('=', '')
 
-        for f in self.file_list:
+        for f in self.source_paths:
             if not os.path.isfile(f):
                 raise FileNotFoundError('Source file {} not found!'.format(f))
+        for name in self.sources:
+            if not name or os.path.basename(name) != name:
+                raise ValueError('Invalid name for source file: {}'.format(name))
 
         # TODO: test if libs are installed?!
 
+    @property
+    def file_list(self):
+        """
+        List of paths to all source files of the project. Sources given by
+        content are only included after they have been written to disk.
+        """
+        if self.source_dir is None:
+            return self.source_paths
+        return self.source_paths + [os.path.join(self.source_dir, name) for name in sorted(self.sources)]
+
+    def write_sources(self, directory):
+        """
+        Writes all sources given by content into a directory, so that they can
+        be passed to the compiler and CppCheck. The files are only written once
+        per directory.
+
+        :param directory: build directory for the project
+        """
+        source_dir = os.path.join(directory, 'sources')
+        if not self.sources or self.source_dir == source_dir:
+            return
+        os.makedirs(source_dir, exist_ok=True)
+        for name, content in self.sources.items():
+            if isinstance(content, str):
+                content = content.encode('utf-8')
+            with open(os.path.join(source_dir, name), 'wb') as fd:
+                fd.write(content)
+        self.source_dir = source_dir
+
 
     def create_cb_project(self, file_name='project.zip'):
         """
@@ -121,11 +185,14 @@ class Project(object):
         with ZipFile(file_name, 'w') as project_zip:
             already_packed_files = []
             # include all code files
-            for f in self.file_list:
+            for f in self.source_paths:
                 only_file_name = os.path.basename(f)
                 project_zip.write(f, only_file_name)
                 unit_str += self.cb_unit_template.format(filename=only_file_name)
                 already_packed_files.append(f)
+            for name in sorted(self.sources):
+                project_zip.writestr(name, self.sources[name])
+                unit_str += self.cb_unit_template.format(filename=name)
             # include all header from all include directories
             for d in self.include:
                 # set path to include files for compiler
@@ -169,12 +236,26 @@ class Task(object):
         :ivar files_main:    Files used for executing.
         :ivar files_test:    Files used for testing.
         :ivar files_student: Files to be added by the student or for the student in a cb project.
+        :ivar limits:        Limits for running the unit tests (optional, see DEFAULT_LIMITS).
+        :ivar performance:   Budgets for resource usage of the unit tests (optional, see PerformanceChecker).
+        :ivar harness:       "fork" to run every unit test in its own process (optional).
+        :ivar test_timeout:  Wall clock time for every unit test in seconds, if harness is "fork" (optional,
+                             defaults to the CPU time limit, shortened so that all unit tests finish within
+                             the wall clock time limit).
+        :ivar test_jobs:     Number of unit tests running in parallel, if harness is "fork" (optional, defaults
+                             to the number of CPUs in the secure environment).
+        :ivar compiler:      Name of the compiler for building the project, e.g. "gcc" or "clang" (optional).
+        :ivar quick_compiler: Name of the compiler for quick checks, e.g. "tcc" (optional, defaults to compiler).
+        :ivar results:       "stream" to parse the unit test results from the output while the tests run instead
+                             of copying a result file afterwards, only if harness is "fork" (optional, defaults
+                             to "file").
     """
 
     def __init__(self, path):
         self.path = path
         with open(os.path.join(path, 'config.json'), 'r') as fd:
             data = json.load(fd)
+        self.config        = data
         self.name          = data['name']
         self.desc          = data['desc']
         self.libs          = data['libs']
@@ -183,6 +264,25 @@ class Task(object):
         self.files_main    = data['files_main']
         self.files_test    = data['files_test']
         self.files_student = data['files_student']
+        self.limits        = data.get('limits', {})
+        self.performance   = data.get('performance', None)
+        self.harness       = data.get('harness', None)
+        self.test_timeout  = data.get('test_timeout', None)
+        self.test_jobs     = data.get('test_jobs', 0)
+        self.compiler      = data.get('compiler', None)
+        self.quick_compiler = data.get('quick_compiler', None)
+        self.results       = data.get('results', 'file')
+        if self.harness not in (None, 'fork'):
+            raise ValueError('Unknown harness: {}'.format(self.harness))
+        if self.results not in ('file', 'stream'):
+            raise ValueError('Unknown kind of results: {}'.format(self.results))
+        if self.results == 'stream' and self.harness != 'fork':
+            raise ValueError('Streamed results need the fork harness!')
+        for c in (self.compiler, self.quick_compiler):
+            if c is not None and c not in COMPILERS:
+                raise ValueError('Unknown compiler: {}'.format(c))
+        if self.harness == 'fork' and self.compiler and not COMPILERS[self.compiler].supports_wrap:
+            raise ValueError('Compiler {} can not be used with the fork harness!'.format(self.compiler))
 
     def get_main_project(self, solution):
         file_list = []
@@ -190,14 +290,20 @@ class Task(object):
         file_list += [os.path.join(self.path, self.src_dir, f) for f in self.files_main]
         # add all files of given solution or files that have been defines in config file
         if solution:
-            file_list += solution.solution_file_list
+            solution_paths = list(solution.solution_file_list)
         else:
-            file_list += [os.path.join(self.path, self.src_dir, f) for f in self.files_student]
+            solution_paths = [os.path.join(self.path, self.src_dir, f) for f in self.files_student]
+        file_list += solution_paths
         # add all include directories
         include_list = []
         include_list += [os.path.join(self.path, self.src_dir)]
         # TODO: add task includes
-        return Project(self.name, file_list, self.libs, include_list)
+        sources = solution.solution_files if solution else None
+        project = Project(self.name, file_list, self.libs, include_list, self.limits, sources)
+        project.solution_paths = solution_paths
+        project.compiler = self.compiler
+        project.quick_compiler = self.quick_compiler
+        return project
 
     def get_test_project(self, solution):
         file_list = []
@@ -205,14 +311,46 @@ class Task(object):
         file_list += [os.path.join(self.path, self.src_dir, f) for f in self.files_test]
         # add all files of given solution or files that have been defines in config file
         if solution:
-            file_list += solution.solution_file_list
+            solution_paths = list(solution.solution_file_list)
         else:
-            file_list += [os.path.join(self.path, self.src_dir, f) for f in self.files_student]
+            solution_paths = [os.path.join(self.path, self.src_dir, f) for f in self.files_student]
+        file_list += solution_paths
         # add all include directories
         include_list = []
         include_list += [os.path.join(self.path, self.src_dir)]
         # TODO: add task includes
-        return Project(self.name, file_list, self.libs, include_list)
+        sources = solution.solution_files if solution else None
+        project = Project(self.name, file_list, self.libs, include_list, self.limits, sources)
+        project.solution_paths = solution_paths
+        project.performance = self.performance
+        project.compiler = self.compiler
+        project.quick_compiler = self.quick_compiler
+        if self.harness == 'fork':
+            timeout = self.test_timeout or project.limits['cpu_time']
+            project.harness.append(FORK_HARNESS)
+            project.build_flags += FORK_HARNESS_FLAGS
+            # the harness shortens the timeouts so that all tests finish
+            # within the wall clock time limit
+            project.build_flags += ['-DCONCOCT_TEST_TIMEOUT={}'.format(int(math.ceil(timeout))),
+                                    '-DCONCOCT_TEST_JOBS={}'.format(int(self.test_jobs)),
+                                    '-DCONCOCT_WALL_TIME={}'.format(int(project.limits['wall_time']))]
+            if self.results == 'stream':
+                project.build_flags.append('-DCONCOCT_STREAM_RESULTS')
+                project.stream_results = True
+        return project
+
+    def save_limits(self, limits):
+        """
+        Stores new limits for running the unit tests in the configuration file
+        of this task. All other settings in the file are preserved.
+
+        :param limits: dictionary containing the limits, see DEFAULT_LIMITS
+        """
+        self.limits = limits
+        self.config['limits'] = limits
+        with open(os.path.join(self.path, 'config.json'), 'w') as fd:
+            json.dump(self.config, fd, indent=4)
+            fd.write('\n')
 
 
 
@@ -221,13 +359,24 @@ class Solution(object):
     Provides a data object containing all information about a possible solution
     for a given task. The source files given as parameter will be compiled with
     all source files of the task itself.
+
+    Source files can be given as paths or directly by their names and contents,
+    e.g. for uploads that should not be written to disk first.
+
+    :param task: task this solution belongs to
+    :param solution_file_list: list of paths to source files
+    :param solution_files: dictionary with file names and contents
     """
-    def __init__(self, task, solution_file_list=None):
+    def __init__(self, task, solution_file_list=None, solution_files=None):
         self.task = task
         if solution_file_list:
             self.solution_file_list = solution_file_list
         else:
             self.solution_file_list = []
+        if solution_files:
+            self.solution_files = solution_files
+        else:
+            self.solution_files = {}
 
     def get_solution_from_filesystem(self, username):
         """
@@ -239,32 +388,74 @@ class Solution(object):
 
 
 class ConCoCt(object):
-    def __init__(self, backend='vm'):
+    """
+    Checks projects by running CppCheck, the compiler and the unit tests in a
+    secure environment. If the object is only used for quick checks (see
+    quick_check()), the secure environment is not necessary and sandbox can be
+    set to False to skip checking for it.
+
+    If a cache directory is given, unit test results are stored by the
+    fingerprint of the project and reused for all later projects with the same
+    fingerprint, e.g. when a solution is submitted again with changes only in
+    comments or whitespace. Every change in the files of the task invalidates
+    the results.
+
+    The compiler is chosen by the task (see Task). If a compiler is given, it
+    is used for all projects instead, e.g. "tcc" for quick feedback. Without
+    any choice "gcc" is used.
+
+    If memoize is set, the object keeps the result of the last run of every
+    stage and the runner for the secure environment between checks. A stage is
+    only run again if its inputs have changed, e.g. while a task is edited (see
+    WatchSession). Call close() when the object is no longer needed.
+
+    Similar messages in the returned reports are collapsed and at most
+    message_limit messages are kept in every part (see Report.aggregate()).
+    """
+    def __init__(self, backend='vm', output_limit=DEFAULT_OUTPUT_LIMIT, sandbox=True, cache_dir=None,
+                 memoize=False, compiler=None, message_limit=DEFAULT_MESSAGE_LIMIT):
         self.tempdir = tempfile.TemporaryDirectory()
         self.backend = backend
-        self.check_env()
+        self.compiler = compiler
+        # maximum number of bytes retained from each output stream of the
+        # compiler, CppCheck and the unit tests
+        self.output_limit = output_limit
+        # maximum number of messages in every part of a report, None for all
+        self.message_limit = message_limit
+        self.cache = ResultCache(cache_dir) if cache_dir else None
+        # input hash and result of the last run of every stage
+        self.memo = {} if memoize else None
+        self.runner = None
+        self.check_env(sandbox)
 
     def __del__(self):
         self.tempdir.cleanup()
 
-    def check_env(self):
+    def close(self):
+        """
+        Closes the runner kept between checks, if memoize is set.
+        """
+        if self.runner:
+            self.runner.close()
+            self.runner = None
+
+    def check_env(self, sandbox=True):
         # gcc
         try:
             subprocess.call(['gcc', '--version'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
         except FileNotFoundError:
             raise FileNotFoundError('gcc not found!')
+        # compiler chosen instead of gcc
+        if self.compiler is not None:
+            if self.compiler not in COMPILERS:
+                raise ValueError('Unknown compiler: {}'.format(self.compiler))
+            if not COMPILERS[self.compiler].is_available():
+                raise FileNotFoundError('{} not found!'.format(self.compiler))
         # cppcheck
         try:
             subprocess.call(['cppcheck', '--version'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
         except FileNotFoundError:
             raise FileNotFoundError('cppcheck not found!')
-        # docker
-        try:
-            proc = subprocess.call(['docker', 'info'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        except FileNotFoundError:
-            raise FileNotFoundError('docker not found!')
-        if proc != 0:
-            raise FileNotFoundError('docker found but permission denied. Is user in group "docker"?')
         # cunit
         try:
             proc = subprocess.call(['ld', '-lcunit', '-o{tmpfile}'.format(tmpfile=os.path.join(self.tempdir.name, '__ld_check.out'))], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
@@ -272,33 +463,244 @@ class ConCoCt(object):
             raise FileNotFoundError('ld not found!')
         if proc != 0:
             raise FileNotFoundError('cunit not found!')
-        # docker-py
+        if not sandbox:
+            return
+        # docker
+        try:
+            proc = subprocess.call(['docker', 'info'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except FileNotFoundError:
+            raise FileNotFoundError('docker not found!')
+        if proc != 0:
+            raise FileNotFoundError('docker found but permission denied. Is user in group "docker"?')
+        # docker-py (only imported if the Docker backend is actually used)
+        if self.backend != 'docker':
+            return
+        import docker
         version_info = tuple([int(d) for d in docker.version.split('-')[0].split('.')])
         if version_info[0] < 1 or version_info[0] == 1 and version_info[1] < 2:
             raise FileNotFoundError('docker-py version to old!')
 
-    def check_project(self, project):
+    def check_project(self, project, main_project=None):
+        """
+        Checks a project with CppCheck, builds it and runs its unit tests.
+
+        If a main project is given, e.g. to let the user run the program, it
+        is built in the same pass. Source files contained in both projects are
+        compiled only once (see Compiler.compile_projects()) and the report
+        covers both. The build of the main program is reported in the part
+        "<compiler>_main", e.g. "gcc_main", and a failure there does not stop
+        the unit tests. The main executable is built in the directory "main"
+        inside the build directory, main_project.tempdir points to it until
+        the next check.
+
+        :param project: project containing the unit tests
+        :param main_project: project containing the main program or None
+        :returns: Report containing messages of all stages
+        """
         # TODO: move temp dir to project class
         project.tempdir = self.tempdir.name
+        project.write_sources(project.tempdir)
+        if main_project:
+            main_project.tempdir = os.path.join(self.tempdir.name, 'main')
+            os.makedirs(main_project.tempdir, exist_ok=True)
+            main_project.write_sources(project.tempdir)
 
+        key = hash_project(project) if self.memo is not None else None
         r = Report()
-        _r = CppCheck().check(project)
+        _r = self.run_stage('cppcheck', key, CppCheck(output_limit=self.output_limit).check, project)
         r.add_part(_r)
         if _r.returncode == 0:
-            _r = CompilerGcc().compile(project)
-            r.add_part(_r)
+            compiler = self.get_compiler(project)
+            build = [compiler.name] + compiler.flags
+            if main_project:
+                compile_key = hash_project(project, build + [hash_project(main_project)]) if key else None
+                _r, _main = self.run_stage('combined compiler', compile_key, compiler.compile_projects,
+                                           [project, main_project], os.path.join(self.tempdir.name, 'objects'))
+                # the build of the main program is reported separately and
+                # does not prevent running the unit tests
+                _main.source = '{}_main'.format(compiler.name)
+                r.add_part(_r)
+                r.add_part(_main)
+            else:
+                compile_key = hash_project(project, build) if key else None
+                _r = self.run_stage('compiler', compile_key, compiler.compile, project)
+                r.add_part(_r)
         else:
             print('Error: Could not run compiler because CppCheck returned error code.')
         if _r.returncode == 0:
-            checker = CunitChecker(backend=self.backend)
-            _r = checker.run(project)
-            self.print_unit_test_results(checker.parser.list_of_tests)
+            _r = self.run_unit_tests(project, compiler)
+            self.print_unit_test_results(_r.tests)
             r.add_part(_r)
+            if _r.returncode == 0 and project.performance:
+                r.add_part(PerformanceChecker(project.performance).check(_r.stats))
         else:
             print('Error: Could not run unit tests because Compiler returned error code.')
 
         project.tempdir = None
-        return r
+        return r.aggregate(self.message_limit)
+
+    def get_compiler(self, project, quick=False):
+        """
+        Creates the compiler for a project. A compiler given to this object
+        takes precedence over the compilers chosen by the task.
+
+        :param project: project to be compiled
+        :param quick: whether the compiler is used for a quick check
+        :returns: compiler object
+        """
+        name = self.compiler
+        if name is None and quick:
+            name = project.quick_compiler
+        if name is None:
+            name = project.compiler or 'gcc'
+        compiler = get_compiler(name, output_limit=self.output_limit)
+        if not quick and FORK_HARNESS in project.harness and not compiler.supports_wrap:
+            raise ValueError('Compiler {} can not be used with the fork harness!'.format(name))
+        return compiler
+
+    def run_unit_tests(self, project, compiler=None):
+        """
+        Runs the unit tests of an already compiled project in the secure
+        environment. If a result cache is used and a project with the same
+        fingerprint has been tested successfully before, its results are
+        returned without running the unit tests again. If memoize is set, the
+        runner is kept and the unit tests are skipped while the source files
+        do not change. Unlike the result cache the memo is keyed on the exact
+        contents, because messages of failed tests contain line numbers.
+
+        :param project: compiled project to be tested
+        :param compiler: compiler the project has been compiled with
+        :returns: ReportPart containing the unit test results
+        """
+        if compiler is None:
+            compiler = self.get_compiler(project)
+        build = [compiler.name] + compiler.flags
+        key = fingerprint_project(project, build) if self.cache else None
+        if key:
+            cached = self.cache.get(key)
+            if cached:
+                print('Reusing unit test results of an equivalent project.')
+                return cached
+        stage_key = None
+        if self.memo is not None:
+            if self.runner is None:
+                self.runner = self.create_runner()
+            stage_key = hash_project(project, build)
+        checker = CunitChecker(backend=self.backend, output_limit=self.output_limit, runner=self.runner)
+        _r = self.run_stage('cunit', stage_key, checker.run, project)
+        # do not store failed runs, they could be caused by an overloaded host
+        if key and _r.returncode == 0:
+            self.cache.put(key, _r)
+        return _r
+
+    def create_runner(self):
+        """
+        Creates a runner for the secure environment that is kept between
+        checks.
+        """
+        if self.backend == 'docker':
+            return DockerRunner()
+        return VMRunner(shutdown_vm_after=False, keep_connection=True)
+
+    def run_stage(self, name, key, func, *args):
+        """
+        Runs a stage of a check. If memoize is set and the inputs of the stage
+        have not changed since its last run, the last result is returned
+        instead. Results of runs that did not finish (negative return code)
+        are not kept.
+
+        :param name: name of the stage
+        :param key: hash of all inputs of the stage or None to always run it
+        :param func: function running the stage and returning a ReportPart or
+                     a list of ReportParts
+        :returns: ReportPart or list of ReportParts of the stage
+        """
+        if self.memo is None or key is None:
+            return func(*args)
+        last_key, last_result = self.memo.get(name, (None, None))
+        if last_key == key:
+            print('Reusing result of {} for unchanged input.'.format(name))
+            return last_result
+        result = func(*args)
+        parts = result if isinstance(result, list) else [result]
+        if all(p.returncode >= 0 for p in parts):
+            self.memo[name] = (key, result)
+        else:
+            self.memo.pop(name, None)
+        return result
+
+    def quick_check(self, project, cppcheck=True):
+        """
+        Checks a project only for errors and warnings without building and
+        running it. The compiler only checks the syntax and CppCheck runs with
+        a reduced set of checks. This gives feedback much faster than a full
+        check, e.g. while the user is still editing the solution.
+
+        :param project: project to be checked
+        :param cppcheck: whether to run CppCheck at all
+        :returns: Report containing messages of CppCheck and compiler
+        """
+        project.write_sources(self.tempdir.name)
+        key = hash_project(project) if self.memo is not None else None
+        r = Report()
+        if cppcheck:
+            checker = CppCheck(output_limit=self.output_limit, enable='warning')
+            r.add_part(self.run_stage('quick cppcheck', key, checker.check, project))
+        compiler = self.get_compiler(project, quick=True)
+        quick_key = compiler.name + key if key else None
+        r.add_part(self.run_stage('quick compiler', quick_key, compiler.check_syntax, project))
+        return r.aggregate(self.message_limit)
+
+    def calibrate_task(self, task, runs=5, cpu_factor=5, memory_factor=2):
+        """
+        Derives limits for a task from the resource usage of its reference
+        solution. The unit tests are compiled with the reference solution and
+        run several times on the local host. The limits are calculated from the
+        maximum CPU time and peak memory of all runs, multiplied by a safety
+        factor.
+
+        :param task: task to be calibrated
+        :param runs: number of times the unit tests are run
+        :param cpu_factor: factor applied to the measured CPU time
+        :param memory_factor: factor applied to the measured peak memory
+        :returns: dictionary with limits or None if calibration failed
+        """
+        project = task.get_test_project(None)
+        project.tempdir = self.tempdir.name
+        # the executable of the last memoized compilation is overwritten
+        if self.memo is not None:
+            self.memo.pop('compiler', None)
+        r = self.get_compiler(project).compile(project)
+        project.tempdir = None
+        if r.returncode != 0:
+            print('Error: Could not compile reference solution.')
+            print(r)
+            return None
+        executable = os.path.join(self.tempdir.name, project.target)
+        # measured by the same program as in the secure environment, the peak
+        # memory of a child of this process would include the interpreter
+        measure = build_measure_program()
+        cpu_times = []
+        peak_memory = []
+        for i in range(runs):
+            token = uuid.uuid4().hex
+            with tempfile.TemporaryDirectory() as run_dir:
+                proc = subprocess.Popen([measure, '-', executable], cwd=run_dir, stdin=subprocess.PIPE,
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+                _, errs = proc.communicate((token + '\n').encode('ascii'))
+            stats = ResourceUsageParser(token).parse(errs.decode('utf-8', errors='replace'))
+            if proc.returncode != 0 or stats is None:
+                print('Error: Reference solution returned error code {}.'.format(proc.returncode))
+                return None
+            cpu_times.append(stats['cpu_time'])
+            peak_memory.append(stats['max_rss'])
+            print('Run {}: CPU time {:.3f}s, wall time {:.3f}s, peak memory {} KiB'.format(
+                  i + 1, stats['cpu_time'], stats['wall_time'], stats['max_rss'] // 1024))
+        # CPU time limits are only possible in whole seconds
+        cpu_time = max(1, int(math.ceil(max(cpu_times) * cpu_factor)))
+        # round memory up to whole MiB, Docker needs at least 4 MiB
+        memory = max(2**22, int(math.ceil(max(peak_memory) * memory_factor / 2**20)) * 2**20)
+        return {'cpu_time': cpu_time, 'wall_time': 5 * cpu_time, 'memory': memory}
 
     def print_unit_test_results(self, testresults):
         """
@@ -0,0 +1,123 @@
+"""
+Contains a class to export many reports into a single XML file.
+
+The reports are written one after another, so only a single report is held in
+memory at any time. Besides the XML format of Report.to_xml() the JUnit XML
+format is supported, which can be read by most CI dashboards.
+
+Authors: Martin Wichmann, Christian Wichmann
+"""
+
+import xml.etree.ElementTree
+
+from .report import Report
+
+
+class ReportXMLWriter(object):
+    """
+    Writes reports incrementally into a file-like object opened in text mode.
+
+    >>> with open('reports.xml', 'w') as fd:
+    ...     with ReportXMLWriter(fd, flavor='junit') as writer:
+    ...         for task, user, report in reports:
+    ...             writer.write(report, task=task, user=user)
+
+    :ivar flavor: "report" for the format of Report.to_xml(), "junit" for the
+                  JUnit XML format
+    """
+    root_elements = {'report': 'reports', 'junit': 'testsuites'}
+
+    def __init__(self, fd, flavor='report'):
+        if flavor not in self.root_elements:
+            raise ValueError('Unknown XML flavor: {}'.format(flavor))
+        self.fd = fd
+        self.flavor = flavor
+        self.fd.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        self.fd.write('<{}>\n'.format(self.root_elements[self.flavor]))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.fd.write('</{}>\n'.format(self.root_elements[self.flavor]))
+        self.fd.flush()
+
+    def write(self, report, **attributes):
+        """
+        Writes a single report into the file.
+
+        :param report: Report object or its JSON representation
+        :param attributes: information about the report, e.g. task and user,
+                           that are added as attributes
+        """
+        if not isinstance(report, Report):
+            report = Report.from_json(report)
+        attributes = {k: str(v) for k, v in attributes.items() if v is not None}
+        if self.flavor == 'junit':
+            elements = self.to_junit(report, attributes)
+        else:
+            elements = [report.to_xml_element(**attributes)]
+        for element in elements:
+            self.fd.write(xml.etree.ElementTree.tostring(element, encoding='unicode'))
+            self.fd.write('\n')
+
+    def write_all(self, reports):
+        """
+        Writes all reports given by an iterable, e.g. ReportStore.iter_reports().
+
+        :param reports: iterable of tuples (report, attributes)
+        :returns: number of written reports
+        """
+        count = 0
+        for report, attributes in reports:
+            self.write(report, **attributes)
+            count += 1
+        return count
+
+    def to_junit(self, report, attributes):
+        """
+        Converts a report into JUnit test suites. Every CUnit suite becomes a
+        test suite. If the unit tests could not be run, a single test case
+        "build" contains the errors of CppCheck and the compiler.
+
+        :returns: list of XML Elements, one for each test suite
+        """
+        # name test suites after task and user, so they are unique in the file
+        prefix = '.'.join(attributes[k] for k in ('task', 'user') if k in attributes)
+        properties = xml.etree.ElementTree.Element('properties')
+        for key in sorted(attributes):
+            xml.etree.ElementTree.SubElement(properties, 'property', attrib={'name': key, 'value': attributes[key]})
+        suites = []
+        parts = {p.source: p for p in report.parts}
+        unit_tests = parts.get('cunit')
+        if unit_tests is None or unit_tests.returncode != 0 or not unit_tests.tests:
+            suite = xml.etree.ElementTree.Element('testsuite', attrib={'name': prefix or 'report', 'tests': '1',
+                                                                      'failures': '0', 'errors': '1'})
+            suite.append(properties)
+            case = xml.etree.ElementTree.SubElement(suite, 'testcase', attrib={'classname': prefix, 'name': 'build'})
+            error = xml.etree.ElementTree.SubElement(case, 'error', attrib={'message': 'Unit tests could not be run.'})
+            error.text = '\n'.join('{} {} {}:{} {}'.format(p.source, m.type, m.file, m.line, m.desc)
+                                   for p in report.parts for m in p.messages)
+            return [suite]
+        for suite_name in sorted(unit_tests.tests):
+            results = unit_tests.tests[suite_name]
+            failures = sum(1 for r in results.values() if not r)
+            classname = '.'.join(filter(None, [prefix, suite_name]))
+            suite = xml.etree.ElementTree.Element('testsuite', attrib={'name': classname, 'tests': str(len(results)),
+                                                                      'failures': str(failures), 'errors': '0'})
+            suite.append(properties)
+            for test_name in sorted(results):
+                case = xml.etree.ElementTree.SubElement(suite, 'testcase', attrib={'classname': classname,
+                                                                                  'name': test_name})
+                if not results[test_name]:
+                    # messages of CunitParser start with suite and test name
+                    marker = '{} - {} - '.format(suite_name, test_name)
+                    details = [m for m in unit_tests.messages if m.desc.startswith(marker)]
+                    message = details[0].desc[len(marker):] if details else 'Test failed.'
+                    failure = xml.etree.ElementTree.SubElement(case, 'failure', attrib={'message': message})
+                    failure.text = '\n'.join('{}:{} {}'.format(m.file, m.line, m.desc) for m in details)
+            suites.append(suite)
+        return suites
@@ -0,0 +1,133 @@
+"""
+Contains a rate limiter for the jobs of single users, so that one user can not
+crowd out all other users by submitting many jobs.
+
+The limiter is used by the process queueing the jobs (see celery_tasks.py),
+not by the workers. If several processes queue jobs, e.g. the processes of a
+web server, they have to share the state of the limiter through a SQLite
+database file. Otherwise every process grants every user the full rate.
+
+Authors: Martin Wichmann, Christian Wichmann
+"""
+
+import sqlite3
+import threading
+import time
+
+
+class FairShareLimiter(object):
+    """
+    Limits the rate of jobs per user with a token bucket for every user. Each
+    user gets a bucket holding up to "burst" tokens which is refilled with
+    "rate" tokens per second. Submitting a job takes one token. If the bucket
+    is empty, the limiter returns the time the job has to be delayed until a
+    token is available, so that one user can not crowd out all other users.
+
+    If a path is given, the buckets are stored in a SQLite database file that
+    is shared by all processes on the host (or on a shared file system).
+    Without a path the buckets are only kept in this process.
+
+    Buckets that have been refilled completely are removed from time to time,
+    because a full bucket is the same as no bucket.
+
+    :param rate: tokens per second added to every bucket
+    :param burst: maximum number of tokens in a bucket
+    :param clock: function returning the current time in seconds, it has to
+                  be the same for all processes sharing the database
+    :param path: path to the database file or None
+    """
+    schema = """
+        CREATE TABLE IF NOT EXISTS buckets (
+            user    TEXT PRIMARY KEY,
+            tokens  REAL NOT NULL,
+            updated REAL NOT NULL
+        );
+    """
+
+    def __init__(self, rate=0.2, burst=3, clock=time.time, path=None, timeout=30):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.path = path
+        self.buckets = {}
+        self.lock = threading.Lock()
+        # time of the last removal of full buckets
+        self.last_eviction = None
+        self.connection = None
+        if path:
+            # transactions are started explicitly, the lock serializes threads
+            self.connection = sqlite3.connect(path, timeout=timeout, isolation_level=None,
+                                              check_same_thread=False)
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.executescript(self.schema)
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def acquire(self, user):
+        """
+        Takes a token from the bucket of the given user.
+
+        :param user: name of the user submitting a job
+        :returns: delay in seconds before the job should be executed, 0 if it
+                  can be executed immediately
+        """
+        now = self.clock()
+        with self.lock:
+            if self.connection is not None:
+                tokens = self._acquire_shared(user, now)
+            else:
+                tokens = self._acquire_local(user, now)
+        if tokens >= 0:
+            return 0
+        return -tokens / self.rate
+
+    def _take(self, tokens, last, now):
+        # tokens may become negative, so every further job of the same user is
+        # delayed a little bit more
+        return min(self.burst, tokens + max(0, now - last) * self.rate) - 1
+
+    def _eviction_due(self, now):
+        if self.last_eviction is not None and now - self.last_eviction < self.burst / self.rate:
+            return False
+        self.last_eviction = now
+        return True
+
+    def _acquire_local(self, user, now):
+        tokens, last = self.buckets.get(user, (self.burst, now))
+        tokens = self._take(tokens, last, now)
+        self.buckets[user] = (tokens, now)
+        if self._eviction_due(now):
+            self.buckets = {u: (t, l) for u, (t, l) in self.buckets.items()
+                            if t + max(0, now - l) * self.rate < self.burst}
+        return tokens
+
+    def _acquire_shared(self, user, now):
+        # the bucket is read and written in one transaction, so that
+        # concurrent processes never take the same token
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = self.connection.execute('SELECT tokens, updated FROM buckets WHERE user = ?', (user, )).fetchone()
+            tokens, last = row if row else (self.burst, now)
+            tokens = self._take(tokens, last, now)
+            self.connection.execute('INSERT OR REPLACE INTO buckets (user, tokens, updated) VALUES (?, ?, ?)',
+                                    (user, tokens, now))
+            if self._eviction_due(now):
+                self.connection.execute('DELETE FROM buckets WHERE tokens + MAX(0, ? - updated) * ? >= ?',
+                                        (now, self.rate, self.burst))
+            self.connection.execute('COMMIT')
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+        return tokens
+
+    def bucket_count(self):
+        """
+        :returns: number of buckets currently stored
+        """
+        with self.lock:
+            if self.connection is not None:
+                return self.connection.execute('SELECT COUNT(*) FROM buckets').fetchone()[0]
+            return len(self.buckets)
@@ -0,0 +1,191 @@
+"""
+Contains functions to calculate fingerprints of projects that do not change
+when only comments or whitespace in the source files are changed, and a cache
+for unit test results indexed by these fingerprints.
+
+Two projects with the same fingerprint consist of the same token streams and
+therefore behave identically when their unit tests are run. Only the files of
+the solution are normalized, the files of the task (e.g. the unit tests) and
+the harness are hashed exactly, because the messages of failed unit tests
+refer to their line numbers. CppCheck and the compiler still have to be run
+for every project, because their messages refer to line numbers in all source
+files.
+
+Authors: Martin Wichmann, Christian Wichmann
+"""
+
+import glob
+import hashlib
+import json
+import os
+import re
+import tempfile
+
+from .report import ReportPart
+
+
+TOKEN_PATTERN = re.compile(r"""
+      (?P<comment>//[^\n]*|/\*.*?\*/)
+    | (?P<string>"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*')
+    | (?P<newline>\n)
+    | (?P<space>\\\n|[ \t\r\f\v]+)
+    | (?P<token>[A-Za-z_]\w*|\.?\d(?:[eEpP][+-]|[\w.])*|<<=|>>=|\.\.\.|->|\+\+|--|<<|>>
+                |<=|>=|==|!=|&&|\|\||[-+*/%&|^]=|\#\#|.)
+    """, re.DOTALL | re.VERBOSE)
+
+# tokens that make the behavior of a program depend on the position of code
+POSITION_DEPENDENT_TOKENS = frozenset(['__LINE__', '__COUNTER__'])
+# token inserted before the parameter list of a function-like macro, it can
+# not occur in C source code because it contains whitespace
+FUNCTION_LIKE_MACRO = ' ('
+
+
+def tokenize(source):
+    """
+    Splits C source code into tokens without comments and whitespace. Newlines
+    are only kept at the end of preprocessor directives, because there they
+    are significant. A parenthesis directly following the name in a #define
+    is marked, so that "#define f(x)" (function-like macro) and
+    "#define f (x)" (object-like macro) differ.
+
+    :param source: string containing C source code
+    :returns: list of tokens
+    """
+    tokens = []
+    line_start = True
+    # tokens of the current preprocessor directive or None outside of one
+    directive = None
+    last_end = 0
+    for match in TOKEN_PATTERN.finditer(source):
+        kind = match.lastgroup
+        if kind == 'newline':
+            if directive is not None:
+                tokens.append('\n')
+            directive = None
+            line_start = True
+        elif kind in ('string', 'token'):
+            token = match.group()
+            if line_start and token == '#':
+                directive = []
+            elif directive is not None:
+                if (len(directive) == 2 and directive[0] == 'define' and token == '('
+                        and match.start() == last_end):
+                    tokens.append(FUNCTION_LIKE_MACRO)
+                directive.append(token)
+            line_start = False
+            tokens.append(token)
+            last_end = match.end()
+    return tokens
+
+
+def fingerprint_project(project, extra=None):
+    """
+    Calculates a fingerprint over the normalized token streams of the files of
+    the solution, the exact contents of all other source files and headers of
+    a project, its libraries and limits.
+
+    :param project: project for which to calculate the fingerprint
+    :param extra: list of further strings influencing the result, e.g. flags
+    :returns: hex digest or None if the project contains position dependent
+              code that prevents reusing results
+    """
+    paths = list(project.harness)
+    for include in project.include:
+        paths += sorted(glob.glob(os.path.join(include, '*.h')))
+    digest = hashlib.sha256()
+    for value in [project.libs, project.build_flags, sorted(project.limits.items()), extra or []]:
+        digest.update(json.dumps(value).encode('utf-8'))
+    solution_paths = set(project.solution_paths)
+    for name, source, path in _read_sources(project.source_paths, project.sources, paths):
+        digest.update(name.encode('utf-8') + b'\0')
+        if path is not None and path not in solution_paths:
+            digest.update(b'\1' + source.encode('utf-8') + b'\0\0')
+            continue
+        tokens = tokenize(source)
+        if POSITION_DEPENDENT_TOKENS.intersection(tokens):
+            return None
+        digest.update(b'\2' + '\0'.join(tokens).encode('utf-8') + b'\0\0')
+    return digest.hexdigest()
+
+
+def hash_project(project, extra=None):
+    """
+    Calculates a hash over the exact contents of all source files and headers
+    of a project. Unlike fingerprint_project() every change in comments or
+    whitespace changes the hash, so it can be used as key for results that
+    contain line numbers, e.g. compiler messages.
+
+    :param project: project for which to calculate the hash
+    :param extra: list of further strings influencing the result, e.g. flags
+    :returns: hex digest
+    """
+    paths = list(project.harness)
+    for include in project.include:
+        paths += sorted(glob.glob(os.path.join(include, '*.h')))
+    digest = hashlib.sha256()
+    for value in [project.target, project.libs, project.build_flags, sorted(project.limits.items()),
+                  extra or []]:
+        digest.update(json.dumps(value).encode('utf-8'))
+    for name, source, _ in _read_sources(project.source_paths, project.sources, paths):
+        digest.update(name.encode('utf-8') + b'\0')
+        digest.update(source.encode('utf-8') + b'\0\0')
+    return digest.hexdigest()
+
+
+def _read_sources(source_paths, sources, other_paths):
+    """
+    Yields names, contents and paths of all files in the same order as the
+    compiler gets them. Source files given by content are used directly
+    without writing and reading them again, their path is None.
+    """
+    for f in source_paths:
+        with open(f, 'r', errors='replace') as fd:
+            yield os.path.basename(f), fd.read(), f
+    for name in sorted(sources):
+        source = sources[name]
+        if isinstance(source, bytes):
+            source = source.decode('utf-8', errors='replace')
+        yield name, source, None
+    for f in other_paths:
+        with open(f, 'r', errors='replace') as fd:
+            yield os.path.basename(f), fd.read(), f
+
+
+class ResultCache(object):
+    """
+    Stores the unit test results (ReportPart from CunitChecker) of projects as
+    JSON files in a directory, named by the fingerprint of the project.
+    """
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(self.path, exist_ok=True)
+
+    def get(self, key):
+        """
+        :param key: fingerprint of a project
+        :returns: cached ReportPart or None if there is no result for the key
+        """
+        try:
+            with open(os.path.join(self.path, key + '.json'), 'r') as fd:
+                data = json.load(fd)
+        except (FileNotFoundError, ValueError):
+            return None
+        return ReportPart.from_dict(data['source'], data['part'])
+
+    def put(self, key, part):
+        """
+        Stores a ReportPart under the given key. The file is written atomically,
+        so that concurrent workers never read incomplete results.
+
+        :param key: fingerprint of a project
+        :param part: ReportPart containing the unit test results
+        """
+        data = json.dumps({'source': part.source, 'part': json.loads(part.to_json())})
+        fd, temp_name = tempfile.mkstemp(dir=self.path)
+        try:
+            with os.fdopen(fd, 'w') as temp_file:
+                temp_file.write(data)
+            os.replace(temp_name, os.path.join(self.path, key + '.json'))
+        except OSError:
+            os.remove(temp_name)
+            raise
@@ -0,0 +1,546 @@
+/*
+ * Runs every CUnit test of the test executable in its own child process. The
+ * harness replaces CU_automated_run_tests() when the executable is linked
+ * with "-Wl,--wrap=CU_automated_run_tests", so the unit tests of a task do not
+ * have to be changed.
+ *
+ * A crash or an infinite loop in one test only fails this test, the results
+ * of all other tests are kept. Every test is killed after a timeout and
+ * several tests run in parallel, one per usable CPU. The results are written
+ * in the format of CUnit's automated interface into the file
+ * CUnitAutomated-Results.xml.
+ *
+ * All tests together have to finish within the wall clock time limit of the
+ * executable. The timeout of a test is shortened to the time that is left
+ * before this limit and tests that can not be started in time fail, so that
+ * the results of all finished tests are written before the executable is
+ * killed.
+ *
+ * The child process of a test only sends a status of fixed size (number of
+ * failed assertions and the first of them) on a pipe. All records are built
+ * by the parent process from a status that has been checked, every string
+ * from the child is escaped. A test that exits without a complete status
+ * fails. The standard output and standard error of a test go into a file and
+ * are copied to standard output by the parent without the record marker, so
+ * that output of the tests is never mistaken for results. The parent is not
+ * dumpable, so the tests can not reach its file descriptors via /proc.
+ *
+ * If CONCOCT_STREAM_RESULTS is defined, no file is written. Instead the result
+ * of every test is written on standard output as soon as the test finished,
+ * one record per line and a final record when all tests are finished:
+ *
+ *   \x1eCUNIT <token> <test suite="..." name="..." result="success"/>
+ *   \x1eCUNIT <token> <test suite="..." name="..." result="failure" file="..." line="..." condition="..."/>
+ *   \x1eCUNIT <token> <end/>
+ *
+ * The token is taken from the environment variable CONCOCT_RESULT_TOKEN. It is
+ * overwritten in the environment and in every child process before a test
+ * runs.
+ *
+ * Settings (compiler defines):
+ *   CONCOCT_TEST_TIMEOUT    wall clock time per test in seconds
+ *   CONCOCT_WALL_TIME       wall clock time limit of the executable in
+ *                           seconds, 0 for no limit
+ *   CONCOCT_TEST_JOBS       number of tests running in parallel, 0 for the
+ *                           number of usable CPUs
+ *   CONCOCT_STREAM_RESULTS  write results on standard output
+ *
+ * Authors: Martin Wichmann, Christian Wichmann
+ */
+
+#define _GNU_SOURCE
+
+#include <errno.h>
+#include <fcntl.h>
+#include <sched.h>
+#include <signal.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+#include <unistd.h>
+#include <sys/prctl.h>
+#include <sys/types.h>
+#include <sys/wait.h>
+#include <CUnit/CUnit.h>
+#include <CUnit/TestRun.h>
+
+#ifndef CONCOCT_TEST_TIMEOUT
+#define CONCOCT_TEST_TIMEOUT 2
+#endif
+
+#ifndef CONCOCT_TEST_JOBS
+#define CONCOCT_TEST_JOBS 0
+#endif
+
+#ifndef CONCOCT_WALL_TIME
+#define CONCOCT_WALL_TIME 0
+#endif
+
+/* time reserved for writing the results before the wall clock time limit */
+#define CONCOCT_WALL_TIME_MARGIN 1
+
+/* limits of the status of a test, it has to fit into the buffer of a pipe */
+#define CONCOCT_MAX_FAILURES 16
+#define CONCOCT_MAX_TEXT 256
+
+#define CONCOCT_RESULTS_FILE "CUnitAutomated-Results.xml"
+#define CONCOCT_RESULT_MARKER "\x1e" "CUNIT"
+#define CONCOCT_TOKEN_VARIABLE "CONCOCT_RESULT_TOKEN"
+
+#ifdef CONCOCT_STREAM_RESULTS
+static char concoct_token[128];
+#endif
+
+struct concoct_failure {
+    unsigned int line;
+    char file[CONCOCT_MAX_TEXT];
+    char condition[CONCOCT_MAX_TEXT];
+};
+
+/* written by the child process after the test */
+struct concoct_status {
+    unsigned int failures;
+    unsigned int count;
+    struct concoct_failure failure[CONCOCT_MAX_FAILURES];
+};
+
+struct concoct_test {
+    CU_pSuite suite;
+    CU_pTest test;
+    pid_t pid;
+    int result;
+    int output;
+    int status;
+    unsigned int timeout;
+    struct concoct_status *records;
+};
+
+/* escapes a string for XML, control characters are replaced, so that a
+   string can neither break a record nor the file */
+static void concoct_write_escaped(FILE *fd, const char *text)
+{
+    for (; text != NULL && *text != '\0'; text++) {
+        switch (*text) {
+        case '&':
+            fputs("&amp;", fd);
+            break;
+        case '<':
+            fputs("&lt;", fd);
+            break;
+        case '>':
+            fputs("&gt;", fd);
+            break;
+        case '"':
+            fputs("&quot;", fd);
+            break;
+        case '\n':
+            fputs("&#10;", fd);
+            break;
+        case '\r':
+            fputs("&#13;", fd);
+            break;
+        default:
+            fputc((unsigned char)*text < 0x20 || *text == 0x7f ? '?' : *text, fd);
+        }
+    }
+}
+
+#ifndef CONCOCT_STREAM_RESULTS
+static void concoct_write_success(FILE *fd, const char *test)
+{
+    fputs("            <CUNIT_RUN_TEST_RECORD> \n"
+          "              <CUNIT_RUN_TEST_SUCCESS> \n"
+          "                <TEST_NAME> ", fd);
+    concoct_write_escaped(fd, test);
+    fputs(" </TEST_NAME> \n"
+          "              </CUNIT_RUN_TEST_SUCCESS> \n"
+          "            </CUNIT_RUN_TEST_RECORD> \n", fd);
+}
+
+static void concoct_write_failure(FILE *fd, const char *test, const char *file,
+                                  unsigned int line, const char *condition)
+{
+    fputs("            <CUNIT_RUN_TEST_RECORD> \n"
+          "              <CUNIT_RUN_TEST_FAILURE> \n"
+          "                <TEST_NAME> ", fd);
+    concoct_write_escaped(fd, test);
+    fputs(" </TEST_NAME> \n"
+          "                <FILE_NAME> ", fd);
+    concoct_write_escaped(fd, file);
+    fprintf(fd, " </FILE_NAME> \n"
+                "                <LINE_NUMBER> %u </LINE_NUMBER> \n"
+                "                <CONDITION> ", line);
+    concoct_write_escaped(fd, condition);
+    fputs(" </CONDITION> \n"
+          "              </CUNIT_RUN_TEST_FAILURE> \n"
+          "            </CUNIT_RUN_TEST_RECORD> \n", fd);
+}
+#else
+static void concoct_write_record(FILE *fd, const char *suite, const char *test, const char *file,
+                                 unsigned int line, const char *condition)
+{
+    fputs("<test suite=\"", fd);
+    concoct_write_escaped(fd, suite);
+    fputs("\" name=\"", fd);
+    concoct_write_escaped(fd, test);
+    if (condition == NULL) {
+        fputs("\" result=\"success\"/>\n", fd);
+        return;
+    }
+    fputs("\" result=\"failure\" file=\"", fd);
+    concoct_write_escaped(fd, file);
+    fprintf(fd, "\" line=\"%u\" condition=\"", line);
+    concoct_write_escaped(fd, condition);
+    fputs("\"/>\n", fd);
+}
+#endif
+
+/* writes a single result of a test, condition is NULL for a passed test */
+static void concoct_write_result(FILE *fd, struct concoct_test *t, const char *file,
+                                 unsigned int line, const char *condition)
+{
+#ifdef CONCOCT_STREAM_RESULTS
+    fprintf(fd, "\n%s %s ", CONCOCT_RESULT_MARKER, concoct_token);
+    concoct_write_record(fd, t->suite->pName, t->test->pName, file, line, condition);
+    fflush(fd);
+#else
+    if (condition == NULL)
+        concoct_write_success(fd, t->test->pName);
+    else
+        concoct_write_failure(fd, t->test->pName, file, line, condition);
+#endif
+}
+
+static int concoct_usable_cpus(void)
+{
+    cpu_set_t cpus;
+
+    if (sched_getaffinity(0, sizeof(cpus), &cpus) == 0 && CPU_COUNT(&cpus) > 0)
+        return CPU_COUNT(&cpus);
+    return 1;
+}
+
+static void concoct_copy_text(char *target, const char *text)
+{
+    snprintf(target, CONCOCT_MAX_TEXT, "%s", text != NULL ? text : "");
+}
+
+/* runs in the child process, writes the status of the test and exits */
+static void concoct_run_child(struct concoct_test *t, struct concoct_test *tests, size_t count)
+{
+    static struct concoct_status status;
+    CU_pFailureRecord failure;
+    size_t i;
+
+#ifdef CONCOCT_STREAM_RESULTS
+    memset(concoct_token, 0, sizeof(concoct_token));
+#endif
+    /* only the pipe of this test is kept, output goes into the file */
+    for (i = 0; i < count; i++) {
+        if (&tests[i] == t || tests[i].pid <= 0 || tests[i].result < 0)
+            continue;
+        close(tests[i].result);
+        close(tests[i].output);
+    }
+    if (dup2(t->output, STDOUT_FILENO) < 0 || dup2(t->output, STDERR_FILENO) < 0)
+        _exit(EXIT_FAILURE);
+    close(t->output);
+
+    alarm(t->timeout);
+    CU_run_test(t->suite, t->test);
+    for (failure = CU_get_failure_list(); failure != NULL; failure = failure->pNext) {
+        if (status.count < CONCOCT_MAX_FAILURES) {
+            status.failure[status.count].line = failure->uiLineNumber;
+            concoct_copy_text(status.failure[status.count].file, failure->strFileName);
+            concoct_copy_text(status.failure[status.count].condition, failure->strCondition);
+            status.count++;
+        }
+        status.failures++;
+    }
+    if (write(t->result, &status, sizeof(status)) != (ssize_t)sizeof(status))
+        _exit(EXIT_FAILURE);
+    /* skip atexit handlers of the parent */
+    fflush(NULL);
+    _exit(EXIT_SUCCESS);
+}
+
+/* returns the whole seconds left before the wall clock time limit */
+static unsigned int concoct_time_left(const struct timespec *start)
+{
+    struct timespec now;
+    long left;
+
+    if (CONCOCT_WALL_TIME <= 0)
+        return CONCOCT_TEST_TIMEOUT;
+    clock_gettime(CLOCK_MONOTONIC, &now);
+    left = CONCOCT_WALL_TIME - CONCOCT_WALL_TIME_MARGIN - (now.tv_sec - start->tv_sec);
+    if (now.tv_nsec < start->tv_nsec)
+        left--;
+    return left > 0 ? (unsigned int)left : 0;
+}
+
+static void concoct_start_test(struct concoct_test *t, int index, const struct timespec *start,
+                               struct concoct_test *tests, size_t count)
+{
+    char name[64];
+    unsigned int left = concoct_time_left(start);
+    int result[2];
+
+    t->timeout = left < CONCOCT_TEST_TIMEOUT ? left : CONCOCT_TEST_TIMEOUT;
+    if (t->timeout == 0)
+        return;
+    /* the file is created in the working directory, because there may be no
+       temporary directory inside of the secure environment */
+    snprintf(name, sizeof(name), ".concoct-test-%d-%d", (int)getpid(), index);
+    t->output = open(name, O_RDWR | O_CREAT | O_EXCL, 0600);
+    if (t->output < 0)
+        return;
+    unlink(name);
+    /* the status is read after the child exited, processes started by the
+       test may still hold the pipe, so reading must not block */
+    if (pipe(result) != 0) {
+        close(t->output);
+        t->output = -1;
+        return;
+    }
+    fcntl(result[0], F_SETFL, O_NONBLOCK);
+    fflush(NULL);
+    t->pid = fork();
+    if (t->pid == 0) {
+        close(result[0]);
+        t->result = result[1];
+        concoct_run_child(t, tests, count);
+    }
+    close(result[1]);
+    t->result = result[0];
+    if (t->pid < 0) {
+        close(t->result);
+        close(t->output);
+        t->result = t->output = -1;
+    }
+}
+
+/* copies the output of a test on standard output without record markers */
+static void concoct_copy_output(int output)
+{
+    char buffer[4096];
+    ssize_t length, i;
+    off_t offset = 0;
+
+    while ((length = pread(output, buffer, sizeof(buffer), offset)) > 0) {
+        for (i = 0; i < length; i++)
+            if (buffer[i] == CONCOCT_RESULT_MARKER[0])
+                buffer[i] = '?';
+        fwrite(buffer, 1, length, stdout);
+        offset += length;
+    }
+    fflush(stdout);
+}
+
+/* terminates a string of the child and replaces all but printable ASCII, an
+   invalid UTF-8 sequence would make the result file unreadable */
+static void concoct_check_text(char *text)
+{
+    text[CONCOCT_MAX_TEXT - 1] = '\0';
+    for (; *text != '\0'; text++)
+        if ((unsigned char)*text < 0x20 || (unsigned char)*text >= 0x7f)
+            *text = '?';
+}
+
+/* reads the status of a finished child, it is only kept if it is complete */
+static void concoct_collect_test(struct concoct_test *t)
+{
+    struct concoct_status *status = malloc(sizeof(*status));
+    size_t size = 0;
+    ssize_t length;
+    char extra;
+    unsigned int i;
+
+    while (status != NULL && size < sizeof(*status)) {
+        length = read(t->result, (char *)status + size, sizeof(*status) - size);
+        if (length < 0 && errno == EINTR)
+            continue;
+        if (length <= 0)
+            break;
+        size += length;
+    }
+    /* exactly one status and nothing else */
+    if (status != NULL && (size != sizeof(*status) || read(t->result, &extra, 1) > 0
+                           || status->count > CONCOCT_MAX_FAILURES || status->count > status->failures)) {
+        free(status);
+        status = NULL;
+    }
+    for (i = 0; status != NULL && i < status->count; i++) {
+        concoct_check_text(status->failure[i].file);
+        concoct_check_text(status->failure[i].condition);
+    }
+    t->records = status;
+    concoct_copy_output(t->output);
+    close(t->result);
+    close(t->output);
+    t->result = t->output = -1;
+}
+
+/* writes the records of a test or a failure if the test did not finish */
+static void concoct_write_test(FILE *fd, struct concoct_test *t)
+{
+    char condition[128];
+    unsigned int i;
+
+    if (t->pid <= 0 && t->timeout == 0) {
+        snprintf(condition, sizeof(condition), "Test was not started within wall clock time limit of %d seconds",
+                 CONCOCT_WALL_TIME);
+    } else if (t->pid <= 0) {
+        snprintf(condition, sizeof(condition), "Test could not be started");
+    } else if (WIFSIGNALED(t->status) && WTERMSIG(t->status) == SIGALRM) {
+        snprintf(condition, sizeof(condition), "Test exceeded time limit of %u seconds", t->timeout);
+    } else if (WIFSIGNALED(t->status)) {
+        snprintf(condition, sizeof(condition), "Test was killed by signal %d (%s)",
+                 WTERMSIG(t->status), strsignal(WTERMSIG(t->status)));
+    } else if (WEXITSTATUS(t->status) != EXIT_SUCCESS) {
+        snprintf(condition, sizeof(condition), "Test exited with code %d",
+                 WEXITSTATUS(t->status));
+    } else if (t->records == NULL) {
+        snprintf(condition, sizeof(condition), "Test exited without result");
+    } else {
+        if (t->records->failures == 0)
+            concoct_write_result(fd, t, NULL, 0, NULL);
+        for (i = 0; i < t->records->count; i++)
+            concoct_write_result(fd, t, t->records->failure[i].file, t->records->failure[i].line,
+                                 t->records->failure[i].condition);
+        if (t->records->failures > t->records->count) {
+            snprintf(condition, sizeof(condition), "%u more assertions failed",
+                     t->records->failures - t->records->count);
+            concoct_write_result(fd, t, "", 0, condition);
+        }
+        return;
+    }
+    concoct_write_result(fd, t, "", 0, condition);
+}
+
+#ifndef CONCOCT_STREAM_RESULTS
+static void concoct_write_results(struct concoct_test *tests, size_t count)
+{
+    FILE *fd = fopen(CONCOCT_RESULTS_FILE, "w");
+    size_t i;
+
+    if (fd == NULL) {
+        perror(CONCOCT_RESULTS_FILE);
+        return;
+    }
+    fputs("<?xml version=\"1.0\" ?> \n"
+          "<CUNIT_TEST_RUN_REPORT> \n"
+          "  <CUNIT_HEADER/> \n"
+          "  <CUNIT_RESULT_LISTING> \n", fd);
+    for (i = 0; i < count; i++) {
+        if (i == 0 || tests[i].suite != tests[i - 1].suite) {
+            if (i > 0)
+                fputs("        </CUNIT_RUN_SUITE_SUCCESS> \n"
+                      "      </CUNIT_RUN_SUITE> \n", fd);
+            fputs("      <CUNIT_RUN_SUITE> \n"
+                  "        <CUNIT_RUN_SUITE_SUCCESS> \n"
+                  "          <SUITE_NAME> ", fd);
+            concoct_write_escaped(fd, tests[i].suite->pName);
+            fputs(" </SUITE_NAME> \n", fd);
+        }
+        concoct_write_test(fd, &tests[i]);
+    }
+    if (count > 0)
+        fputs("        </CUNIT_RUN_SUITE_SUCCESS> \n"
+              "      </CUNIT_RUN_SUITE> \n", fd);
+    fputs("  </CUNIT_RESULT_LISTING> \n"
+          "</CUNIT_TEST_RUN_REPORT> \n", fd);
+    fclose(fd);
+}
+#endif
+
+void __wrap_CU_automated_run_tests(void)
+{
+    CU_pTestRegistry registry = CU_get_registry();
+    CU_pSuite suite;
+    CU_pTest test;
+    struct concoct_test *tests;
+    struct timespec start;
+    size_t count = 0, next = 0, i;
+    int jobs = CONCOCT_TEST_JOBS > 0 ? CONCOCT_TEST_JOBS : concoct_usable_cpus();
+    int running = 0, status;
+    pid_t pid;
+#ifdef CONCOCT_STREAM_RESULTS
+    char *token = getenv(CONCOCT_TOKEN_VARIABLE);
+#endif
+
+    if (registry == NULL)
+        return;
+    clock_gettime(CLOCK_MONOTONIC, &start);
+    /* the tests run as the same user, but can not open the standard output
+       of a non-dumpable process via /proc */
+    prctl(PR_SET_DUMPABLE, 0);
+#ifdef CONCOCT_STREAM_RESULTS
+    /* unsetenv() keeps the string in memory and in /proc/self/environ */
+    if (token != NULL) {
+        snprintf(concoct_token, sizeof(concoct_token), "%s", token);
+        memset(token, 0, strlen(token));
+    }
+    unsetenv(CONCOCT_TOKEN_VARIABLE);
+#endif
+    for (suite = registry->pSuite; suite != NULL; suite = suite->pNext)
+        for (test = suite->pTest; test != NULL; test = test->pNext)
+            count++;
+    tests = calloc(count > 0 ? count : 1, sizeof(*tests));
+    if (tests == NULL)
+        return;
+    /* collect all active tests in the order of the registry */
+    count = 0;
+    for (suite = registry->pSuite; suite != NULL; suite = suite->pNext) {
+        for (test = suite->pTest; test != NULL; test = test->pNext) {
+            if (!suite->fActive || !test->fActive)
+                continue;
+            tests[count].suite = suite;
+            tests[count].test = test;
+            tests[count].result = -1;
+            tests[count].output = -1;
+            count++;
+        }
+    }
+
+    while (next < count || running > 0) {
+        while (running < jobs && next < count) {
+            concoct_start_test(&tests[next], (int)next, &start, tests, next);
+            if (tests[next].pid > 0)
+                running++;
+            next++;
+        }
+        pid = waitpid(-1, &status, 0);
+        if (pid < 0) {
+            if (errno == EINTR)
+                continue;
+            break;
+        }
+        for (i = 0; i < next; i++) {
+            if (tests[i].pid == pid && tests[i].result >= 0) {
+                tests[i].status = status;
+                concoct_collect_test(&tests[i]);
+#ifdef CONCOCT_STREAM_RESULTS
+                concoct_write_test(stdout, &tests[i]);
+#endif
+                running--;
+                break;
+            }
+        }
+    }
+
+#ifdef CONCOCT_STREAM_RESULTS
+    /* tests that could not be started */
+    for (i = 0; i < count; i++)
+        if (tests[i].pid <= 0)
+            concoct_write_test(stdout, &tests[i]);
+    printf("\n%s %s <end/>\n", CONCOCT_RESULT_MARKER, concoct_token);
+    fflush(stdout);
+#else
+    concoct_write_results(tests, count);
+#endif
+    for (i = 0; i < count; i++)
+        free(tests[i].records);
+    free(tests);
+}
@@ -0,0 +1,103 @@
+/*
+ * Runs the unit test executable as child process and reports its resource
+ * usage on standard error after it exited. This program is copied into every
+ * secure environment by libConCoct and measures from outside of the untrusted
+ * executable, so that the reported CPU time, wall clock time and peak memory
+ * can not be changed by the tests.
+ *
+ * Usage:
+ *   concoct-measure <token file or "-" for standard input> <executable>
+ *
+ * Output format (last line):
+ *   CONCOCT_RUSAGE token=<token> cpu_time=<seconds> wall_time=<seconds> max_rss=<kilobytes>
+ *
+ * The token is a random string chosen by the runner for every run. It is read
+ * before the executable starts, the token file is removed and this process is
+ * made non-dumpable, so that the tests can neither read the token nor print a
+ * valid line themselves. The exit code of the executable is passed on, for
+ * a signal it is 128 plus the number of the signal like in a shell.
+ *
+ * Authors: Martin Wichmann, Christian Wichmann
+ */
+
+#define _GNU_SOURCE
+
+#include <errno.h>
+#include <fcntl.h>
+#include <stdio.h>
+#include <string.h>
+#include <time.h>
+#include <unistd.h>
+#include <sys/prctl.h>
+#include <sys/resource.h>
+#include <sys/types.h>
+#include <sys/wait.h>
+
+static double concoct_seconds(struct timeval tv)
+{
+    return tv.tv_sec + tv.tv_usec / 1e6;
+}
+
+int main(int argc, char *argv[])
+{
+    char token[128] = "";
+    struct timespec start_time, end_time;
+    struct rusage usage;
+    FILE *fd;
+    pid_t pid;
+    int status, null;
+
+    if (argc < 3) {
+        fprintf(stderr, "Usage: %s TOKEN_FILE EXECUTABLE\n", argv[0]);
+        return 127;
+    }
+    fd = strcmp(argv[1], "-") == 0 ? stdin : fopen(argv[1], "r");
+    if (fd == NULL || fgets(token, sizeof(token), fd) == NULL) {
+        perror(argv[1]);
+        return 127;
+    }
+    token[strcspn(token, "\r\n")] = '\0';
+    if (fd != stdin) {
+        fclose(fd);
+        if (unlink(argv[1]) != 0) {
+            perror(argv[1]);
+            return 127;
+        }
+    }
+    /* the tests may run as the same user, but can not read the memory of a
+       non-dumpable process without CAP_SYS_PTRACE */
+    prctl(PR_SET_DUMPABLE, 0);
+
+    clock_gettime(CLOCK_MONOTONIC, &start_time);
+    pid = fork();
+    if (pid < 0) {
+        perror("fork");
+        return 127;
+    }
+    if (pid == 0) {
+        null = open("/dev/null", O_RDONLY);
+        if (null >= 0) {
+            dup2(null, STDIN_FILENO);
+            close(null);
+        }
+        execv(argv[2], &argv[2]);
+        perror(argv[2]);
+        _exit(127);
+    }
+    /* the usage of the child includes all of its waited-for children, e.g.
+       the processes of the fork harness */
+    while (wait4(pid, &status, 0, &usage) < 0) {
+        if (errno != EINTR) {
+            perror("wait4");
+            return 127;
+        }
+    }
+    clock_gettime(CLOCK_MONOTONIC, &end_time);
+    fprintf(stderr, "\nCONCOCT_RUSAGE token=%s cpu_time=%.6f wall_time=%.6f max_rss=%ld\n", token,
+            concoct_seconds(usage.ru_utime) + concoct_seconds(usage.ru_stime),
+            (end_time.tv_sec - start_time.tv_sec) + (end_time.tv_nsec - start_time.tv_nsec) / 1e9,
+            usage.ru_maxrss);
+    if (WIFSIGNALED(status))
+        return 128 + WTERMSIG(status);
+    return WEXITSTATUS(status);
+}
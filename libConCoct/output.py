@@ -0,0 +1,122 @@
+"""
+Contains helper classes to capture the output of external programs like the
+compiler, CppCheck or the unit tests with a bounded amount of memory.
+
+Output that exceeds the limit is truncated while it is read. Only the first
+and the last part of the output are retained, because they usually contain the
+most relevant messages, e.g. the first compiler error and the summary.
+
+Authors: Martin Wichmann, Christian Wichmann
+"""
+
+import threading
+
+
+# default limit for each output stream in bytes
+DEFAULT_OUTPUT_LIMIT = 2**20
+
+
+class BoundedBuffer(object):
+    """
+    Stores the first and the last bytes of all data written to it. Half of the
+    limit is used for the head and the other half for the tail. All bytes
+    between head and tail are dropped and only counted.
+    """
+    truncation_marker = '\n[... {} bytes truncated ...]\n'
+
+    def __init__(self, limit=DEFAULT_OUTPUT_LIMIT):
+        self.head_limit = limit // 2
+        self.tail_limit = limit - self.head_limit
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.dropped = 0
+
+    def write(self, data):
+        free = self.head_limit - len(self.head)
+        if free > 0:
+            self.head += data[:free]
+            data = data[free:]
+        if data:
+            self.tail += data
+            excess = len(self.tail) - self.tail_limit
+            if excess > 0:
+                del self.tail[:excess]
+                self.dropped += excess
+
+    @property
+    def truncated(self):
+        return self.dropped > 0
+
+    def getvalue(self):
+        """
+        Returns the retained output as string. If output has been dropped, a
+        marker line with the number of dropped bytes is inserted between head
+        and tail.
+        """
+        head = self.head.decode('utf-8', errors='replace')
+        tail = self.tail.decode('utf-8', errors='replace')
+        if self.truncated:
+            return head + self.truncation_marker.format(self.dropped) + tail
+        return head + tail
+
+
+def capture_streams(streams, limit=DEFAULT_OUTPUT_LIMIT, chunk_size=2**16, consumers=None):
+    """
+    Reads all given streams concurrently until they are closed. Every stream is
+    read by its own thread, so that a program filling up one pipe can not block
+    while the other pipe is read.
+
+    :param streams: list of binary file-like objects to read from
+    :param limit: maximum number of bytes to retain for each stream
+    :param chunk_size: number of bytes read at once
+    :param consumers: optional list with a function or None for each stream,
+                      the function is called with every chunk as soon as it
+                      has been read, independent of the limit
+    :returns: list of BoundedBuffer objects, one for each stream
+    """
+    buffers = [BoundedBuffer(limit) for _ in streams]
+    if consumers is None:
+        consumers = [None] * len(streams)
+
+    def read_stream(stream, buffer, consumer):
+        for chunk in iter(lambda: stream.read(chunk_size), b''):
+            buffer.write(chunk)
+            if consumer:
+                consumer(chunk)
+
+    threads = [threading.Thread(target=read_stream, args=args) for args in zip(streams, buffers, consumers)]
+    for t in threads:
+        t.daemon = True
+        t.start()
+    for t in threads:
+        t.join()
+    return buffers
+
+
+def capture_process(proc, limit=DEFAULT_OUTPUT_LIMIT):
+    """
+    Reads standard output and standard error of a process that has been
+    started with binary pipes and waits for the process to finish.
+
+    :param proc: Popen object of the process
+    :param limit: maximum number of bytes to retain for each stream
+    :returns: tuple of BoundedBuffer objects for stdout and stderr
+    """
+    outs, errs = capture_streams([proc.stdout, proc.stderr], limit)
+    proc.stdout.close()
+    proc.stderr.close()
+    proc.wait()
+    return outs, errs
+
+
+def truncation_info(**buffers):
+    """
+    Collects the number of dropped bytes of all truncated buffers, so it can be
+    stored in a ReportPart.
+
+    :param buffers: BoundedBuffer objects by name of their stream
+    :returns: dictionary with dropped bytes by stream name or None if no buffer
+              has been truncated
+    """
+    info = {name: b.dropped for name, b in buffers.items() if b.truncated}
+    return info or None
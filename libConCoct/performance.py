@@ -0,0 +1,114 @@
+"""
+Contains a class to check the measured resource usage of the unit tests
+against performance budgets defined by a task.
+
+The resource usage is measured outside of the untrusted test executable by a
+small program that starts it as child process (see harness/measure.c). The
+program is copied into the secure environment by the runners of the unittest
+module, which parse its report.
+
+Authors: Martin Wichmann, Christian Wichmann
+"""
+
+import os
+import re
+import hashlib
+import tempfile
+import subprocess
+
+from .report import Message
+from .report import ReportPart
+
+
+# source of the program measuring the resource usage of the test executable
+MEASURE_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'harness', 'measure.c')
+
+
+def build_measure_program():
+    """
+    Compiles the program measuring the resource usage statically, so that it
+    runs in every secure environment. It is built only once for every version
+    of its source and shared by all processes on this host.
+
+    :returns: path to the program
+    """
+    with open(MEASURE_SOURCE, 'rb') as fd:
+        digest = hashlib.sha256(fd.read()).hexdigest()[:16]
+    path = os.path.join(tempfile.gettempdir(), 'concoct-measure-{}'.format(digest))
+    if os.path.exists(path):
+        return path
+    # build into a temporary file, so that no other process sees it partially
+    temp_path = '{}.{}'.format(path, os.getpid())
+    proc = subprocess.Popen(['gcc', '-static', '-O2', '-s', '-o', temp_path, MEASURE_SOURCE],
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    output, _ = proc.communicate()
+    if proc.returncode != 0:
+        raise OSError('Could not build measuring program: {}'.format(output.decode('utf-8', errors='replace')))
+    os.replace(temp_path, path)
+    return path
+
+
+class ResourceUsageParser(object):
+    """
+    Parses the line with the resource usage written by the measuring program
+    to standard error. Only lines with the token of the run are used, so the
+    tests can not report their own values. CPU time and wall clock time are
+    returned in seconds, the peak memory (maximum resident set size) in bytes.
+
+    :param token: random string passed to the measuring program for this run
+    """
+    pattern = re.compile(r"""CONCOCT_RUSAGE token=(\w+) cpu_time=([\d.]+) wall_time=([\d.]+) max_rss=(\d+)""")
+
+    def __init__(self, token):
+        self.token = token
+
+    def parse(self, data):
+        """
+        :param data: string containing standard error of the test executable
+        :returns: dictionary with resource usage or None if not found
+        """
+        stats = None
+        for match in self.pattern.finditer(data or ''):
+            if match.group(1) != self.token:
+                continue
+            stats = {'cpu_time': float(match.group(2)),
+                     'wall_time': float(match.group(3)),
+                     'max_rss': int(match.group(4)) * 1024}
+        return stats
+
+
+class PerformanceChecker(object):
+    """
+    Checks the resource usage of the unit tests against the budgets of a task.
+    Budgets are defined in the "performance" entry of the tasks config.json:
+
+        "performance": {"cpu_time": 0.5, "wall_time": 1.0, "max_rss": 2097152,
+                        "severity": "warning"}
+
+    All budgets are optional. If "severity" is "error", exceeding a budget
+    lets the performance check fail, otherwise only warnings are created.
+    """
+    units = {'cpu_time': 's', 'wall_time': 's', 'max_rss': ' bytes'}
+
+    def __init__(self, budgets):
+        self.budgets = budgets
+        self.report_name = 'performance'
+
+    def check(self, stats):
+        """
+        :param stats: dictionary with resource usage of unit tests
+        :returns: ReportPart containing a message for every exceeded budget
+        """
+        severity = self.budgets.get('severity', 'warning')
+        if not stats:
+            message = Message(_type='warning', _file='', line='',
+                              desc='Resource usage of unit tests could not be measured.')
+            return ReportPart(self.report_name, 0, [message])
+        messages = []
+        for key in sorted(self.units):
+            if key in self.budgets and stats[key] > self.budgets[key]:
+                desc = '{key} of {value}{unit} exceeds budget of {budget}{unit}'.format(
+                       key=key, value=stats[key], budget=self.budgets[key], unit=self.units[key])
+                messages.append(Message(_type=severity, _file='', line='', desc=desc))
+        returncode = 1 if messages and severity == 'error' else 0
+        return ReportPart(self.report_name, returncode, messages)
@@ -0,0 +1,122 @@
+"""
+Contains a class to place concurrent runs of unit tests on separate CPU cores.
+
+Every run gets exclusive cores, so that concurrent runs neither have to share
+a single core nor disturb each others timing. The occupancy of all cores is
+tracked with lock files, so that all worker processes on the same host share
+it. Locks of crashed processes are released automatically by the kernel.
+
+Authors: Martin Wichmann, Christian Wichmann
+"""
+
+import fcntl
+import os
+import tempfile
+import time
+
+
+class CpuPlacer(object):
+    """
+    Hands out free CPU cores to runs. If all cores are occupied, the caller
+    waits until a core is released.
+
+    >>> with placer.place() as cpuset:
+    ...     run_container(cpuset=cpuset)
+
+    :ivar cpus:          list of core numbers that can be used for runs
+    :ivar cores_per_run: number of cores every run gets
+    """
+    def __init__(self, cpus=None, cores_per_run=1, lock_dir=None, poll_interval=0.05, timeout=None):
+        if cpus is None:
+            cpus = sorted(os.sched_getaffinity(0))
+        if lock_dir is None:
+            lock_dir = os.path.join(tempfile.gettempdir(), 'concoct-cpus')
+        self.cpus = list(cpus)
+        self.cores_per_run = min(cores_per_run, len(self.cpus))
+        self.lock_dir = lock_dir
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        os.makedirs(self.lock_dir, exist_ok=True)
+
+    def try_acquire(self):
+        """
+        Tries to lock enough free cores for one run without waiting.
+
+        :returns: dictionary of locked cores and their file descriptors or None
+                  if not enough cores are free
+        """
+        locked = {}
+        for cpu in self.cpus:
+            fd = os.open(os.path.join(self.lock_dir, 'cpu{}.lock'.format(cpu)), os.O_RDWR | os.O_CREAT, 0o666)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                continue
+            locked[cpu] = fd
+            if len(locked) == self.cores_per_run:
+                return locked
+        self.release(locked)
+        return None
+
+    def acquire(self):
+        """
+        Locks free cores for one run and waits if the host is saturated.
+
+        :returns: dictionary of locked cores and their file descriptors
+        :raises TimeoutError: if no cores became free within the timeout
+        """
+        start = time.monotonic()
+        waiting = False
+        while True:
+            locked = self.try_acquire()
+            if locked is not None:
+                return locked
+            if self.timeout is not None and time.monotonic() - start > self.timeout:
+                raise TimeoutError('No free CPU core for running unit tests.')
+            if not waiting:
+                print('All CPU cores occupied, waiting...')
+                waiting = True
+            time.sleep(self.poll_interval)
+
+    def release(self, locked):
+        for fd in locked.values():
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def place(self):
+        """
+        Returns a context manager that locks free cores on entering and returns
+        them as cpuset string (e.g. "2" or "2,3") for Docker or taskset.
+        """
+        return _Placement(self)
+
+    def occupancy(self):
+        """
+        :returns: number of cores currently occupied by runs of all processes
+        """
+        locked = 0
+        for cpu in self.cpus:
+            fd = os.open(os.path.join(self.lock_dir, 'cpu{}.lock'.format(cpu)), os.O_RDWR | os.O_CREAT, 0o666)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            except OSError:
+                locked += 1
+            finally:
+                os.close(fd)
+        return locked
+
+
+class _Placement(object):
+    def __init__(self, placer):
+        self.placer = placer
+        self.locked = None
+
+    def __enter__(self):
+        self.locked = self.placer.acquire()
+        return ','.join(str(cpu) for cpu in sorted(self.locked))
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.placer.release(self.locked)
+        self.locked = None
@@ -7,8 +7,32 @@ results.
 Authors: Martin Wichmann, Christian Wichmann
 """
 
+import re
+import copy
 import json
 import xml.etree.ElementTree
+from collections import OrderedDict
+
+
+# default maximum number of messages kept in every part of a report
+DEFAULT_MESSAGE_LIMIT = 100
+
+# quoted names and numbers that are ignored when comparing descriptions
+QUOTED_PATTERN = re.compile(r"'[^']*'|\u2018[^\u2019]*\u2019|\"[^\"]*\"")
+NUMBER_PATTERN = re.compile(r'\b\d+\b')
+
+
+def message_pattern(desc):
+    """
+    Returns the description of a message with all quoted names and numbers
+    replaced, so that e.g. "'x' undeclared" and "'y' undeclared" have the
+    same pattern.
+
+    :param desc: description of a message
+    :returns: pattern of the description
+    """
+    desc = QUOTED_PATTERN.sub("'*'", str(desc or ''))
+    return NUMBER_PATTERN.sub('0', desc)
 
 
 class ReportJSONEncoder(json.JSONEncoder):
@@ -21,7 +45,7 @@ class ReportJSONEncoder(json.JSONEncoder):
     >>> json.dumps(some_report, default=ReportJSONEncoder)
     {"gcc": {"messages": [{"type": "", "line": "", "desc": "", "file": ""}, ...], "returncode": 0}, ...}
     """
-    # TODO Write JSONDecoder.
+    # Decoding is done by the from_dict() methods of the report classes.
     def default(self, obj):
         if isinstance(obj, Report):
             report_object = {}
@@ -34,6 +58,10 @@ class ReportJSONEncoder(json.JSONEncoder):
             report_part_object['messages'] = [ReportJSONEncoder().default(m) for m in obj.messages]
             if obj.tests:
                 report_part_object['tests'] = obj.tests
+            if obj.truncated:
+                report_part_object['truncated'] = obj.truncated
+            if obj.stats:
+                report_part_object['stats'] = obj.stats
             return report_part_object
         elif isinstance(obj, Message):
             message_part_object = {}
@@ -59,6 +87,19 @@ class Report(object):
             ret += str(p)
         return ret
 
+    def aggregate(self, limit=DEFAULT_MESSAGE_LIMIT):
+        """
+        Collapses similar messages and limits the number of messages in every
+        part of this report (see ReportPart.aggregate()).
+
+        :param limit: maximum number of messages in every part or None
+        :returns: new Report object
+        """
+        report = Report()
+        for part in self.parts:
+            report.add_part(part.aggregate(limit))
+        return report
+
     def to_json(self):
         """
         Converts data from this report to JSON format. First all data from
@@ -69,6 +110,19 @@ class Report(object):
         """
         return json.dumps(self, cls=ReportJSONEncoder)
 
+    @classmethod
+    def from_json(cls, data):
+        """
+        Creates a report from its JSON representation (see to_json()).
+
+        :param data: string containing a JSON representation of a report
+        :returns: new Report object
+        """
+        report = cls()
+        for source, part in json.loads(data).items():
+            report.add_part(ReportPart.from_dict(source, part))
+        return report
+
     def to_xml(self):
         """
         Builds a XML representation of all report parts in this report and all
@@ -76,26 +130,82 @@ class Report(object):
 
         :returns: string containing XML representation of this report
         """
+        return xml.etree.ElementTree.tostring(self.to_xml_element())
+
+    def to_xml_element(self, **attributes):
+        """
+        Builds the XML Element containing all report parts of this report.
+
+        :param attributes: additional attributes for the report element, e.g.
+                           task and user
+        :returns: XML Element containing all data of this report
+        """
         # TODO Check if some serialization library like pyxser would be better.
-        report_root = xml.etree.ElementTree.Element('report')
+        report_root = xml.etree.ElementTree.Element('report', attrib=attributes)
         for part in self.parts:
             report_root.append(part.to_xml())
-        return xml.etree.ElementTree.tostring(report_root)
+        return report_root
 
 
 class ReportPart(object):
-    def __init__(self, source, returncode, messages, tests=None):
+    """
+    Contains all messages from a single source (CppCheck, compiler, unit
+    tests). If the output of the source has been too long, the attribute
+    "truncated" contains the number of dropped bytes for each output stream.
+    The attribute "stats" contains the measured resource usage of the unit
+    tests (CPU time, wall clock time, peak memory).
+    """
+    def __init__(self, source, returncode, messages, tests=None, truncated=None, stats=None):
         self.source = source
         self.returncode = returncode
         self.messages = messages
         self.tests = tests
+        self.truncated = truncated
+        self.stats = stats
 
     def __str__(self):
         ret = '{} {}\n'.format(self.source, self.returncode)
         for m in self.messages:
             ret += '  ' + str(m) + '\n'
+        if self.truncated and self.truncated.get('messages'):
+            ret += '  [... {} more messages ...]\n'.format(self.truncated['messages'])
         return ret
 
+    def aggregate(self, limit=DEFAULT_MESSAGE_LIMIT):
+        """
+        Collapses messages with the same type, file and description pattern
+        (see message_pattern()) into the first of them. A collapsed message
+        gets the attributes "count" with the number of occurrences and "lines"
+        with the line numbers of all occurrences. If more than limit messages
+        remain, the rest is dropped and their number is stored as "messages"
+        in the attribute "truncated".
+
+        :param limit: maximum number of messages or None
+        :returns: new ReportPart object, this part is not changed
+        """
+        groups = OrderedDict()
+        for m in self.messages:
+            key = (m.type, m.file, message_pattern(m.desc))
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = copy.copy(m)
+                if hasattr(group, 'lines'):
+                    group.lines = list(group.lines)
+                continue
+            if not hasattr(group, 'count'):
+                group.count = 1
+                group.lines = [group.line]
+            group.count += getattr(m, 'count', 1)
+            group.lines += getattr(m, 'lines', [m.line])
+        messages = list(groups.values())
+        truncated = dict(self.truncated) if self.truncated else {}
+        if limit is not None and len(messages) > limit:
+            dropped = sum(getattr(m, 'count', 1) for m in messages[limit:])
+            truncated['messages'] = truncated.get('messages', 0) + dropped
+            messages = messages[:limit]
+        return ReportPart(self.source, self.returncode, messages, tests=self.tests, truncated=truncated or None,
+                          stats=self.stats)
+
     def to_json(self):
         """
         Converts data from this report part to JSON format. This includes all
@@ -105,17 +215,43 @@ class ReportPart(object):
         """
         return json.dumps(self, cls=ReportJSONEncoder)
 
+    @classmethod
+    def from_dict(cls, source, data):
+        """
+        Creates a report part from the dictionary returned by the JSON encoder.
+
+        :param source: name of the source of the report part, e.g. "gcc"
+        :param data: dictionary containing return code, messages etc.
+        :returns: new ReportPart object
+        """
+        messages = [Message.from_dict(m) for m in data['messages']]
+        return cls(source, data['returncode'], messages, tests=data.get('tests'),
+                   truncated=data.get('truncated'), stats=data.get('stats'))
+
     def to_xml(self):
         """
         Builds a XML representation of this report part. It returns always the
         XML Element containing all data of this part.
         """
         attributes = {'returncode': str(self.returncode)}
+        if self.truncated:
+            for stream, dropped in self.truncated.items():
+                attributes['truncated_{}'.format(stream)] = str(dropped)
+        if self.stats:
+            for key, value in self.stats.items():
+                attributes[key] = str(value)
         current_part = xml.etree.ElementTree.Element(self.source, attrib=attributes)
         # create sub-element for each message in report part
         for message in self.messages:
             current_part.append(message.to_xml())
-        # TODO Add test results (self.tests) to XML output!
+        # create sub-element for each test suite and its unit tests
+        if self.tests:
+            tests_element = xml.etree.ElementTree.SubElement(current_part, 'tests')
+            for suite in sorted(self.tests):
+                suite_element = xml.etree.ElementTree.SubElement(tests_element, 'suite', attrib={'name': suite})
+                for test in sorted(self.tests[suite]):
+                    result = 'success' if self.tests[suite][test] else 'failure'
+                    xml.etree.ElementTree.SubElement(suite_element, 'test', attrib={'name': test, 'result': result})
         return current_part
 
 
@@ -127,7 +263,10 @@ class Message(object):
         self.desc = desc
 
     def __str__(self):
-        return '{} {}:{} {}...'.format(self.type, self.file, self.line, self.desc[:40])
+        ret = '{} {}:{} {}...'.format(self.type, self.file, self.line, self.desc[:40])
+        if getattr(self, 'count', 1) > 1:
+            ret += ' ({} times)'.format(self.count)
+        return ret
 
     def to_json(self):
         """
@@ -138,6 +277,23 @@ class Message(object):
         """
         return json.dumps(self, cls=ReportJSONEncoder)
 
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Creates a message from the dictionary returned by the JSON encoder. All
+        additional information besides type, file, line and description is
+        preserved as attributes.
+
+        :param data: dictionary containing the information of a message
+        :returns: new Message object
+        """
+        data = dict(data)
+        message = cls(_type=data.pop('type'), _file=data.pop('file'), line=data.pop('line'),
+                      desc=data.pop('desc'))
+        for key, value in data.items():
+            setattr(message, key, value)
+        return message
+
     def to_xml(self):
         """
         Builds a XML representation of this message. It returns always the XML
@@ -149,5 +305,10 @@ class Message(object):
         # append all messages as sub-elements
         for info in message_infos:
             new_sub_element = xml.etree.ElementTree.SubElement(message_element, info)
-            new_sub_element.text = self.__getattribute__(info)
+            value = self.__getattribute__(info)
+            if isinstance(value, (list, tuple)):
+                value = ' '.join(str(v) for v in value)
+            elif value is not None and not isinstance(value, str):
+                value = str(value)
+            new_sub_element.text = value
         return message_element
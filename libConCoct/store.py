@@ -0,0 +1,210 @@
+"""
+Contains a persistent store for reports based on a SQLite database file.
+
+Every report is stored as JSON together with the task, the user and the time
+of submission. Additionally the results of all unit tests are stored in an
+indexed table, so that questions like "which users fail suite X of task Y" can
+be answered without loading or regrading any report.
+
+Authors: Martin Wichmann, Christian Wichmann
+"""
+
+import sqlite3
+import time
+
+from .report import Report
+
+
+class ReportStore(object):
+    """
+    Stores reports in a SQLite database file. The store can be used by
+    multiple processes on the same host at the same time.
+
+    >>> with ReportStore('reports.db') as store:
+    ...     store.add('fizzbuzz', 'user1', report)
+    ...     store.query_tests(task='fizzbuzz', result=False)
+    """
+    schema = """
+        CREATE TABLE IF NOT EXISTS submissions (
+            id        INTEGER PRIMARY KEY,
+            task      TEXT NOT NULL,
+            user      TEXT,
+            submitted REAL NOT NULL,
+            report    TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS parts (
+            submission_id INTEGER NOT NULL REFERENCES submissions(id),
+            source        TEXT NOT NULL,
+            returncode    INTEGER
+        );
+        CREATE TABLE IF NOT EXISTS tests (
+            submission_id INTEGER NOT NULL REFERENCES submissions(id),
+            task          TEXT NOT NULL,
+            user          TEXT,
+            submitted     REAL NOT NULL,
+            suite         TEXT NOT NULL,
+            test          TEXT NOT NULL,
+            result        INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS submissions_task_user ON submissions (task, user, submitted);
+        CREATE INDEX IF NOT EXISTS submissions_user ON submissions (user, submitted);
+        CREATE INDEX IF NOT EXISTS submissions_submitted ON submissions (submitted);
+        CREATE INDEX IF NOT EXISTS parts_submission ON parts (submission_id, source);
+        CREATE INDEX IF NOT EXISTS tests_task_test ON tests (task, suite, test, result);
+        CREATE INDEX IF NOT EXISTS tests_task_user ON tests (task, user, submitted);
+        CREATE INDEX IF NOT EXISTS tests_submission ON tests (submission_id);
+    """
+
+    def __init__(self, path, timeout=30):
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=timeout)
+        self.connection.row_factory = sqlite3.Row
+        # allow readers while a worker is writing
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.executescript(self.schema)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def add(self, task, user, report, submitted=None):
+        """
+        Stores a single report.
+
+        :param task: name of the task
+        :param user: name of the user who submitted the solution
+        :param report: Report object or its JSON representation
+        :param submitted: time of submission as UNIX timestamp, defaults to now
+        :returns: id of the stored submission
+        """
+        with self.connection:
+            return self._insert(task, user, report, submitted)
+
+    def add_many(self, entries):
+        """
+        Stores many reports in a single transaction, e.g. after grading all
+        submissions of a task in batch.
+
+        :param entries: iterable of tuples (task, user, report, submitted)
+        :returns: number of stored reports
+        """
+        count = 0
+        with self.connection:
+            for task, user, report, submitted in entries:
+                self._insert(task, user, report, submitted)
+                count += 1
+        return count
+
+    def _insert(self, task, user, report, submitted):
+        if submitted is None:
+            submitted = time.time()
+        if isinstance(report, Report):
+            data = report.to_json()
+        else:
+            data, report = report, Report.from_json(report)
+        cursor = self.connection.execute('INSERT INTO submissions (task, user, submitted, report) VALUES (?, ?, ?, ?)',
+                                         (task, user, submitted, data))
+        submission_id = cursor.lastrowid
+        self.connection.executemany('INSERT INTO parts (submission_id, source, returncode) VALUES (?, ?, ?)',
+                                    [(submission_id, p.source, p.returncode) for p in report.parts])
+        tests = []
+        for part in report.parts:
+            for suite, results in (part.tests or {}).items():
+                for test, result in results.items():
+                    tests.append((submission_id, task, user, submitted, suite, test, int(bool(result))))
+        self.connection.executemany('INSERT INTO tests (submission_id, task, user, submitted, suite, test, result) '
+                                    'VALUES (?, ?, ?, ?, ?, ?, ?)', tests)
+        return submission_id
+
+    @staticmethod
+    def _where(filters):
+        """
+        Builds a WHERE clause from all filters that are not None. The filters
+        "since" and "until" compare the time of submission.
+        """
+        conditions = []
+        parameters = []
+        for column, value in filters:
+            if value is None:
+                continue
+            if column == 'since':
+                conditions.append('submitted >= ?')
+            elif column == 'until':
+                conditions.append('submitted < ?')
+            else:
+                conditions.append('{} = ?'.format(column))
+            parameters.append(value)
+        clause = ' WHERE ' + ' AND '.join(conditions) if conditions else ''
+        return clause, parameters
+
+    def query_submissions(self, task=None, user=None, since=None, until=None):
+        """
+        Returns all submissions matching the given filters ordered by time of
+        submission. Filters that are None are ignored.
+
+        :returns: list of rows with id, task, user and submitted
+        """
+        clause, parameters = self._where([('task', task), ('user', user), ('since', since), ('until', until)])
+        return self.connection.execute('SELECT id, task, user, submitted FROM submissions' + clause +
+                                       ' ORDER BY submitted, id', parameters).fetchall()
+
+    def query_tests(self, task=None, user=None, suite=None, test=None, result=None, since=None, until=None):
+        """
+        Returns all unit test results matching the given filters ordered by
+        time of submission. Filters that are None are ignored.
+
+        :param result: True for successful, False for failed tests
+        :returns: list of rows with submission_id, task, user, submitted, suite,
+                  test and result
+        """
+        if result is not None:
+            result = int(bool(result))
+        clause, parameters = self._where([('task', task), ('user', user), ('suite', suite), ('test', test),
+                                          ('result', result), ('since', since), ('until', until)])
+        return self.connection.execute('SELECT submission_id, task, user, submitted, suite, test, result FROM tests' +
+                                       clause + ' ORDER BY submitted, submission_id', parameters).fetchall()
+
+    def failing_users(self, task, suite=None, test=None):
+        """
+        Returns all users with at least one failed test in the given task and
+        optionally in the given suite or test.
+
+        :returns: sorted list of user names
+        """
+        clause, parameters = self._where([('task', task), ('suite', suite), ('test', test), ('result', 0)])
+        rows = self.connection.execute('SELECT DISTINCT user FROM tests' + clause + ' ORDER BY user', parameters)
+        return [row['user'] for row in rows]
+
+    def iter_reports(self, task=None, user=None, since=None, until=None):
+        """
+        Iterates over all reports matching the given filters ordered by time of
+        submission. Reports are loaded one by one from the database, so that
+        all reports of a semester can be exported with bounded memory (see
+        ReportXMLWriter.write_all()).
+
+        :returns: generator of tuples (report as JSON, dictionary with id, task,
+                  user and submitted)
+        """
+        clause, parameters = self._where([('task', task), ('user', user), ('since', since), ('until', until)])
+        # use a separate cursor, so that other queries can be run meanwhile
+        cursor = self.connection.cursor()
+        cursor.execute('SELECT id, task, user, submitted, report FROM submissions' + clause +
+                       ' ORDER BY submitted, id', parameters)
+        for row in cursor:
+            yield row['report'], {'id': row['id'], 'task': row['task'], 'user': row['user'],
+                                  'submitted': row['submitted']}
+
+    def get_report(self, submission_id):
+        """
+        :param submission_id: id of a stored submission
+        :returns: Report object or None if there is no such submission
+        """
+        row = self.connection.execute('SELECT report FROM submissions WHERE id = ?', (submission_id, )).fetchone()
+        if row is None:
+            return None
+        return Report.from_json(row['report'])
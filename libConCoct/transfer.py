@@ -0,0 +1,72 @@
+"""
+Contains functions to reduce the amount of data transferred to the secure
+environment for every run of the unit tests.
+
+Executables are stripped of symbols and debug information before they are
+transferred, the original executable with debug information stays in the
+build directory. Then they are compressed with gzip, which shrinks static
+executables to less than half. Runners can additionally keep executables in
+a cache on the execution host named by their digest (see VMRunner), so that
+identical executables are never transferred twice.
+
+Authors: Martin Wichmann, Christian Wichmann
+"""
+
+import hashlib
+import subprocess
+import zlib
+
+
+def strip_executable(path):
+    """
+    Creates a copy of an executable without symbols and debug information
+    next to the original.
+
+    :param path: path to the executable
+    :returns: path to the stripped copy or to the original executable if it
+              could not be stripped
+    """
+    stripped = path + '.stripped'
+    try:
+        proc = subprocess.call(['strip', '--strip-all', '-o', stripped, path],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except FileNotFoundError:
+        return path
+    return stripped if proc == 0 else path
+
+
+def file_digest(path, chunk_size=2**16):
+    """
+    :returns: SHA-256 hex digest of the content of a file
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fd:
+        for chunk in iter(lambda: fd.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def gzip_stream(chunks, level=6):
+    """
+    Compresses a stream of data in gzip format while it is read.
+
+    :param chunks: iterable of bytes
+    :param level: compression level between 1 (fastest) and 9 (smallest)
+    :returns: generator yielding the compressed data
+    """
+    # window size with offset 16 selects the gzip format
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def gzip_file(path, chunk_size=2**16, level=6):
+    """
+    :returns: generator yielding the content of a file compressed with gzip
+    """
+    with open(path, 'rb') as fd:
+        for data in gzip_stream(iter(lambda: fd.read(chunk_size), b''), level):
+            yield data
@@ -7,31 +7,39 @@ Currently there are two environments in which the unit tests can be run:
 running inside a Docker container or copy executable via SSH to a virtual
 machine and run unit tests on the VM.
 
+The libraries for both environments (docker-py, paramiko, requests) are only
+imported when a runner is used, so that importing this module is fast and
+works without them, e.g. for only creating CodeBlocks projects.
+
 Authors: Martin Wichmann, Christian Wichmann
 """
 
 from __future__ import print_function
 
 import os
-import tempfile
 import time
+import uuid
+import threading
 import subprocess
 from collections import defaultdict
 import xml.etree.ElementTree
-from io import BytesIO
 import tarfile
-from requests.exceptions import ReadTimeout
 from functools import wraps
-
-# imports for VM  and docker runner
-from paramiko.client import SSHClient
-from paramiko import AutoAddPolicy
 import posixpath
 import stat
-import docker
 
 from .report import Message
 from .report import ReportPart
+from .output import DEFAULT_OUTPUT_LIMIT, capture_streams, truncation_info
+from .performance import ResourceUsageParser, build_measure_program
+from .placement import CpuPlacer
+from .transfer import strip_executable, file_digest, gzip_stream, gzip_file
+
+
+# source file replacing CU_automated_run_tests() to run every unit test in its
+# own child process (see Task and harness/cunit.c)
+FORK_HARNESS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'harness', 'cunit.c')
+FORK_HARNESS_FLAGS = ['-Wl,--wrap=CU_automated_run_tests']
 
 
 class CunitParser(object):
@@ -47,10 +55,21 @@ class CunitParser(object):
         self.list_of_tests = defaultdict(dict)
 
     def parse(self, data):
+        """
+        Parses the CUnit results either from a string or directly from a
+        file-like object, so that the results do not have to be copied into
+        memory before parsing them.
+
+        :param data: string or file-like object containing the CUnit results
+        :returns: list of messages for all failed unit tests
+        """
         if not data:
             raise ValueError('No data to parse.')
         messages = []
-        tree = xml.etree.ElementTree.fromstring(data)
+        if hasattr(data, 'read'):
+            tree = xml.etree.ElementTree.parse(data).getroot()
+        else:
+            tree = xml.etree.ElementTree.fromstring(data)
         suites = tree.findall('CUNIT_RESULT_LISTING/CUNIT_RUN_SUITE')
         for s in suites:
             failure = s.find('CUNIT_RUN_SUITE_FAILURE')
@@ -97,6 +116,90 @@ class CunitParser(object):
         self.list_of_tests[suite_name][test_name] = success
 
 
+class CunitStreamParser(CunitParser):
+    """
+    Parses the unit test results written by the fork harness on standard
+    output while the executable is still running (see harness/cunit.c). Every
+    result is a line starting with a marker and a random token, that is passed
+    to the executable in the environment variable CONCOCT_RESULT_TOKEN:
+
+        \\x1eCUNIT <token> <test suite="..." name="..." result="failure" file="..." line="..." condition="..."/>
+
+    All other output of the executable is ignored. Failed tests are reported
+    as soon as their line arrives, the messages and the attribute "complete"
+    are available after the executable has finished.
+
+    The lines are written by the harness only, the output of the tests is
+    passed on without the marker. The token protects against output of the
+    executable outside of the tests.
+    """
+    marker = b'\x1eCUNIT '
+    # longer lines are dropped, a result line of the harness is much shorter
+    max_line = 2**16
+
+    def __init__(self, on_failure=None):
+        super(CunitStreamParser, self).__init__()
+        self.token = uuid.uuid4().hex
+        self.on_failure = on_failure
+        self.messages = []
+        # whether the harness has written the result of all tests
+        self.complete = False
+        self.pending = b''
+        self.prefix = self.marker + self.token.encode('ascii') + b' '
+
+    def feed(self, data):
+        """
+        Parses a chunk of the output. Incomplete lines are kept until the next
+        chunk arrives.
+
+        :param data: bytes read from standard output of the executable
+        """
+        lines = (self.pending + data).split(b'\n')
+        self.pending = lines.pop()
+        # keep only the end of an incomplete line that can not become a
+        # result, it may contain the start of the marker
+        if self.prefix not in self.pending or len(self.pending) > self.max_line:
+            self.pending = self.pending[-len(self.prefix):]
+        for line in lines:
+            self.parse_line(line)
+
+    def parse_line(self, line):
+        """
+        Parses a complete line of the output. Lines without the marker and
+        the token of this run are ignored.
+
+        :param line: bytes of the line without newline
+        """
+        if len(line) > self.max_line:
+            return
+        position = line.find(self.prefix)
+        if position < 0:
+            return
+        try:
+            element = xml.etree.ElementTree.fromstring(line[position + len(self.prefix):])
+        except xml.etree.ElementTree.ParseError:
+            print('Invalid unit test result: {}'.format(line.decode('utf-8', errors='replace')))
+            return
+        if element.tag == 'end':
+            self.complete = True
+            return
+        s_name = element.get('suite')
+        t_name = element.get('name')
+        if element.get('result') == 'success':
+            # a test with several failed assertions has one line per failure
+            if t_name not in self.list_of_tests[s_name]:
+                self.add_test_result(s_name, t_name, True)
+            return
+        message = Message(_type='error', _file=element.get('file'), line=element.get('line'),
+                          desc='{suite} - {test} - Condition: {cond}'.format(suite=s_name, test=t_name,
+                                                                             cond=element.get('condition')))
+        self.messages.append(message)
+        self.add_test_result(s_name, t_name, False)
+        print('Unit test failed: {}'.format(message.desc))
+        if self.on_failure:
+            self.on_failure(message)
+
+
 class CunitChecker(object):
     """
     Executes the compiled executable and checks all unit tests. Returned will be
@@ -128,22 +231,100 @@ class CunitChecker(object):
     * http://stackoverflow.com/questions/4249063/run-an-untrusted-c-program-in-a-sandbox-in-linux-that-prevents-it-from-opening-f
     * http://unix.stackexchange.com/questions/6433/how-to-jail-a-process-without-being-root/6455#6455
     """
-    def __init__(self, backend):
+    def __init__(self, backend, output_limit=DEFAULT_OUTPUT_LIMIT, runner=None, on_failure=None):
         self.parser = CunitParser()
         self.report_name = 'cunit'
         self.backend = backend
+        self.output_limit = output_limit
+        # runner kept by the caller between checks, otherwise a new one is
+        # created for every run
+        self.runner = runner
+        # called with the message of every failed test as soon as it is known,
+        # only if the project streams its results
+        self.on_failure = on_failure
 
     def run(self, project):
-        if self.backend == 'docker':
+        if self.runner:
+            runner = self.runner
+        elif self.backend == 'docker':
             runner = DockerRunner()
         else:
             runner = VMRunner(shutdown_vm_after=False)
-        error_code, data = runner.run(project)
+        runner.output_limit = self.output_limit
+        if project.stream_results:
+            # results are parsed from the output while the tests run instead
+            # of being copied out of the secure environment afterwards
+            self.parser = CunitStreamParser(self.on_failure)
+            error_code, _ = runner.run(project, stream=self.parser)
+            messages = self.parser.messages
+            if not error_code and not self.parser.complete:
+                print('Unit test results are incomplete!')
+                error_code = -1
+        else:
+            self.parser = CunitParser()
+            try:
+                error_code, messages = runner.run(project, consume=self.parser.parse)
+            except xml.etree.ElementTree.ParseError as e:
+                print('Could not parse unit test results: {}'.format(e))
+                error_code = -1
         if error_code:
-            return ReportPart(self.report_name, error_code, [])
+            return ReportPart(self.report_name, error_code, [], truncated=runner.truncated,
+                              stats=runner.stats)
         else:
-            messages = self.parser.parse(data)
-            return ReportPart(self.report_name, error_code, messages, self.parser.list_of_tests)
+            return ReportPart(self.report_name, error_code, messages, self.parser.list_of_tests,
+                              truncated=runner.truncated, stats=runner.stats)
+
+
+class Reaper(object):
+    """
+    Runs the teardown of secure environments (removing containers, images and
+    remote directories) in background threads, so that the results of a run
+    are available without waiting for the cleanup.
+
+    Furthermore leftovers of runs that have been interrupted, e.g. by a crashed
+    worker, can be collected periodically. Each runner provides a function to
+    collect its leftovers that is called at most once per interval.
+    """
+    def __init__(self, max_workers=2, interval=300):
+        self.max_workers = max_workers
+        self.interval = interval
+        self.executor = None
+        self.last_collection = {}
+        self.lock = threading.Lock()
+
+    def submit(self, func, *args):
+        """
+        Schedules a teardown function to be run in the background. Exceptions
+        are printed and otherwise ignored.
+        """
+        with self.lock:
+            if self.executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        return self.executor.submit(self._call, func, *args)
+
+    def collect(self, name, func, *args):
+        """
+        Schedules a function collecting leftovers, if it has not been scheduled
+        under the given name during the last interval.
+        """
+        now = time.monotonic()
+        with self.lock:
+            if now - self.last_collection.get(name, -self.interval) < self.interval:
+                return None
+            self.last_collection[name] = now
+        return self.submit(func, *args)
+
+    def _call(self, func, *args):
+        try:
+            func(*args)
+        except Exception as e:
+            print('Teardown failed: {}'.format(e))
+
+
+# reaper shared by all runners in this process, threads are joined on exit so
+# that no pending teardown gets lost
+reaper = Reaper()
 
 
 class VirtualBoxControl(object):
@@ -235,6 +416,10 @@ class VMRunner(object):
     After installation of SSH server a new user "testrunner" has to be added:
         useradd testrunner
 
+    The CPU time and the wall clock time of the unit tests are limited by the
+    limits of the project (see Task). Memory is only limited by the following
+    PAM limits, because the VM can not limit the resident memory of a process.
+
     For security reasons the PAM limits have to be changed in
     /etc/security/limits.conf:
         testrunner	hard	  nproc	      10
@@ -250,16 +435,39 @@ class VMRunner(object):
 
     Finally the settings for connecting the VM (host, user, password, remote
     path) via SSH have to be adjusted.
+
+    Executables are uploaded stripped and compressed. A copy of each one is
+    kept in a cache directory on the VM, named by its digest. An identical
+    executable, e.g. of a resubmitted solution, is then copied from the cache
+    instead of being uploaded again. The measure program is the same for all
+    runs and therefore uploaded only once. The executables of the unit tests
+    are linked statically, so the C library and CUnit are part of every one of
+    them and are sent again for every changed solution; only compression
+    reduces their share of the upload.
+
+    If keep_connection is set, the SSH connection is kept open between runs
+    until close() is called.
     """
-    def __init__(self, shutdown_vm_after=True):
-        # timeout for execution in VM in seconds
-        self.timeout = 10
+    def __init__(self, shutdown_vm_after=True, keep_connection=False):
+        # maximum number of bytes retained from each output stream of the
+        # executable and number of dropped bytes after a run
+        self.output_limit = DEFAULT_OUTPUT_LIMIT
+        self.truncated = None
+        # resource usage of the executable after a run
+        self.stats = None
         self.shutdown_vm_after = shutdown_vm_after
         # settings for connecting the VM via SSH
         self.host = '192.168.56.101'
         self.username = 'testrunner'
         self.password = '1234'
         self.remote_path = '/home/testrunner/runner/'
+        self.cache_path = '/home/testrunner/cache/'
+        # remote directories of runs older than this (in seconds) are leftovers
+        self.max_age = 600
+        # cached executables unused for this time (in seconds) are deleted
+        self.cache_max_age = 86400
+        self.keep_connection = keep_connection
+        self.client = None
 
     def rmtree(self, sftp, remotepath, level=0):
         """
@@ -280,120 +488,350 @@ class VMRunner(object):
         print('[Remote] Removing %s%s' % ('    ' * level, remotepath))
         sftp.rmdir(remotepath)
 
-    @with_started_vm(vm_name='Testrunner', shutdown_vm_after=False, error_value=(-1, ''))
-    def run(self, project):
-        if not os.path.exists(os.path.join(project.tempdir, project.target)):
-            raise FileNotFoundError('Error: Executable file has not been created!')
-        copy_to_vm = [os.path.join(project.tempdir, project.target)]
-        copy_from_vm = ['CUnitAutomated-Results.xml']
-        print('Connecting to remote machine...')
+    def teardown(self, client, sftp, run_path):
+        """
+        Deletes the remote directory of a run and closes the connection to the
+        VM, if it is not kept open. This is called in the background by the
+        reaper.
+        """
+        try:
+            self.rmtree(sftp, run_path)
+        finally:
+            sftp.close()
+            if client is not self.client:
+                client.close()
+
+    def collect_leftovers(self):
+        """
+        Deletes all remote directories of runs that are older than max_age,
+        e.g. left by a crashed worker, and all cached executables that have
+        not been used for cache_max_age. This is called in the background by
+        the reaper with its own connection to the VM.
+        """
+        client = self.connect()
+        sftp = client.open_sftp()
+        try:
+            now = time.time()
+            for f in sftp.listdir_attr(self.remote_path):
+                if stat.S_ISDIR(f.st_mode) and now - f.st_mtime > self.max_age:
+                    self.rmtree(sftp, posixpath.join(self.remote_path, f.filename))
+            try:
+                cached_files = sftp.listdir_attr(self.cache_path)
+            except FileNotFoundError:
+                cached_files = []
+            for f in cached_files:
+                if now - f.st_mtime > self.cache_max_age:
+                    sftp.remove(posixpath.join(self.cache_path, f.filename))
+        finally:
+            sftp.close()
+            client.close()
+
+    def connect(self):
+        from paramiko.client import SSHClient
+        from paramiko import AutoAddPolicy
         client = SSHClient()
         client.set_missing_host_key_policy(AutoAddPolicy())
         client.load_system_host_keys()
         client.connect(self.host, username=self.username, password=self.password, timeout=10)
+        return client
+
+    def upload_executable(self, client, sftp, path, remote_file):
+        """
+        Puts an executable into the directory of a run. If the cache on the VM
+        contains an executable with the same digest, it is copied from there.
+        The copy is verified, because the unit tests run as the same user as
+        the cache and could have changed it. Otherwise the executable is
+        uploaded compressed and added to the cache.
+
+        The cache works on whole executables. Two executables that only share
+        their statically linked runtime have different digests, so the shared
+        parts are not reused.
+
+        :param path: path to the local executable
+        :param remote_file: path of the executable on the VM
+        """
+        digest = file_digest(path)
+        cached_file = posixpath.join(self.cache_path, digest)
+        cmd = 'cp {cached} {exe} 2>/dev/null && touch {cached} && sha256sum {exe}'
+        stdin, stdout, stderr = client.exec_command(cmd.format(cached=cached_file, exe=remote_file))
+        output = stdout.read().decode('utf-8', errors='replace').split()
+        if output[:1] == [digest]:
+            print('Using cached executable on remote machine.')
+            return
+        compressed_file = remote_file + '.gz'
+        with sftp.open(compressed_file, 'wb') as remote_fd:
+            remote_fd.set_pipelined(True)
+            size = 0
+            for data in gzip_file(path):
+                remote_fd.write(data)
+                size += len(data)
+        print('Uploaded executable ({} of {} bytes).'.format(size, os.path.getsize(path)))
+        # the cache is filled via a temporary file, so that concurrent runs
+        # never see a partial executable
+        cmd = ('gzip -dc {gz} > {exe} && rm -f {gz} && chmod 755 {exe} && '
+               '{{ mkdir -p {cache} && cp {exe} {tmp} && mv {tmp} {cached} || true; }}')
+        cmd = cmd.format(gz=compressed_file, exe=remote_file, cache=self.cache_path, cached=cached_file,
+                         tmp='{}.{}'.format(cached_file, uuid.uuid4().hex))
+        stdin, stdout, stderr = client.exec_command(cmd)
+        if stdout.channel.recv_exit_status() != 0:
+            raise OSError('Could not unpack executable on remote machine: {}'.format(
+                          stderr.read().decode('utf-8', errors='replace')))
+
+    def get_client(self):
+        """
+        Returns the open connection to the VM, if it is kept open and still
+        active, or a new connection.
+        """
+        if self.client is not None:
+            transport = self.client.get_transport()
+            if transport is not None and transport.is_active():
+                return self.client
+            self.client.close()
+            self.client = None
+        client = self.connect()
+        if self.keep_connection:
+            self.client = client
+        return client
+
+    def close(self):
+        """
+        Closes the connection to the VM, if it has been kept open.
+        """
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+
+    @with_started_vm(vm_name='Testrunner', shutdown_vm_after=False, error_value=(-1, ''))
+    def run(self, project, consume=None, stream=None):
+        """
+        Runs a already compiled project inside the VM. The executable is
+        uploaded and the unit test results are downloaded as streams via SFTP.
+
+        :param project: project object containing all necessary file names etc.
+        :param consume: function that is called with a file-like object for
+                        the unit test results while they are transferred from
+                        the VM, its return value is returned instead of the raw
+                        results
+        :param stream: CunitStreamParser that is fed with the standard output
+                       while the executable runs, then no result file is
+                       downloaded
+        :returns: tuple containing the error code and the unit test results
+        """
+        if not os.path.exists(os.path.join(project.tempdir, project.target)):
+            raise FileNotFoundError('Error: Executable file has not been created!')
+        executable = strip_executable(os.path.join(project.tempdir, project.target))
+        measure = build_measure_program()
+        token = uuid.uuid4().hex
+        copy_from_vm = [] if stream else ['CUnitAutomated-Results.xml']
+        print('Connecting to remote machine...')
+        client = self.get_client()
         return_code = 0
         data = ''
-        with client.open_sftp() as sftp:
-            try:
-                self.rmtree(sftp, self.remote_path)
-            except FileNotFoundError:
-                pass
+        # every run gets its own directory, so that it can be deleted in the
+        # background while the next run already starts
+        run_path = posixpath.join(self.remote_path, uuid.uuid4().hex)
+        sftp = client.open_sftp()
+        try:
             try:
                 sftp.mkdir(self.remote_path)
             except OSError:
                 pass
-            for f in copy_to_vm:
-                remote_file = os.path.join(self.remote_path, os.path.basename(f))
-                sftp.put(f, remote_file)
-                sftp.chmod(remote_file, 0o777)
-                stdin, stdout, stderr = client.exec_command('cd {}; timeout {}s {}'.format(self.remote_path, self.timeout, remote_file))
-                return_code = stdout.channel.recv_exit_status()
-                print('[Remote] Error code: {}'.format(return_code))
-                stdout_string = '[Remote] ' + ''.join(stdout)
-                if stdout_string:
-                    print('[Remote] STDOUT:')
-                    print(stdout_string)
-                stderr_string = '[Remote] ' + ''.join(stderr)
-                if stderr_string:
-                    print('[Remote] STDERR:')
-                    print(stderr_string)
-            for f in copy_from_vm:
+            sftp.mkdir(run_path)
+            remote_file = posixpath.join(run_path, project.target)
+            self.upload_executable(client, sftp, executable, remote_file)
+            remote_measure = posixpath.join(run_path, 'concoct-measure')
+            self.upload_executable(client, sftp, measure, remote_measure)
+            # limit CPU time (soft limit sends SIGXCPU, hard limit SIGKILL)
+            # and wall clock time only as fallback for sleeping programs, the
+            # resource usage is measured outside of the executable
+            cmd = 'cd {path}; ulimit -H -t {hard}; ulimit -S -t {cpu}; {env}timeout {wall}s {measure} - {exe}'
+            cmd = cmd.format(path=run_path, cpu=project.limits['cpu_time'],
+                             hard=project.limits['cpu_time'] + 1, wall=project.limits['wall_time'],
+                             env='CONCOCT_RESULT_TOKEN={} '.format(stream.token) if stream else '',
+                             measure=remote_measure, exe=remote_file)
+            stdin, stdout, stderr = client.exec_command(cmd)
+            # the token for the measuring program is passed on standard input,
+            # so that it is never visible in the file system
+            stdin.write(token + '\n')
+            stdin.flush()
+            stdin.channel.shutdown_write()
+            # read output while the executable runs, so it can neither
+            # block on a full channel nor exhaust memory, and pass on data as
+            # soon as it arrives instead of waiting for full chunks
+            outs, errs = capture_streams([_ChannelStream(stdout.channel.recv),
+                                          _ChannelStream(stdout.channel.recv_stderr)],
+                                         self.output_limit, consumers=[stream.feed if stream else None, None])
+            return_code = stdout.channel.recv_exit_status()
+            self.truncated = truncation_info(stdout=outs, stderr=errs)
+            self.stats = ResourceUsageParser(token).parse(errs.getvalue())
+            print('[Remote] Error code: {}'.format(return_code))
+            stdout_string = '[Remote] ' + outs.getvalue()
+            if stdout_string:
+                print('[Remote] STDOUT:')
+                print(stdout_string)
+            stderr_string = '[Remote] ' + errs.getvalue()
+            if stderr_string:
+                print('[Remote] STDERR:')
+                print(stderr_string)
+            # a killed or crashed executable leaves incomplete results
+            for f in copy_from_vm if return_code == 0 else []:
                 # get all result files
-                remote_file = os.path.join(self.remote_path, os.path.basename(f))
+                remote_file = posixpath.join(run_path, os.path.basename(f))
                 try:
-                    with tempfile.TemporaryFile() as local_file:
-                        sftp.getfo(remote_file, local_file)
-                        local_file.seek(0)
-                        data = local_file.read()
+                    with sftp.open(remote_file, 'rb') as remote_fd:
+                        remote_fd.prefetch()
+                        data = consume(remote_fd) if consume else remote_fd.read()
                 except FileNotFoundError:
                     print('Remote file not found!')
-            # delete all files in home directory
-            self.rmtree(sftp, self.remote_path)
-        client.close()
+                    return_code = return_code or -1
+        finally:
+            # delete all files of this run and leftovers of old runs in the
+            # background, the connection is closed afterwards
+            reaper.submit(self.teardown, client, sftp, run_path)
+            reaper.collect('vm', self.collect_leftovers)
         return return_code, data
 
 
+class _ChannelStream(object):
+    """
+    File-like object returning whatever data of a SSH channel is available.
+    The files of a channel wait for the full number of bytes instead.
+    """
+    def __init__(self, recv):
+        self.read = recv
+
+
 class DockerRunner(object):
     """
     Runs a project inside a Docker container.
+
+    Containers and images are removed in the background after the results
+    have been extracted (see Reaper). Every image gets an unique tag, so that
+    a new run of the same project never collides with a pending teardown.
+
+    Every container runs on its own CPU core, handed out by the CpuPlacer
+    shared by all runners on this host. If all cores are occupied, the run
+    waits for a free core. The core is only released after the container has
+    exited or has been killed, only its removal happens in the background.
     """
+    # placer shared by all Docker runners in this process
+    placer = None
+
     def __init__(self):
-        self.client = docker.Client(version='1.17')
+        import docker
+        # API version 1.18 is necessary for setting ulimits
+        self.client = docker.Client(version='1.18')
         self.client.info()
-        self.DOCKER_TIMEOUT = 2
-
-    def run(self, project):
+        # output of the container is not captured, so it is never truncated
+        self.output_limit = DEFAULT_OUTPUT_LIMIT
+        self.truncated = None
+        # resource usage of the executable after a run
+        self.stats = None
+        # containers and images older than this (in seconds) are leftovers
+        self.max_age = 600
+        if DockerRunner.placer is None:
+            DockerRunner.placer = CpuPlacer()
+
+    def run(self, project, consume=None, stream=None):
         """
         Runs a already compiled project inside a secure environment. This runner
         class uses a Docker container with restricted permissions to encapsulate
         the untrusted executable.
 
         :param project: project object containing all necessary file names etc.
+        :param consume: function that is called with a file-like object for
+                        the unit test results while they are extracted from
+                        the container, its return value is returned instead of
+                        the raw results
+        :param stream: CunitStreamParser that is fed with the standard output
+                       while the executable runs, then no result file is
+                       extracted
         :returns: tuple containing the error code and the unit test results
         """
-        img = 'autotest/' + project.target
-        self.build_image(project, img)
-        error_code, cont = self.start_container(img)
+        img = 'autotest/{}:{}'.format(project.target, uuid.uuid4().hex)
+        token = uuid.uuid4().hex
+        reaper.collect('docker', self.collect_leftovers)
+        self.build_image(project, img, token)
+        with self.placer.place() as cpuset:
+            error_code, cont = self.start_container(img, project.limits, cpuset, stream, token)
         if error_code:
             return error_code, None
-        data = self.extract_file_from_container(cont, img, 'CUnitAutomated-Results.xml')
-        self.stop_container(cont, img)
+        if stream:
+            reaper.submit(self.stop_container, cont, img)
+            return 0, None
+        data = self.extract_file_from_container(cont, img, 'CUnitAutomated-Results.xml', consume)
+        if data is None:
+            return -1, None
+        reaper.submit(self.stop_container, cont, img)
         return 0, data
 
-    def build_image(self, project, img):
+    def close(self):
+        """
+        Closes the connection to the Docker daemon.
+        """
+        self.client.close()
+
+    def build_image(self, project, img, token):
+        """
+        Builds the image running the executable of a project. The executable
+        is started by the program measuring its resource usage, which reads
+        the token for its report from a file in the image and deletes it
+        before the executable runs.
+
+        :param project: compiled project
+        :param img: name and tag of the image
+        :param token: random string identifying the report of this run
+        """
         # check whether target file exists (has been compiled correctly)
         if not os.path.exists(os.path.join(project.tempdir, project.target)):
             raise FileNotFoundError('Error: Executable file has not been created!')
         dockerfile = """FROM scratch
-                        COPY {target} /
-                        CMD ["/{target}"]
+                        COPY {target} concoct-measure concoct-token /
+                        CMD ["/concoct-measure", "/concoct-token", "/{target}"]
                      """
-        # build Dockerfile and Docker image
-        # TODO: this should be possible in-memory
-        with open(os.path.join(project.tempdir, 'Dockerfile'), 'w') as fd:
-            fd.write(dockerfile.format(target=project.target))
-        container_limits = {}
-        container_limits['memory'] = 2**22      # memory limit for build
-        container_limits['memswap'] = 2**22     # memory + swap, -1 to disable swap
-        container_limits['cpushares'] = 10      # CPU shares (relative weight)
-        container_limits['cpusetcpus'] = '0'    # CPUs in which to allow exection, e.g., '0-3', '0,1'
-        # container_limits['cpu-quota'] = 10000   # 10% of CPU for this container
-        build_out = self.client.build(path=project.tempdir, tag=img, rm=True, stream=False)
+        # build Dockerfile and stream it together with the stripped executable
+        # as compressed build context, so that neither has to be copied into a
+        # file or into memory
+        dockerfile = dockerfile.format(target=project.target).encode('utf-8')
+        executable = strip_executable(os.path.join(project.tempdir, project.target))
+        context = gzip_stream(tar_stream([('Dockerfile', dockerfile), (project.target, executable),
+                                          ('concoct-measure', build_measure_program()),
+                                          ('concoct-token', token.encode('ascii'))]))
+        build_out = self.client.build(fileobj=context, custom_context=True, encoding='gzip', tag=img, rm=True,
+                                      stream=False)
         [_ for _ in build_out]
 
-    def start_container(self, img):
+    def start_container(self, img, limits, cpuset=None, stream=None, token=None):
         """
         Creates a docker container based on a given image and starts it (start
         unit tests, see Dockerfile). This function returns an error code and
         the container object. If the container could be created and ran
         successfully it will return a 0 as error code, otherwise a -1.
 
+        The executable is limited in CPU time, so that the result does not
+        depend on the load of the host. The wall clock time is only limited as
+        fallback for programs that sleep or wait for input.
+
         :param img: image for which to create a Docker container
+        :param limits: dictionary containing limits for CPU time, wall clock
+                       time and memory (see Task)
+        :param cpuset: CPU cores on which the container is allowed to run,
+                       e.g. "2" or "2,3"
+        :param stream: CunitStreamParser that is fed with the standard output
+                       of the container while it runs
+        :param token: token of the resource usage report of this run
         :return: error code and container object
         """
+        from requests.exceptions import ReadTimeout
         # TODO: check if image was created
-        cont = self.client.create_container(image=img, network_disabled=True, mem_limit='4m', cpu_shares=10, memswap_limit=2**22)
-        self.client.start(container=cont, network_mode='none', lxc_conf='lxc.cgroup.cpu.cfs_quota_us = 10000') # lxc.cgroup.memory.limit_in_bytes=4m')
+        environment = {'CONCOCT_RESULT_TOKEN': stream.token} if stream else None
+        cont = self.client.create_container(image=img, network_disabled=True, mem_limit=limits['memory'],
+                                            cpu_shares=10, memswap_limit=limits['memory'], cpuset=cpuset,
+                                            environment=environment)
+        # soft limit for CPU time sends SIGXCPU, hard limit sends SIGKILL
+        ulimits = [{'name': 'cpu', 'soft': limits['cpu_time'], 'hard': limits['cpu_time'] + 1}]
+        # no CFS quota is set, because the container has its core exclusively
+        self.client.start(container=cont, network_mode='none', ulimits=ulimits)
 
         # Adds support for `--ulimit` parameter introduced in Docker 1.6
         # https://github.com/docker/docker/pull/9437
@@ -415,38 +853,139 @@ class DockerRunner(object):
         # out = self.client.attach(container=cont, logs=True)
         # print(out.decode('utf-8'))
 
+        # parse results from stdout while waiting for the container, output
+        # written before attaching is included in the logs
+        reader = None
+        if stream:
+            output = self.client.attach(container=cont, stdout=True, stderr=False, stream=True, logs=True)
+            reader = threading.Thread(target=lambda: [stream.feed(chunk) for chunk in output])
+            reader.daemon = True
+            reader.start()
+
         # wait for container to exit or to reach the time out
         try:
-            ret_val = self.client.wait(container=cont, timeout=self.DOCKER_TIMEOUT)
+            ret_val = self.client.wait(container=cont, timeout=limits['wall_time'])
         except ReadTimeout:
-            self.stop_container(cont, img)
+            # the container is killed before returning, because its core is
+            # handed out to the next run afterwards
+            self.kill_container(cont)
+            reaper.submit(self.stop_container, cont, img)
             print('Timeout for container execution was reached')
             return -1, None
+        if reader:
+            reader.join(timeout=10)
+        # get resource usage reported by the measuring program as last line
+        # on stderr
+        logs = self.client.logs(container=cont, stdout=False, stderr=True, tail=5)
+        self.stats = ResourceUsageParser(token).parse(logs.decode('utf-8', errors='replace'))
         # catch problem when unit test executable returns with error code
         if ret_val != 0:
-            self.stop_container(cont, img)
+            reaper.submit(self.stop_container, cont, img)
             print('Error code returned: {}'.format(ret_val))
             return ret_val, None
         return 0, cont
 
+    def kill_container(self, cont):
+        """
+        Kills a running container and waits until it has exited.
+        """
+        import docker
+        from requests.exceptions import ReadTimeout
+        try:
+            self.client.kill(container=cont)
+            self.client.wait(container=cont, timeout=10)
+        except (docker.errors.APIError, ReadTimeout) as e:
+            print('Could not kill container: {}'.format(e))
+
     def stop_container(self, cont, img):
         self.client.stop(container=cont)
         self.client.remove_container(container=cont)
         self.client.remove_image(image=img)
 
-    def extract_file_from_container(self, cont, img, file_name):
+    def collect_leftovers(self):
+        """
+        Removes all containers and images created by this runner that are older
+        than max_age, e.g. left by timeouts or crashed workers. This is called
+        in the background by the reaper.
+        """
+        import docker
+        now = time.time()
+        for cont in self.client.containers(all=True):
+            if cont['Image'].startswith('autotest/') and now - cont['Created'] > self.max_age:
+                try:
+                    self.client.remove_container(container=cont['Id'], force=True)
+                except docker.errors.APIError as e:
+                    print('Could not remove container: {}'.format(e))
+        for image in self.client.images():
+            tags = [t for t in image.get('RepoTags') or [] if t.startswith('autotest/')]
+            if tags and now - image['Created'] > self.max_age:
+                for tag in tags:
+                    try:
+                        self.client.remove_image(image=tag, force=True)
+                    except docker.errors.APIError as e:
+                        print('Could not remove image: {}'.format(e))
+
+    def extract_file_from_container(self, cont, img, file_name, consume=None):
+        """
+        Extracts a single file from a container. Docker returns the file as tar
+        stream which is unpacked while it is read from the Docker daemon.
+
+        :param cont: container from which to extract the file
+        :param img: image of the container
+        :param file_name: name of the file in the root directory of container
+        :param consume: function that is called with a file-like object for
+                        the extracted file, its return value is returned
+        :returns: content of file or return value of consume, None if the file
+                  could not be extracted
+        """
+        import docker
         # extract unit test results from container (returned by dockerpy as tar stream)
         try:
             temp = self.client.copy(container=cont, resource='/{}'.format(file_name))
         except docker.errors.APIError as e:
-            self.stop_container(cont, img)
+            reaper.submit(self.stop_container, cont, img)
             # TODO: is there a better way to check and handle this?!
             if 'Could not find the file' in e.explanation.decode('utf-8'):
                 print('Could not extract cunit results. Maybe source does not contain test?!')
-            return ReportPart('cunit', -1, [])
-        content = BytesIO(temp.read())
-        date = ''
-        with tarfile.open(fileobj=content, mode='r') as tar:
-            with tar.extractfile(file_name) as fd:
-                data = fd.read()
+            return None
+        data = None
+        with tarfile.open(fileobj=temp, mode='r|') as tar:
+            for member in tar:
+                if member.name == file_name:
+                    with tar.extractfile(member) as fd:
+                        data = consume(fd) if consume else fd.read()
+                    break
         return data
+
+
+def tar_stream(members, chunk_size=2**16):
+    """
+    Generates a tar archive chunk by chunk. The archive is never hold in memory
+    completely, so it can be directly passed as streamed request body to the
+    Docker daemon.
+
+    :param members: list of tuples containing the name of the file inside the
+                    archive and either its content as bytes or a path to a file
+    :param chunk_size: size of chunks in which files are read
+    """
+    for name, source in members:
+        info = tarfile.TarInfo(name)
+        info.mtime = time.time()
+        if isinstance(source, bytes):
+            info.size = len(source)
+            info.mode = 0o644
+            yield info.tobuf(format=tarfile.GNU_FORMAT)
+            yield source
+        else:
+            info.size = os.path.getsize(source)
+            info.mode = 0o755
+            yield info.tobuf(format=tarfile.GNU_FORMAT)
+            with open(source, 'rb') as fd:
+                for chunk in iter(lambda: fd.read(chunk_size), b''):
+                    yield chunk
+        # pad file content to next full block
+        remainder = info.size % tarfile.BLOCKSIZE
+        if remainder:
+            yield tarfile.NUL * (tarfile.BLOCKSIZE - remainder)
+    # end of archive is marked by two empty blocks
+    yield tarfile.NUL * (2 * tarfile.BLOCKSIZE)
@@ -0,0 +1,119 @@
+"""
+Contains a session that watches a task and a solution for changes and checks
+them again after every change, e.g. while a task author edits the unit tests
+or the reference solution.
+
+The session keeps the environment checks, the build directory, the task and
+the runner for the secure environment between checks. Only the stages whose
+inputs have changed are run again (see ConCoCt).
+
+Authors: Martin Wichmann, Christian Wichmann
+"""
+
+import os
+import time
+
+from .concoct import Task, Solution, ConCoCt
+
+
+class WatchSession(object):
+    """
+    Watches all files of a task and the files of a solution by their
+    modification times. If no solution is given, the reference solution of the
+    task is checked.
+
+    :param task_path: path to the task directory
+    :param solution_file_list: list of paths to the files of the solution
+    :param backend: backend used for running the unit tests
+    :param quick: only check for errors without running the unit tests
+    :param interval: time between polling the files for changes in seconds
+    :param compiler: compiler used instead of the one chosen by the task
+    """
+    def __init__(self, task_path, solution_file_list=None, backend='vm', quick=False, interval=0.5,
+                 compiler=None):
+        self.task_path = task_path
+        self.solution_file_list = list(solution_file_list or [])
+        self.quick = quick
+        self.interval = interval
+        self.concoct = ConCoCt(backend=backend, sandbox=not quick, memoize=True, compiler=compiler)
+        self.task = None
+        self.config_mtime = None
+        self.mtimes = None
+
+    def snapshot(self):
+        """
+        :returns: dictionary with paths and modification times of all watched
+                  files
+        """
+        mtimes = {}
+        paths = list(self.solution_file_list)
+        for root, dirs, files in os.walk(self.task_path):
+            paths += [os.path.join(root, f) for f in files]
+        for path in paths:
+            try:
+                mtimes[path] = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                # file is just being replaced by an editor
+                pass
+        return mtimes
+
+    def load_task(self):
+        """
+        Loads the task again only if its configuration file has changed.
+        """
+        mtime = os.stat(os.path.join(self.task_path, 'config.json')).st_mtime_ns
+        if self.task is None or mtime != self.config_mtime:
+            self.task = Task(self.task_path)
+            self.config_mtime = mtime
+        return self.task
+
+    def check(self):
+        """
+        Checks the task and solution once.
+
+        :returns: Report of the check
+        """
+        task = self.load_task()
+        solution = Solution(task, self.solution_file_list) if self.solution_file_list else None
+        project = task.get_test_project(solution)
+        if self.quick:
+            return self.concoct.quick_check(project)
+        return self.concoct.check_project(project)
+
+    def poll(self):
+        """
+        Checks the task and solution if any file has changed since the last
+        poll.
+
+        :returns: Report of the check or None if nothing has changed
+        """
+        mtimes = self.snapshot()
+        if mtimes == self.mtimes:
+            return None
+        self.mtimes = mtimes
+        try:
+            return self.check()
+        except Exception as e:
+            # configuration or source files may be incomplete while editing,
+            # the session continues with the next change
+            print('Error: {}: {}'.format(type(e).__name__, e))
+            return None
+
+    def run(self):
+        """
+        Watches the files until the user interrupts the session and prints the
+        report after every change.
+        """
+        print('Watching {} for changes, press Ctrl+C to stop...'.format(self.task_path))
+        try:
+            while True:
+                start = time.monotonic()
+                r = self.poll()
+                if r is not None:
+                    print(r)
+                    print('Checked in {:.2f}s.'.format(time.monotonic() - start))
+                time.sleep(self.interval)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.concoct.close()
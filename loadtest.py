@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+
+"""
+Generates load for the grading service to find out how many submissions per
+second it can handle. Submissions are drawn from the example solutions in the
+directory "solutions" and arrive at random times with a given average rate
+(Poisson process).
+
+By default the jobs are run by worker threads in this process, which take them
+from a local queue instead of a broker. Each thread stands in for one Celery
+worker and calls build_and_check_task_with_solution() directly:
+
+    ./loadtest.py --rate 2 --duration 60 --workers 4
+
+With --broker the jobs are sent to the real Celery workers through the broker
+(see celery_tasks.submit_and_wait()). Then the time jobs wait in the queue
+can not be measured, only the end-to-end latency:
+
+    ./loadtest.py --rate 2 --duration 60 --broker
+
+With --sweep the rate is increased step by step until the service is
+saturated, i.e. jobs pile up in the queue and the 95th percentile of the
+latency exceeds the given limit:
+
+    ./loadtest.py --sweep 0.5:8:0.5 --duration 60 --workers 4 --max-p95 10
+
+Authors: Martin Wichmann, Christian Wichmann
+"""
+
+import os
+import sys
+import math
+import time
+import queue
+import random
+import argparse
+import threading
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='libConCoct - Generates load for the grading service.')
+    parser.add_argument('--rate', type=float, default=1.0, help='average number of submissions per second')
+    parser.add_argument('--sweep', help='increase rate from START to STOP by STEP until saturated, e.g. 0.5:8:0.5')
+    parser.add_argument('--duration', type=float, default=30.0, help='time in seconds submissions arrive for every rate')
+    parser.add_argument('--workers', type=int, default=2, help='number of local worker threads')
+    parser.add_argument('--broker', action='store_true', help='send jobs to Celery workers through the broker')
+    parser.add_argument('--max-p95', type=float, default=30.0, help='latency in seconds above which the service counts as saturated')
+    parser.add_argument('--tasks', default='tasks', help='directory containing all tasks')
+    parser.add_argument('--solutions', default='solutions', help='directory containing solutions for the tasks')
+    parser.add_argument('--seed', type=int, help='seed for the random arrival times and submissions')
+    return parser.parse_args()
+
+
+def find_submissions(tasks_path='tasks', solutions_path='solutions'):
+    """
+    Finds all example solutions for existing tasks. Solutions are stored in a
+    directory for each task and user, e.g. "solutions/fizzbuzz/user1".
+
+    :returns: list of tuples containing task directory, list of solution files
+              and user name
+    """
+    submissions = []
+    for task in sorted(os.listdir(solutions_path)):
+        task_directory = os.path.join(tasks_path, task)
+        if not os.path.isfile(os.path.join(task_directory, 'config.json')):
+            continue
+        for user in sorted(os.listdir(os.path.join(solutions_path, task))):
+            user_directory = os.path.join(solutions_path, task, user)
+            files = sorted(os.path.join(user_directory, f) for f in os.listdir(user_directory))
+            if files:
+                submissions.append((task_directory, files, user))
+    return submissions
+
+
+def percentile(values, p):
+    """
+    :param values: sorted list of values
+    :param p: percentile between 0 and 100
+    :returns: value at the given percentile (nearest rank) or None
+    """
+    if not values:
+        return None
+    rank = max(1, int(math.ceil(p * len(values) / 100.0)))
+    return values[min(rank, len(values)) - 1]
+
+
+class Job(object):
+    """
+    Single submission with the times it arrived, started and finished.
+    """
+    def __init__(self, submission, arrival):
+        self.submission = submission
+        self.arrival = arrival
+        self.start = None
+        self.end = None
+        self.error = None
+
+
+class LocalService(object):
+    """
+    Worker threads that take jobs from a local queue and run the grading task
+    directly. This stands in for the broker and the worker fleet.
+    """
+    def __init__(self, workers=2):
+        import celery_tasks
+        self.task = celery_tasks.build_and_check_task_with_solution
+        self.jobs = queue.Queue()
+        self.threads = [threading.Thread(target=self.work, daemon=True) for _ in range(workers)]
+        for t in self.threads:
+            t.start()
+
+    def work(self):
+        while True:
+            job = self.jobs.get()
+            job.start = time.monotonic()
+            task_directory, files, user = job.submission
+            try:
+                self.task(task_directory, files, user)
+            except BaseException as e:
+                job.error = e
+            job.end = time.monotonic()
+            self.jobs.task_done()
+
+    def submit(self, job):
+        self.jobs.put(job)
+
+
+class BrokerService(object):
+    """
+    Sends every job to the Celery workers through the broker and waits for
+    it in its own thread. Only the end-to-end latency can be measured.
+    """
+    def __init__(self, timeout=600):
+        import celery_tasks
+        self.celery_tasks = celery_tasks
+        self.timeout = timeout
+
+    def wait(self, job):
+        task_directory, files, user = job.submission
+        try:
+            self.celery_tasks.submit_and_wait(self.celery_tasks.submit_solution, task_directory, files,
+                                              user=user, job_class='batch', timeout=self.timeout)
+        except Exception as e:
+            job.error = e
+        job.end = time.monotonic()
+
+    def submit(self, job):
+        threading.Thread(target=self.wait, args=(job, ), daemon=True).start()
+
+
+def generate_load(service, submissions, rate, duration, rng, drain_timeout=600):
+    """
+    Submits jobs with exponentially distributed inter-arrival times for the
+    given duration and waits until all jobs are finished.
+
+    :returns: list of jobs and time from the start of the run until the last
+              job finished
+    """
+    jobs = []
+    start = time.monotonic()
+    next_arrival = start + rng.expovariate(rate)
+    while next_arrival < start + duration:
+        time.sleep(max(0, next_arrival - time.monotonic()))
+        job = Job(rng.choice(submissions), time.monotonic())
+        jobs.append(job)
+        service.submit(job)
+        next_arrival += rng.expovariate(rate)
+    deadline = time.monotonic() + drain_timeout
+    while any(j.end is None for j in jobs) and time.monotonic() < deadline:
+        time.sleep(0.1)
+    last_end = max([j.end for j in jobs if j.end is not None] + [start + duration])
+    return jobs, last_end - start
+
+
+def summarize(jobs, elapsed, rate):
+    """
+    Calculates throughput, queue wait and end-to-end latency of a run.
+
+    :returns: dictionary with the results
+    """
+    finished = [j for j in jobs if j.end is not None]
+    completed = [j for j in finished if j.error is None]
+    latencies = sorted(j.end - j.arrival for j in completed)
+    waits = sorted(j.start - j.arrival for j in completed if j.start is not None)
+    results = {'rate': rate,
+               'submitted': len(jobs),
+               'completed': len(completed),
+               'failed': len(finished) - len(completed),
+               'unfinished': len(jobs) - len(finished),
+               'throughput': len(completed) / elapsed if elapsed > 0 else 0.0}
+    for p in (50, 95, 99):
+        results['latency_p{}'.format(p)] = percentile(latencies, p)
+        results['wait_p{}'.format(p)] = percentile(waits, p)
+    return results
+
+
+def is_saturated(results, max_p95):
+    """
+    A service is saturated if jobs did not finish at all or the latency
+    exceeds the given limit, because jobs pile up in the queue.
+    """
+    if results['unfinished']:
+        return True
+    return results['latency_p95'] is not None and results['latency_p95'] > max_p95
+
+
+def print_results(results):
+    def fmt(value):
+        return '-' if value is None else '{:.3f}s'.format(value)
+    print('Rate {rate:.2f}/s: {submitted} submitted, {completed} completed, {failed} failed, '
+          '{unfinished} unfinished, throughput {throughput:.2f}/s'.format(**results))
+    print('  latency p50 {} p95 {} p99 {}'.format(*[fmt(results['latency_p{}'.format(p)]) for p in (50, 95, 99)]))
+    print('  queue wait p50 {} p95 {} p99 {}'.format(*[fmt(results['wait_p{}'.format(p)]) for p in (50, 95, 99)]))
+
+
+def run_loadtest():
+    options = parse_args()
+    submissions = find_submissions(options.tasks, options.solutions)
+    if not submissions:
+        sys.exit('No solutions found!')
+    rng = random.Random(options.seed)
+    if options.sweep:
+        start, stop, step = [float(v) for v in options.sweep.split(':')]
+        rates = []
+        while start <= stop + 1e-9:
+            rates.append(start)
+            start += step
+    else:
+        rates = [options.rate]
+    if options.broker:
+        service = BrokerService()
+    else:
+        service = LocalService(options.workers)
+    last_good = None
+    for rate in rates:
+        jobs, elapsed = generate_load(service, submissions, rate, options.duration, rng)
+        results = summarize(jobs, elapsed, rate)
+        print_results(results)
+        if options.sweep:
+            if is_saturated(results, options.max_p95):
+                break
+            last_good = results
+    if options.sweep:
+        if last_good:
+            print('Saturation point: about {:.2f} submissions per second '
+                  '(last rate before saturation).'.format(last_good['rate']))
+        else:
+            print('Service is saturated already at the lowest rate.')
+
+
+if __name__ == '__main__':
+    run_loadtest()
@@ -0,0 +1,137 @@
+import fcntl
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from libConCoct.admission import AdmissionController
+
+
+class AdmissionControllerTest(unittest.TestCase):
+    def setUp(self):
+        self.state_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.state_dir.cleanup()
+
+    def create_controller(self, slots):
+        # the limit must not change because of the load of the test host
+        return AdmissionController(max_slots=slots, initial_slots=slots, latency_target=1e9, max_load=1e9,
+                                   min_memory=0.0, state_dir=self.state_dir.name, poll_interval=0.01)
+
+    def start_waiting(self, controller, priority, acquired):
+        def acquire():
+            acquired.append((priority, controller.acquire(priority)))
+        thread = threading.Thread(target=acquire, daemon=True)
+        thread.start()
+        return thread
+
+    def wait_for(self, condition, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return condition()
+
+    def test_reserved_slot_for_priority(self):
+        controller = self.create_controller(2)
+        batch = controller.acquire(priority=False)
+        acquired = []
+        self.start_waiting(controller, False, acquired)
+        self.assertTrue(self.wait_for(lambda: controller.waiting() == 1))
+        # the second slot is reserved, only a check with priority gets it
+        interactive = controller.acquire(priority=True)
+        self.assertEqual(acquired, [])
+        controller.release(batch, 1.0)
+        self.assertTrue(self.wait_for(lambda: len(acquired) == 1))
+        controller.release(interactive, 1.0)
+        controller.release(acquired[0][1], 1.0)
+
+    def test_priority_admitted_first(self):
+        controller = self.create_controller(1)
+        batch = controller.acquire(priority=False)
+        acquired = []
+        self.start_waiting(controller, True, acquired)
+        self.assertTrue(self.wait_for(lambda: controller.waiting(priority=True) == 1))
+        self.start_waiting(controller, False, acquired)
+        self.assertTrue(self.wait_for(lambda: controller.waiting() == 2))
+        controller.release(batch, 1.0)
+        self.assertTrue(self.wait_for(lambda: len(acquired) == 1))
+        time.sleep(0.1)
+        self.assertEqual([p for p, _ in acquired], [True])
+        controller.release(acquired[0][1], 1.0)
+        self.assertTrue(self.wait_for(lambda: len(acquired) == 2))
+        controller.release(acquired[1][1], 1.0)
+
+    def test_waiter_leaves_while_counted(self):
+        controller = self.create_controller(1)
+        path = os.path.join(self.state_dir.name, 'wait-p-1-1.lock')
+        fds = [controller._create_locked(path)]
+        flock = fcntl.flock
+        replaced = []
+
+        def leave_and_wait_again(fd, operation):
+            # the waiter removes its file after it has been opened for
+            # counting and waits again with a new file of the same name
+            if operation & fcntl.LOCK_NB and not replaced:
+                replaced.append(path)
+                os.unlink(path)
+                os.close(fds.pop())
+                with mock.patch.object(fcntl, 'flock', flock):
+                    fds.append(controller._create_locked(path))
+            return flock(fd, operation)
+        with mock.patch.object(fcntl, 'flock', leave_and_wait_again):
+            self.assertEqual(controller.waiting(), 0)
+        self.assertEqual(controller.waiting(), 1)
+        os.close(fds[0])
+        # file of a crashed process
+        self.assertEqual(controller.waiting(), 0)
+        self.assertFalse(os.path.exists(path))
+
+    def test_concurrent_waiters(self):
+        controller = self.create_controller(1)
+        slot = controller.acquire()
+        acquired = []
+        self.start_waiting(controller, True, acquired)
+        self.assertTrue(self.wait_for(lambda: controller.waiting() == 1))
+        stop = threading.Event()
+        counts = []
+        errors = []
+
+        def churn(index):
+            # waiters coming and going all the time
+            path = os.path.join(self.state_dir.name, 'wait-n-0-{}.lock'.format(index))
+            while not stop.is_set():
+                fd = controller._create_locked(path)
+                os.unlink(path)
+                os.close(fd)
+
+        def count():
+            try:
+                while not stop.is_set():
+                    counts.append(controller.waiting())
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=churn, args=(i, )) for i in range(2)]
+        threads += [threading.Thread(target=count) for i in range(2)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.5)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertTrue(counts)
+        # the check waiting all the time is always counted
+        self.assertEqual(min(counts), 1)
+        self.assertLessEqual(max(counts), 3)
+        self.assertEqual(controller.waiting(), 1)
+        controller.release(slot, 1.0)
+        self.assertTrue(self.wait_for(lambda: len(acquired) == 1))
+        controller.release(acquired[0][1], 1.0)
+        self.assertEqual(controller.waiting(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
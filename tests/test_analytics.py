@@ -0,0 +1,121 @@
+import math
+import os
+import tempfile
+import unittest
+import warnings
+
+import numpy as np
+
+from libConCoct.analytics import ResultMatrix, PASSED, FAILED, NOT_RUN
+from libConCoct.report import Report, ReportPart
+from libConCoct.store import ReportStore
+
+
+def create_report(tests, returncode=0):
+    report = Report()
+    report.add_part(ReportPart('compiler', returncode, []))
+    if tests is not None:
+        report.add_part(ReportPart('unittest', 0, [], tests=tests))
+    return report
+
+
+# submissions in order of submission: user, tests (None if not compiled)
+SUBMISSIONS = [
+    ('alice', {'Suite': {'a': False, 'b': False, 'c': True}}),
+    ('bob', {'Suite': {'a': True, 'b': False, 'c': True}}),
+    ('alice', {'Suite': {'a': True, 'b': True, 'c': True}}),
+    ('carol', None),
+    (None, {'Suite': {'a': True, 'b': False}, 'Other': {'d': True}}),
+]
+TESTS = [('Other', 'd'), ('Suite', 'a'), ('Suite', 'b'), ('Suite', 'c')]
+RESULTS = [[NOT_RUN, FAILED, FAILED, PASSED],
+           [NOT_RUN, PASSED, FAILED, PASSED],
+           [NOT_RUN, PASSED, PASSED, PASSED],
+           [NOT_RUN, NOT_RUN, NOT_RUN, NOT_RUN],
+           [PASSED, PASSED, FAILED, NOT_RUN]]
+
+
+class ResultMatrixTest(unittest.TestCase):
+    def create_matrix(self):
+        reports = [create_report(tests, 0 if tests is not None else 1) for _, tests in SUBMISSIONS]
+        # reports may also be given as JSON
+        reports[1] = reports[1].to_json()
+        return ResultMatrix.from_reports(reports, users=[user for user, _ in SUBMISSIONS],
+                                         submitted=[10, 20, 30, 40, 50])
+
+    def test_from_reports(self):
+        matrix = self.create_matrix()
+        self.assertEqual(matrix.tests, TESTS)
+        self.assertEqual(matrix.results.dtype, np.int8)
+        self.assertEqual(matrix.results.tolist(), RESULTS)
+
+    def test_from_store(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with ReportStore(os.path.join(directory, 'reports.db')) as store:
+                for i, (user, tests) in enumerate(SUBMISSIONS):
+                    store.add('fizzbuzz', user, create_report(tests, 0 if tests is not None else 1),
+                              submitted=10 * (i + 1))
+                store.add('other', 'alice', create_report({'Suite': {'x': True}}))
+                matrix = ResultMatrix.from_store(store, 'fizzbuzz')
+                empty = ResultMatrix.from_store(store, 'unknown')
+        expected = self.create_matrix()
+        self.assertEqual(matrix.tests, TESTS)
+        self.assertEqual(matrix.results.tolist(), RESULTS)
+        self.assertEqual(matrix.users.tolist(), expected.users.tolist())
+        self.assertEqual(matrix.submitted.tolist(), expected.submitted.tolist())
+        self.assertEqual(empty.tests, [])
+        self.assertEqual(empty.results.shape, (0, 0))
+
+    def test_pass_rates(self):
+        rates = self.create_matrix().pass_rates()
+        np.testing.assert_allclose(rates, [1.0, 0.75, 0.25, 1.0])
+        # tests that have never been run have no pass rate
+        matrix = ResultMatrix([[NOT_RUN, PASSED]], [('Suite', 'a'), ('Suite', 'b')])
+        self.assertTrue(math.isnan(matrix.pass_rates()[0]))
+
+    def test_hardest_tests(self):
+        matrix = self.create_matrix()
+        self.assertEqual(matrix.hardest_tests(2), [(('Suite', 'b'), 0.25), (('Suite', 'a'), 0.75)])
+        # equal pass rates keep the order of the tests
+        self.assertEqual([t for t, _ in matrix.hardest_tests()], [TESTS[2], TESTS[1], TESTS[0], TESTS[3]])
+        matrix = ResultMatrix([[NOT_RUN, FAILED]], [('Suite', 'a'), ('Suite', 'b')])
+        self.assertEqual(matrix.hardest_tests(), [(('Suite', 'b'), 0.0)])
+
+    def test_co_failure_correlation(self):
+        results = [[FAILED, FAILED, PASSED, FAILED],
+                   [PASSED, PASSED, FAILED, FAILED],
+                   [FAILED, FAILED, PASSED, FAILED],
+                   [PASSED, PASSED, FAILED, FAILED]]
+        matrix = ResultMatrix(results, [('Suite', t) for t in 'abcd'])
+        correlation = matrix.co_failure_correlation()
+        self.assertEqual(correlation.shape, (4, 4))
+        np.testing.assert_allclose(correlation[:3, :3], [[1, 1, -1], [1, 1, -1], [-1, -1, 1]])
+        # a test that always fails does not correlate with anything
+        self.assertTrue(np.isnan(correlation[3]).all())
+        self.assertTrue(np.isnan(correlation[:, 3]).all())
+
+    def test_user_progress(self):
+        matrix = self.create_matrix()
+        # submitted out of order
+        matrix.submitted = np.array([30, 20, 10, 40, 50], dtype=float)
+        progress = matrix.user_progress()
+        # submissions without user are skipped instead of grouped under "None"
+        self.assertEqual(sorted(progress), ['alice', 'bob', 'carol'])
+        np.testing.assert_allclose(progress['alice'], [0.75, 0.25])
+        np.testing.assert_allclose(progress['bob'], [0.5])
+        np.testing.assert_allclose(progress['carol'], [0.0])
+        self.assertEqual(ResultMatrix.from_reports([create_report(None)]).user_progress(), {})
+
+    def test_empty_matrix(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            matrix = ResultMatrix.from_reports([])
+            self.assertEqual(matrix.results.shape, (0, 0))
+            self.assertEqual(matrix.pass_rates().tolist(), [])
+            self.assertEqual(matrix.hardest_tests(), [])
+            self.assertEqual(matrix.co_failure_correlation().shape, (0, 0))
+            self.assertEqual(matrix.user_progress(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
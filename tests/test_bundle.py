@@ -0,0 +1,109 @@
+import io
+import os
+import tarfile
+import tempfile
+import unittest
+
+from libConCoct.bundle import (create_bundle, bundle_digest, BundleStore, BundleCache, pack_solution,
+                               unpack_solution)
+
+
+TASK_FILES = {'config.json': '{"name": "FizzBuzz"}\n',
+              'src/solution.c': 'int fizzbuzz(void) { return 0; }\n',
+              'src/test.c': '#include "solution.h"\n',
+              'src/..solution.h': 'int fizzbuzz(void);\n'}
+
+
+def create_tar(members):
+    """
+    :param members: list of tuples (name, content or None for a symbolic link)
+    """
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as tar:
+        for name, content in members:
+            info = tarfile.TarInfo(name)
+            if content is None:
+                info.type = tarfile.SYMTYPE
+                info.linkname = '/etc/passwd'
+                tar.addfile(info)
+            else:
+                info.size = len(content)
+                tar.addfile(info, io.BytesIO(content))
+    return buffer.getvalue()
+
+
+class BundleTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.task_path = os.path.join(self.directory.name, 'task')
+        for name, content in TASK_FILES.items():
+            path = os.path.join(self.task_path, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as fd:
+                fd.write(content)
+        self.store = BundleStore(os.path.join(self.directory.name, 'store'))
+        self.cache_path = os.path.join(self.directory.name, 'cache')
+        self.cache = BundleCache(self.cache_path, self.store)
+
+    def read_files(self, path):
+        files = {}
+        for root, dirs, names in os.walk(path):
+            for name in names:
+                with open(os.path.join(root, name)) as fd:
+                    files[os.path.relpath(os.path.join(root, name), path)] = fd.read()
+        return files
+
+    def test_round_trip(self):
+        digest = self.store.put_task(self.task_path)
+        # packing an unchanged task again results in the same bundle
+        os.utime(os.path.join(self.task_path, 'src', 'test.c'), (0, 0))
+        self.assertEqual(bundle_digest(create_bundle(self.task_path)), digest)
+        task_path = self.cache.task_path(digest)
+        self.assertEqual(self.read_files(task_path), TASK_FILES)
+        # cached bundles are not fetched again
+        os.remove(os.path.join(self.store.path, digest + '.tar.gz'))
+        self.assertEqual(self.cache.task_path(digest), task_path)
+
+    def test_changed_task(self):
+        digest = self.store.put_task(self.task_path)
+        with open(os.path.join(self.task_path, 'src', 'test.c'), 'a') as fd:
+            fd.write('\n')
+        self.assertNotEqual(self.store.put_task(self.task_path), digest)
+
+    def test_invalid_digest(self):
+        for digest in ('../store', 'A' * 64, '0' * 63):
+            with self.assertRaises(ValueError):
+                self.cache.task_path(digest)
+        with self.assertRaises(FileNotFoundError):
+            self.cache.task_path('0' * 64)
+
+    def test_corrupted_bundle(self):
+        digest = self.store.put_task(self.task_path)
+        with open(os.path.join(self.store.path, digest + '.tar.gz'), 'ab') as fd:
+            fd.write(b'\0')
+        with self.assertRaises(ValueError):
+            self.cache.task_path(digest)
+
+    def test_path_traversal(self):
+        for name, content in (('../evil.c', b''), ('src/../../evil.c', b''), ('/tmp/evil.c', b''),
+                              ('.', b''), ('src/link.c', None)):
+            digest = self.store.put(create_tar([('src/solution.c', b''), (name, content)]))
+            with self.assertRaises(ValueError):
+                self.cache.task_path(digest)
+        self.assertEqual(os.listdir(self.cache_path), [])
+        self.assertFalse(os.path.exists(os.path.join(self.directory.name, 'evil.c')))
+
+    def test_names_starting_with_dots(self):
+        digest = self.store.put(create_tar([('..solution.c', b'a'), ('src/...h', b'b')]))
+        self.assertEqual(self.read_files(self.cache.task_path(digest)), {'..solution.c': 'a', 'src/...h': 'b'})
+
+    def test_pack_solution(self):
+        files = {'solution.c': 'int main(void) { return 0; }\n', 'solution.h': 'ä\n'}
+        self.assertEqual(unpack_solution(pack_solution(files)), files)
+        paths = [os.path.join(self.task_path, 'src', 'solution.c')]
+        self.assertEqual(unpack_solution(pack_solution(paths)), {'solution.c': TASK_FILES['src/solution.c']})
+
+
+if __name__ == '__main__':
+    unittest.main()
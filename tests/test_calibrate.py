@@ -0,0 +1,75 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import libConCoCt
+from libConCoct.concoct import ConCoCt, Task
+
+
+TASK_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tasks', 'fizzbuzz')
+LIMITS = {'cpu_time': 1, 'wall_time': 5, 'memory': 2**22}
+
+
+def cunit_available():
+    if shutil.which('gcc') is None:
+        return False
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'check.c')
+        with open(source, 'w') as fd:
+            fd.write('#include <CUnit/CUnit.h>\nint main(void) { return CU_initialize_registry(); }\n')
+        return subprocess.call(['gcc', '-o', os.path.join(directory, 'check'), source, '-lcunit'],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL) == 0
+
+
+class CalibrateTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.task_path = os.path.join(self.directory.name, 'fizzbuzz')
+        shutil.copytree(TASK_PATH, self.task_path)
+
+    def load_config(self):
+        with open(os.path.join(self.task_path, 'config.json')) as fd:
+            return json.load(fd)
+
+    def test_save_limits(self):
+        config = self.load_config()
+        Task(self.task_path).save_limits(LIMITS)
+        config['limits'] = LIMITS
+        self.assertEqual(self.load_config(), config)
+        self.assertEqual(Task(self.task_path).limits, LIMITS)
+
+    def test_command_without_sandbox(self):
+        concoct = mock.Mock()
+        concoct.return_value.calibrate_task.return_value = LIMITS
+        argv = ['libConCoCt.py', '--calibrate', '--runs', '2', '-t', self.task_path]
+        with mock.patch.object(libConCoCt, 'ConCoCt', concoct), mock.patch.object(sys, 'argv', argv):
+            libConCoCt.run_libconcoct()
+        self.assertIs(concoct.call_args[1]['sandbox'], False)
+        self.assertEqual(concoct.return_value.calibrate_task.call_args[1]['runs'], 2)
+        self.assertEqual(self.load_config()['limits'], LIMITS)
+
+    @unittest.skipUnless(cunit_available(), 'gcc or CUnit not found')
+    def test_calibrate_task(self):
+        # CppCheck is not needed for calibration
+        with mock.patch.object(ConCoCt, 'check_env'):
+            concoct = ConCoCt(sandbox=False)
+        self.addCleanup(concoct.close)
+        task = Task(self.task_path)
+        limits = concoct.calibrate_task(task, runs=2)
+        self.assertEqual(sorted(limits), ['cpu_time', 'memory', 'wall_time'])
+        self.assertGreaterEqual(limits['cpu_time'], 1)
+        self.assertEqual(limits['wall_time'], 5 * limits['cpu_time'])
+        self.assertGreaterEqual(limits['memory'], 2**22)
+        self.assertEqual(limits['memory'] % 2**20, 0)
+        task.save_limits(limits)
+        self.assertEqual(self.load_config()['limits'], limits)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import importlib
+import importlib.util
+import os
+import unittest
+from unittest import mock
+
+from libConCoct.fairshare import FairShareLimiter
+
+
+@unittest.skipIf(importlib.util.find_spec('celery') is None, 'Celery not found')
+class EnqueueTest(unittest.TestCase):
+    """
+    Queues jobs on the in-memory broker and reads them back from the queues.
+    """
+    @classmethod
+    def setUpClass(cls):
+        environment = {'CONCOCT_BROKER_URL': 'memory://', 'CONCOCT_RESULT_BACKEND': 'cache+memory://'}
+        with mock.patch.dict(os.environ, environment):
+            cls.tasks = importlib.import_module('celery_tasks')
+
+    def setUp(self):
+        self.now = 1000.0
+        limiter = FairShareLimiter(rate=0.5, burst=2, clock=lambda: self.now)
+        patcher = mock.patch.object(self.tasks, 'limiter', limiter)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.connection = self.tasks.app.connection()
+        self.addCleanup(self.connection.release)
+        for queue in self.tasks.app.amqp.queues.values():
+            bound = queue(self.connection.default_channel)
+            bound.declare()
+            bound.purge()
+
+    def receive(self, queue_name):
+        queue = self.connection.SimpleQueue(self.tasks.app.amqp.queues[queue_name])
+        try:
+            message = queue.get(timeout=1)
+            message.ack()
+        finally:
+            queue.close()
+        # task name and ETA are sent in the headers since protocol 2
+        headers = message.headers or {}
+        if 'task' in headers:
+            task, eta = headers['task'], headers.get('eta')
+        else:
+            task, eta = message.payload['task'], message.payload.get('eta')
+        return task, message.delivery_info['routing_key'], message.properties.get('priority'), eta
+
+    def assertQueueEmpty(self, queue_name):
+        queue = self.connection.SimpleQueue(self.tasks.app.amqp.queues[queue_name])
+        try:
+            self.assertEqual(queue.qsize(), 0)
+        finally:
+            queue.close()
+
+    def test_routing_and_priority(self):
+        self.tasks.submit_solution('task', ['solution.c'], user='alice', job_class='interactive')
+        self.tasks.submit_solution('task', ['solution.c'], user='alice', job_class='batch', quick=True)
+        task, routing_key, priority, eta = self.receive('interactive')
+        self.assertEqual(task, self.tasks.build_and_check_task_with_solution.name)
+        self.assertEqual((routing_key, priority, eta), ('interactive', 9, None))
+        task, routing_key, priority, eta = self.receive('batch')
+        self.assertEqual(task, self.tasks.quick_check_task_with_solution.name)
+        self.assertEqual((routing_key, priority, eta), ('batch', 0, None))
+        self.assertQueueEmpty('interactive')
+        self.assertQueueEmpty('batch')
+
+    def test_unknown_job_class(self):
+        with self.assertRaises(ValueError):
+            self.tasks.submit_solution('task', ['solution.c'], user='alice', job_class='urgent')
+
+    def test_interactive_jobs_are_limited(self):
+        for i in range(3):
+            self.tasks.submit_solution('task', ['solution.c'], user='alice', job_class='interactive')
+        self.tasks.submit_solution('task', ['solution.c'], user='bob', job_class='interactive')
+        for i in range(3):
+            self.tasks.submit_solution('task', ['solution.c'], user='alice', job_class='batch')
+        etas = [self.receive('interactive')[3] for i in range(4)]
+        self.assertEqual([eta is not None for eta in etas], [False, False, True, False])
+        for i in range(3):
+            self.assertIsNone(self.receive('batch')[3])
+
+    def test_current_job_class(self):
+        class Request(object):
+            delivery_info = {'routing_key': 'batch'}
+
+        class CurrentTask(object):
+            request = Request()
+        with mock.patch('celery.current_task', CurrentTask()):
+            self.assertEqual(self.tasks.current_job_class(), 'batch')
+        with mock.patch('celery.current_task', None):
+            self.assertEqual(self.tasks.current_job_class(), 'interactive')
+
+
+if __name__ == '__main__':
+    unittest.main()
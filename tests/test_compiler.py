@@ -0,0 +1,248 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from libConCoct.compiler import CompilerGcc, CompilerGccParser, CompilerClangParser, CompilerTccParser
+from libConCoct.concoct import Project, Solution, Task
+from libConCoct.report import Message, ReportPart
+
+
+# output of gcc 12.2 for a source file with errors and warnings
+GCC_COMPILE = r"""bad.c: In function 'fizzbuzz':
+bad.c:6:5: warning: 'gets' is deprecated [-Wdeprecated-declarations]
+    6 |     gets(0);
+      |     ^~~~
+In file included from bad.c:1:
+/usr/include/stdio.h:605:14: note: declared here
+  605 | extern char *gets (char *__s) __wur __attribute_deprecated__;
+      |              ^~~~
+bad.c:7:12: error: 'y' undeclared (first use in this function)
+    7 |     return y + n
+      |            ^
+bad.c:7:12: note: each undeclared identifier is reported only once for each function it appears in
+bad.c:7:17: error: expected ';' before '}' token
+    7 |     return y + n
+      |                 ^
+      |                 ;
+    8 | }
+      | ~
+bad.c:5:9: warning: unused variable 'x' [-Wunused-variable]
+    5 |     int x;
+      |         ^
+bad.c:8:1: warning: control reaches end of non-void function [-Wreturn-type]
+    8 | }
+      | ^
+bad.c: At top level:
+bad.c:2:12: warning: 'unused_function' defined but not used [-Wunused-function]
+    2 | static int unused_function(void) { return 0; }
+      |            ^~~~~~~~~~~~~~~
+"""
+
+# output of gcc 12.2 (GNU ld 2.40) for a missing function
+GCC_LINK = r"""/usr/bin/ld: /tmp/ccrIgMJC.o: in function `main':
+link.c:(.text+0x5): undefined reference to `missing'
+collect2: error: ld returned 1 exit status
+"""
+
+# output of clang 22 with -fno-caret-diagnostics for the same file and a
+# missing function
+CLANG_COMPILE = r"""bad.c:6:5: warning: 'gets' is deprecated [-Wdeprecated-declarations]
+/usr/include/stdio.h:605:37: note: 'gets' has been explicitly marked deprecated here
+/usr/include/x86_64-linux-gnu/sys/cdefs.h:341:51: note: expanded from macro '__attribute_deprecated__'
+bad.c:7:12: error: use of undeclared identifier 'y'
+1 warning and 1 error generated.
+"""
+
+CLANG_LINK = r"""/usr/bin/ld: /tmp/link-3f5a1c.o: in function `main':
+link.c:(.text+0x9): undefined reference to `missing'
+clang: error: linker command failed with exit code 1 (use -v to see invocation)
+"""
+
+LLD_LINK = r"""ld.lld: error: undefined symbol: missing
+>>> referenced by link.c:2
+>>>               /tmp/link-3f5a1c.o:(main)
+clang-15: error: linker command failed with exit code 1 (use -v to see invocation)
+"""
+
+# output of tcc 0.9.27, which has no columns and reports linker errors itself
+TCC_COMPILE = r"""bad.c:6: warning: implicit declaration of function 'gets'
+bad.c:7: error: 'y' undeclared
+"""
+
+TCC_LINK = r"""tcc: error: undefined symbol 'missing'
+tcc: warning: option -fmessage-length=0 ignored
+"""
+
+
+def summary(messages):
+    return [(m.type, m.file, m.line, m.desc) for m in messages]
+
+
+class CompilerParserTest(unittest.TestCase):
+    def test_gcc_compile(self):
+        self.assertEqual(summary(CompilerGccParser().parse(GCC_COMPILE)), [
+            ('warning', 'bad.c', '6', "'gets' is deprecated [-Wdeprecated-declarations]"),
+            ('info', '/usr/include/stdio.h', '605', 'declared here'),
+            ('error', 'bad.c', '7', "'y' undeclared (first use in this function)"),
+            ('error', 'bad.c', '7', "expected ';' before '}' token"),
+            ('warning', 'bad.c', '5', "unused variable 'x' [-Wunused-variable]"),
+            ('warning', 'bad.c', '8', 'control reaches end of non-void function [-Wreturn-type]'),
+            ('warning', 'bad.c', '2', "'unused_function' defined but not used [-Wunused-function]")])
+
+    def test_gcc_link(self):
+        self.assertEqual(summary(CompilerGccParser().parse(GCC_LINK)), [
+            ('error', 'link.c', None, "undefined reference to `missing'")])
+
+    def test_clang(self):
+        parser = CompilerClangParser()
+        self.assertEqual(summary(parser.parse(CLANG_COMPILE)), [
+            ('warning', 'bad.c', '6', "'gets' is deprecated [-Wdeprecated-declarations]"),
+            ('info', '/usr/include/stdio.h', '605', "'gets' has been explicitly marked deprecated here"),
+            ('info', '/usr/include/x86_64-linux-gnu/sys/cdefs.h', '341',
+             "expanded from macro '__attribute_deprecated__'"),
+            ('error', 'bad.c', '7', "use of undeclared identifier 'y'")])
+        self.assertEqual(summary(parser.parse(CLANG_LINK)), [
+            ('error', 'link.c', None, "undefined reference to `missing'"),
+            ('error', None, None, 'linker command failed with exit code 1 (use -v to see invocation)')])
+        self.assertEqual(summary(parser.parse(LLD_LINK)), [
+            ('error', None, None, 'undefined symbol: missing'),
+            ('error', None, None, 'linker command failed with exit code 1 (use -v to see invocation)')])
+
+    def test_tcc(self):
+        parser = CompilerTccParser()
+        self.assertEqual(summary(parser.parse(TCC_COMPILE)), [
+            ('warning', 'bad.c', '6', "implicit declaration of function 'gets'"),
+            ('error', 'bad.c', '7', "'y' undeclared")])
+        self.assertEqual(summary(parser.parse(TCC_LINK)), [
+            ('error', None, None, "undefined symbol 'missing'"),
+            ('warning', None, None, 'option -fmessage-length=0 ignored')])
+
+
+TASK_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tasks', 'fizzbuzz')
+SOLUTION = """#include <stdio.h>
+#include <string.h>
+#include "solution.h"
+
+void fizzbuzz(int number, char* string)
+{
+    if (number % 15 == 0)
+        strcpy(string, "FizzBuzz");
+    else if (number % 3 == 0)
+        strcpy(string, "Fizz");
+    else if (number % 5 == 0)
+        strcpy(string, "Buzz");
+    else
+        sprintf(string, "%d", number);
+}
+"""
+
+
+def cunit_available():
+    if shutil.which('gcc') is None:
+        return False
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'check.c')
+        with open(source, 'w') as fd:
+            fd.write('#include <CUnit/CUnit.h>\nint main(void) { return CU_initialize_registry(); }\n')
+        return subprocess.call(['gcc', '-o', os.path.join(directory, 'check'), source, '-lcunit'],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL) == 0
+
+
+class RecordingCompiler(CompilerGcc):
+    """
+    Records all command lines instead of running the compiler. Compiling one
+    of the failing sources results in an error.
+    """
+    def __init__(self, failing=()):
+        super(RecordingCompiler, self).__init__()
+        self.failing = failing
+        self.commands = []
+
+    def execute(self, cmd):
+        self.commands.append(cmd)
+        failed = [f for f in cmd if os.path.basename(f) in self.failing]
+        if failed:
+            return ReportPart(self.name, 1, [Message('error', failed[0], 1, 'error')])
+        return ReportPart(self.name, 0, [])
+
+
+class CompileProjectsTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.object_dir = os.path.join(self.directory.name, 'objects')
+        paths = {}
+        for name in ('solution.h', 'solution.c', 'main.c', 'test.c', 'harness.c'):
+            paths[name] = os.path.join(self.directory.name, name)
+            open(paths[name], 'w').close()
+        self.test = Project('FizzBuzz', [paths[n] for n in ('solution.h', 'test.c', 'solution.c')])
+        self.test.harness = [paths['harness.c']]
+        self.test.build_flags = ['-DHARNESS', '-Wl,--wrap=main']
+        self.test.tempdir = os.path.join(self.directory.name, 'test')
+        self.main = Project('FizzBuzz', [paths[n] for n in ('solution.h', 'main.c', 'solution.c')])
+        self.main.tempdir = os.path.join(self.directory.name, 'main')
+
+    def sources(self, compiler):
+        return [os.path.basename(cmd[-1]) for cmd in compiler.commands if '-c' in cmd]
+
+    def links(self, compiler):
+        return [cmd for cmd in compiler.commands if '-c' not in cmd]
+
+    def test_shared_sources(self):
+        compiler = RecordingCompiler()
+        results = compiler.compile_projects([self.test, self.main], self.object_dir)
+        self.assertEqual([r.returncode for r in results], [0, 0])
+        # the shared source is compiled once, headers are not compiled
+        self.assertEqual(self.sources(compiler), ['test.c', 'solution.c', 'harness.c', 'main.c'])
+        harness = [cmd for cmd in compiler.commands if cmd[-1].endswith('harness.c')][0]
+        self.assertIn('-DHARNESS', harness)
+        self.assertNotIn('-Wl,--wrap=main', harness)
+        test_link, main_link = self.links(compiler)
+        self.assertIn(os.path.join(self.test.tempdir, self.test.target), test_link)
+        self.assertIn('-Wl,--wrap=main', test_link)
+        self.assertNotIn('-Wl,--wrap=main', main_link)
+        objects = [f for f in test_link if f.endswith('.o')]
+        self.assertEqual(len(objects), 3)
+        self.assertIn(objects[1], main_link)
+
+    def test_main_fails(self):
+        compiler = RecordingCompiler(failing=('main.c', ))
+        test, main = compiler.compile_projects([self.test, self.main], self.object_dir)
+        # the unit tests can be run although the main program failed
+        self.assertEqual(test.returncode, 0)
+        self.assertEqual(main.returncode, 1)
+        self.assertEqual([os.path.basename(m.file) for m in main.messages], ['main.c'])
+        self.assertEqual(len(self.links(compiler)), 1)
+
+    def test_shared_source_fails(self):
+        compiler = RecordingCompiler(failing=('solution.c', ))
+        test, main = compiler.compile_projects([self.test, self.main], self.object_dir)
+        self.assertEqual((test.returncode, main.returncode), (1, 1))
+        # messages of shared sources are only reported once
+        self.assertEqual([os.path.basename(m.file) for m in test.messages], ['solution.c'])
+        self.assertEqual(main.messages, [])
+        self.assertEqual(self.links(compiler), [])
+
+    @unittest.skipUnless(cunit_available(), 'gcc or CUnit not found')
+    def test_build_task(self):
+        task = Task(TASK_PATH)
+        solution = Solution(task, solution_files={'solution.c': SOLUTION})
+        test, main = task.get_test_project(solution), task.get_main_project(solution)
+        test.tempdir = os.path.join(self.directory.name, 'test')
+        main.tempdir = os.path.join(self.directory.name, 'main')
+        for project in (test, main):
+            os.makedirs(project.tempdir)
+            project.write_sources(self.directory.name)
+        results = CompilerGcc().compile_projects([test, main], self.object_dir)
+        self.assertEqual([r.returncode for r in results], [0, 0])
+        proc = subprocess.run([os.path.join(main.tempdir, main.target)], input=b'3\n10\n15\n7\n0\n',
+                              stdout=subprocess.PIPE, timeout=10)
+        answers = [line.split(': ')[-1] for line in proc.stdout.decode('utf-8').splitlines()]
+        self.assertEqual(answers, ['Fizz', 'Buzz', 'FizzBuzz', '7', 'FizzBuzz'])
+        self.assertTrue(os.path.isfile(os.path.join(test.tempdir, test.target)))
+
+
+if __name__ == '__main__':
+    unittest.main()
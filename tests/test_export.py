@@ -0,0 +1,83 @@
+import io
+import unittest
+import xml.etree.ElementTree
+
+from libConCoct.export import ReportXMLWriter
+from libConCoct.report import Report, ReportPart, Message
+
+
+def create_report(tests=None, returncode=0):
+    report = Report()
+    report.add_part(ReportPart('gcc', 0 if tests is not None else 1,
+                               [Message('error', 'solution.c', 7, "expected ';' before 'return'")]))
+    if tests is not None:
+        messages = [Message('error', 'test.c', 12, 'Suite - a - Condition: fizzbuzz(3) == "Fizz"'),
+                    Message('error', 'test.c', 13, 'Suite - a - Condition: fizzbuzz(5) == "Buzz"')]
+        report.add_part(ReportPart('cunit', returncode, messages, tests=tests))
+    return report
+
+
+class ReportXMLWriterTest(unittest.TestCase):
+    def write(self, flavor, reports):
+        fd = io.StringIO()
+        with ReportXMLWriter(fd, flavor=flavor) as writer:
+            count = writer.write_all(reports)
+        self.assertEqual(count, len(reports))
+        return xml.etree.ElementTree.fromstring(fd.getvalue().encode('utf-8'))
+
+    def test_report_flavor(self):
+        report = create_report({'Suite': {'a': False, 'b': True}})
+        # reports may also be given as JSON
+        root = self.write('report', [(report, {'task': 'fizzbuzz', 'user': 'alice'}),
+                                     (report.to_json(), {'task': 'fizzbuzz', 'user': None})])
+        self.assertEqual(root.tag, 'reports')
+        self.assertEqual([r.attrib for r in root], [{'task': 'fizzbuzz', 'user': 'alice'}, {'task': 'fizzbuzz'}])
+        # same parts as in the XML format of a single report
+        expected = [xml.etree.ElementTree.tostring(p) for p in report.to_xml_element()]
+        for element in root:
+            self.assertEqual([xml.etree.ElementTree.tostring(p) for p in element], expected)
+
+    def test_junit_flavor(self):
+        report = create_report({'Suite': {'a': False, 'b': True}, 'Other': {'c': True}})
+        root = self.write('junit', [(report, {'task': 'fizzbuzz', 'user': 'alice', 'submitted': 10})])
+        self.assertEqual(root.tag, 'testsuites')
+        suites = {s.get('name'): s for s in root.findall('testsuite')}
+        self.assertEqual(sorted(suites), ['fizzbuzz.alice.Other', 'fizzbuzz.alice.Suite'])
+        suite = suites['fizzbuzz.alice.Suite']
+        self.assertEqual((suite.get('tests'), suite.get('failures'), suite.get('errors')), ('2', '1', '0'))
+        properties = {p.get('name'): p.get('value') for p in suite.find('properties')}
+        self.assertEqual(properties, {'task': 'fizzbuzz', 'user': 'alice', 'submitted': '10'})
+        cases = {c.get('name'): c for c in suite.findall('testcase')}
+        self.assertIsNone(cases['b'].find('failure'))
+        failure = cases['a'].find('failure')
+        self.assertEqual(failure.get('message'), 'Condition: fizzbuzz(3) == "Fizz"')
+        self.assertEqual(failure.text.splitlines(), ['test.c:12 Suite - a - Condition: fizzbuzz(3) == "Fizz"',
+                                                     'test.c:13 Suite - a - Condition: fizzbuzz(5) == "Buzz"'])
+        other = suites['fizzbuzz.alice.Other']
+        self.assertEqual((other.get('tests'), other.get('failures')), ('1', '0'))
+
+    def test_junit_without_tests(self):
+        for report in (create_report(), create_report({'Suite': {'a': True}}, returncode=-1),
+                       create_report({})):
+            root = self.write('junit', [(report, {'task': 'fizzbuzz', 'user': 'alice'})])
+            suites = root.findall('testsuite')
+            self.assertEqual(len(suites), 1)
+            suite = suites[0]
+            self.assertEqual(suite.get('name'), 'fizzbuzz.alice')
+            self.assertEqual((suite.get('tests'), suite.get('failures'), suite.get('errors')), ('1', '0', '1'))
+            error = suite.find('testcase/error')
+            self.assertEqual(suite.find('testcase').get('name'), 'build')
+            self.assertEqual(error.get('message'), 'Unit tests could not be run.')
+            self.assertIn("gcc error solution.c:7 expected ';' before 'return'", error.text.splitlines())
+
+    def test_junit_without_attributes(self):
+        root = self.write('junit', [(create_report(), {})])
+        self.assertEqual(root.find('testsuite').get('name'), 'report')
+
+    def test_unknown_flavor(self):
+        with self.assertRaises(ValueError):
+            ReportXMLWriter(io.StringIO(), flavor='html')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import tempfile
+import unittest
+
+from libConCoct.fairshare import FairShareLimiter
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FairShareLimiterTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def limiter(self, shared=False):
+        path = os.path.join(self.directory.name, 'fairshare.db') if shared else None
+        limiter = FairShareLimiter(rate=0.5, burst=2, clock=self.clock, path=path)
+        self.addCleanup(limiter.close)
+        return limiter
+
+    def check_rate(self, first, second):
+        self.assertEqual(first.acquire('alice'), 0)
+        self.assertEqual(second.acquire('alice'), 0)
+        # one token is missing, another one after two more seconds
+        self.assertEqual(first.acquire('alice'), 2.0)
+        self.assertEqual(second.acquire('alice'), 4.0)
+        # other users are not delayed
+        self.assertEqual(second.acquire('bob'), 0)
+        self.clock.now += 4.0
+        self.assertEqual(first.acquire('alice'), 2.0)
+
+    def test_rate(self):
+        limiter = self.limiter()
+        self.check_rate(limiter, limiter)
+
+    def test_shared_between_processes(self):
+        self.check_rate(self.limiter(shared=True), self.limiter(shared=True))
+
+    def test_separate_processes(self):
+        first, second = self.limiter(), self.limiter()
+        for limiter in (first, second, first, second):
+            self.assertEqual(limiter.acquire('alice'), 0)
+
+    def check_eviction(self, limiter):
+        for user in ('alice', 'bob', 'carol'):
+            limiter.acquire(user)
+        self.assertEqual(limiter.bucket_count(), 3)
+        # buckets are full again after two seconds, but only removed once in
+        # four seconds (burst / rate)
+        self.clock.now += 3.0
+        limiter.acquire('dave')
+        self.assertEqual(limiter.bucket_count(), 4)
+        self.clock.now += 1.0
+        limiter.acquire('dave')
+        self.assertEqual(limiter.bucket_count(), 1)
+        self.assertEqual(limiter.acquire('alice'), 0)
+
+    def test_eviction(self):
+        self.check_eviction(self.limiter())
+
+    def test_shared_eviction(self):
+        self.check_eviction(self.limiter(shared=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from libConCoct.concoct import Project
+from libConCoct.fingerprint import ResultCache, fingerprint_project, tokenize
+from libConCoct.report import Message, ReportPart
+
+
+class TokenizeTest(unittest.TestCase):
+    def test_ignores_comments_and_whitespace(self):
+        self.assertEqual(tokenize('int  a = 1; /* x */\n// y\n'),
+                         tokenize('int a=1;'))
+
+    def test_function_like_macro(self):
+        self.assertNotEqual(tokenize('#define f(x) x\n'), tokenize('#define f (x) x\n'))
+        self.assertEqual(tokenize('#define f(x) x\n'), tokenize('#  define f(x)   x\n'))
+        self.assertEqual(tokenize('#define f (x) x\n'), tokenize('#define f  (x)  x\n'))
+        self.assertEqual(tokenize('int f(int x);'), tokenize('int f (int x);'))
+
+
+class FingerprintProjectTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.write('test.c', '#include "solution.h"\nvoid test(void) { CU_ASSERT(add(1, 2) == 3); }\n')
+        self.write('solution.h', 'int add(int a, int b);\n')
+        self.write('solution.c', 'int add(int a, int b) { return a + b; }\n')
+
+    def write(self, name, source):
+        with open(os.path.join(self.directory, name), 'w') as fd:
+            fd.write(source)
+
+    def fingerprint(self, sources=None):
+        test = os.path.join(self.directory, 'test.c')
+        solution = os.path.join(self.directory, 'solution.c')
+        paths = [test] if sources else [test, solution]
+        project = Project('task', paths, includes=[self.directory], sources=sources)
+        project.solution_paths = [] if sources else [solution]
+        return fingerprint_project(project, ['gcc'])
+
+    def test_cosmetic_change_of_solution(self):
+        key = self.fingerprint()
+        self.write('solution.c', '/* add */\nint add(int a, int b)\n{\n    return a + b;\n}\n')
+        self.assertEqual(self.fingerprint(), key)
+        self.write('solution.c', 'int add(int a, int b) { return a - b; }\n')
+        self.assertNotEqual(self.fingerprint(), key)
+
+    def test_solution_given_by_content(self):
+        key = self.fingerprint({'solution.c': b'int add(int a, int b) { return a + b; }'})
+        self.assertEqual(self.fingerprint({'solution.c': b'int add(int a,int b){return a+b;} // ok'}), key)
+
+    def test_cosmetic_change_of_task_files(self):
+        key = self.fingerprint()
+        self.write('test.c', '#include "solution.h"\n\nvoid test(void) { CU_ASSERT(add(1, 2) == 3); }\n')
+        self.assertNotEqual(self.fingerprint(), key)
+        key = self.fingerprint()
+        self.write('solution.h', '/* header */\nint add(int a, int b);\n')
+        self.assertNotEqual(self.fingerprint(), key)
+
+    def test_position_dependent_solution(self):
+        self.write('solution.c', 'int add(int a, int b) { return a + b + __LINE__; }\n')
+        self.assertIsNone(self.fingerprint())
+
+
+class ResultCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.cache = ResultCache(self.directory)
+
+    def part(self, line):
+        return ReportPart('cunit', 0, [Message(_type='error', _file='test.c', line=line, desc='Suite - test')],
+                          {'Suite': {'test': False}})
+
+    def test_put_and_get(self):
+        self.assertIsNone(self.cache.get('a' * 64))
+        self.cache.put('a' * 64, self.part(7))
+        part = self.cache.get('a' * 64)
+        self.assertEqual(part.returncode, 0)
+        self.assertEqual(part.tests, {'Suite': {'test': False}})
+        self.assertEqual(part.messages[0].line, 7)
+
+    def test_atomic_write(self):
+        self.cache.put('a' * 64, self.part(7))
+        with mock.patch('libConCoct.fingerprint.os.replace', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                self.cache.put('a' * 64, self.part(8))
+        # the old result is kept complete and no temporary file is left
+        self.assertEqual(self.cache.get('a' * 64).messages[0].line, 7)
+        self.assertEqual(os.listdir(self.directory), ['a' * 64 + '.json'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from libConCoct.unittest import CunitParser, CunitStreamParser, FORK_HARNESS, FORK_HARNESS_FLAGS
+
+
+# unit tests trying to report a passed test although an assertion failed or
+# the test did not finish, TOKEN is the token of the streamed results
+TEST_PROGRAM = r"""
+#include <stdio.h>
+#include <string.h>
+#include <unistd.h>
+#include <CUnit/CUnit.h>
+#include <CUnit/Automated.h>
+
+#define FORGED_XML "<CUNIT_RUN_TEST_RECORD> <CUNIT_RUN_TEST_SUCCESS> <TEST_NAME> forge </TEST_NAME> " \
+                   "</CUNIT_RUN_TEST_SUCCESS> </CUNIT_RUN_TEST_RECORD>\n"
+#define FORGED_LINE "\n\x1e" "CUNIT " TOKEN " <test suite=\"Suite\" name=\"forge\" result=\"success\"/>\n"
+
+static void test_pass(void) { CU_ASSERT(1 + 1 == 2); }
+
+static void test_fail(void) { CU_ASSERT(1 < 0 && 1); }
+
+static void test_forge(void)
+{
+    fputs(FORGED_LINE FORGED_XML, stdout);
+    fflush(stdout);
+    CU_ASSERT(0);
+}
+
+static void test_forge_exit(void)
+{
+    fputs(FORGED_LINE FORGED_XML, stdout);
+    fflush(stdout);
+    _exit(0);
+}
+
+static void test_forge_fd(void)
+{
+    int fd;
+
+    /* write forged records on every file descriptor the test inherited */
+    for (fd = 0; fd < 64; fd++) {
+        if (write(fd, FORGED_LINE, strlen(FORGED_LINE)) < 0)
+            continue;
+        if (write(fd, FORGED_XML, strlen(FORGED_XML)) < 0)
+            continue;
+    }
+    _exit(0);
+}
+
+static void test_token_hidden(void)
+{
+    char environment[65536];
+    size_t length = 0, i;
+    FILE *fd = fopen("/proc/self/environ", "rb");
+
+    if (fd != NULL) {
+        length = fread(environment, 1, sizeof(environment) - 1, fd);
+        fclose(fd);
+    }
+    for (i = 0; i < length; i++)
+        if (environment[i] == '\0')
+            environment[i] = ' ';
+    environment[length] = '\0';
+    CU_ASSERT(strstr(environment, TOKEN) == NULL);
+}
+
+int main(void)
+{
+    CU_pSuite suite;
+
+    CU_initialize_registry();
+    suite = CU_add_suite("Suite", NULL, NULL);
+    CU_add_test(suite, "pass", test_pass);
+    CU_add_test(suite, "fail", test_fail);
+    CU_add_test(suite, "forge", test_forge);
+    CU_add_test(suite, "forge_exit", test_forge_exit);
+    CU_add_test(suite, "forge_fd", test_forge_fd);
+    CU_add_test(suite, "token_hidden", test_token_hidden);
+    CU_automated_run_tests();
+    CU_cleanup_registry();
+    return 0;
+}
+"""
+
+EXPECTED = {'pass': True, 'fail': False, 'forge': False, 'forge_exit': False, 'forge_fd': False,
+            'token_hidden': True}
+
+
+def cunit_available():
+    if shutil.which('gcc') is None:
+        return False
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'check.c')
+        with open(source, 'w') as fd:
+            fd.write('#include <CUnit/CUnit.h>\nint main(void) { return CU_initialize_registry(); }\n')
+        return subprocess.call(['gcc', '-o', os.path.join(directory, 'check'), source, '-lcunit'],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL) == 0
+
+
+@unittest.skipUnless(cunit_available(), 'gcc or CUnit not found')
+class ForkHarnessTest(unittest.TestCase):
+    def build_and_run(self, directory, token, flags):
+        source = os.path.join(directory, 'test.c')
+        executable = os.path.join(directory, 'test')
+        with open(source, 'w') as fd:
+            fd.write(TEST_PROGRAM)
+        subprocess.check_call(['gcc', '-o', executable, source, FORK_HARNESS, '-DTOKEN="{}"'.format(token),
+                               '-DCONCOCT_TEST_TIMEOUT=5'] + FORK_HARNESS_FLAGS + flags + ['-lcunit'])
+        environment = dict(os.environ)
+        if '-DCONCOCT_STREAM_RESULTS' in flags:
+            environment['CONCOCT_RESULT_TOKEN'] = token
+        return subprocess.run([executable], cwd=directory, env=environment, stdin=subprocess.DEVNULL,
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=60)
+
+    def test_forged_stream_records(self):
+        parser = CunitStreamParser()
+        with tempfile.TemporaryDirectory() as directory:
+            proc = self.build_and_run(directory, parser.token, ['-DCONCOCT_STREAM_RESULTS'])
+        parser.feed(proc.stdout)
+        self.assertEqual(proc.returncode, 0)
+        self.assertTrue(parser.complete)
+        self.assertEqual(dict(parser.list_of_tests), {'Suite': EXPECTED})
+        conditions = [m.desc for m in parser.messages]
+        self.assertIn('Suite - fail - Condition: 1 < 0 && 1', conditions)
+        self.assertIn('Suite - forge_exit - Condition: Test exited without result', conditions)
+
+    def test_forged_file_records(self):
+        with tempfile.TemporaryDirectory() as directory:
+            proc = self.build_and_run(directory, CunitStreamParser().token, [])
+            with open(os.path.join(directory, 'CUnitAutomated-Results.xml'), 'rb') as fd:
+                parser = CunitParser()
+                messages = parser.parse(fd)
+        self.assertEqual(proc.returncode, 0)
+        tests = {name.strip(): result for name, result in parser.list_of_tests[' Suite '].items()}
+        self.assertEqual(tests, EXPECTED)
+        self.assertEqual(len(messages), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,22 @@
+import unittest
+
+from loadtest import percentile
+
+
+class PercentileTest(unittest.TestCase):
+    def test_nearest_rank(self):
+        self.assertEqual(percentile(list(range(1, 21)), 95), 19)
+        self.assertEqual(percentile(list(range(1, 101)), 99), 99)
+        self.assertEqual(percentile([1, 2], 50), 1)
+        self.assertEqual(percentile([1, 2, 3], 50), 2)
+        self.assertEqual(percentile([5], 99), 5)
+        self.assertEqual(percentile(list(range(1, 101)), 7), 7)
+
+    def test_bounds(self):
+        self.assertEqual(percentile([1, 2, 3], 0), 1)
+        self.assertEqual(percentile([1, 2, 3], 100), 3)
+        self.assertIsNone(percentile([], 50))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from libConCoct.performance import ResourceUsageParser, build_measure_program
+
+
+# test executable printing a forged report and exiting without cleanup
+FORGING_PROGRAM = r"""
+#include <stdio.h>
+#include <unistd.h>
+int main(void)
+{
+    volatile unsigned long i;
+    for (i = 0; i < 100000000UL; i++);
+    fprintf(stderr, "\nCONCOCT_RUSAGE token=forged cpu_time=0.0 wall_time=0.0 max_rss=1\n");
+    _exit(3);
+}
+"""
+
+
+class ResourceUsageParserTest(unittest.TestCase):
+    def test_only_lines_with_token(self):
+        data = ('CONCOCT_RUSAGE token=abc cpu_time=1.5 wall_time=2.0 max_rss=10\n'
+                'CONCOCT_RUSAGE token=forged cpu_time=0.0 wall_time=0.0 max_rss=1\n')
+        stats = ResourceUsageParser('abc').parse(data)
+        self.assertEqual(stats, {'cpu_time': 1.5, 'wall_time': 2.0, 'max_rss': 10240})
+
+    def test_no_report(self):
+        self.assertIsNone(ResourceUsageParser('abc').parse('some output'))
+
+
+@unittest.skipIf(shutil.which('gcc') is None, 'gcc not found')
+class MeasureProgramTest(unittest.TestCase):
+    def test_forged_report_is_ignored(self):
+        measure = build_measure_program()
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, 'forge.c')
+            executable = os.path.join(directory, 'forge')
+            with open(source, 'w') as fd:
+                fd.write(FORGING_PROGRAM)
+            subprocess.check_call(['gcc', '-O0', '-o', executable, source])
+            proc = subprocess.run([measure, '-', executable], input=b'secret\n', stdout=subprocess.PIPE,
+                                  stderr=subprocess.PIPE)
+        self.assertEqual(proc.returncode, 3)
+        stats = ResourceUsageParser('secret').parse(proc.stderr.decode('utf-8'))
+        self.assertIsNotNone(stats)
+        self.assertGreater(stats['cpu_time'], 0.0)
+        self.assertGreater(stats['max_rss'], 1024)
+
+    def test_token_file_is_removed(self):
+        measure = build_measure_program()
+        with tempfile.TemporaryDirectory() as directory:
+            token_file = os.path.join(directory, 'token')
+            with open(token_file, 'w') as fd:
+                fd.write('secret')
+            proc = subprocess.run([measure, token_file, '/bin/cat', token_file], stdout=subprocess.PIPE,
+                                  stderr=subprocess.PIPE)
+            self.assertFalse(os.path.exists(token_file))
+        self.assertNotEqual(proc.returncode, 0)
+        self.assertNotIn(b'secret', proc.stdout)
+        self.assertIsNotNone(ResourceUsageParser('secret').parse(proc.stderr.decode('utf-8')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import importlib.util
+import shutil
+import tempfile
+import unittest
+
+from libConCoct.placement import CpuPlacer
+from libConCoct.unittest import DockerRunner
+
+
+class CpuPlacerTest(unittest.TestCase):
+    def setUp(self):
+        self.lock_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.lock_dir)
+
+    def placer(self, **kwargs):
+        return CpuPlacer(cpus=[0, 1], lock_dir=self.lock_dir, poll_interval=0.01, **kwargs)
+
+    def test_exclusive_cores(self):
+        placer = self.placer()
+        first = placer.try_acquire()
+        second = self.placer().try_acquire()
+        self.assertEqual(sorted(first) + sorted(second), [0, 1])
+        self.assertIsNone(self.placer().try_acquire())
+        self.assertEqual(placer.occupancy(), 2)
+        placer.release(first)
+        self.assertEqual(placer.occupancy(), 1)
+        self.assertEqual(sorted(self.placer().try_acquire()), sorted(first))
+
+    def test_cores_per_run(self):
+        with self.placer(cores_per_run=2).place() as cpuset:
+            self.assertEqual(cpuset, '0,1')
+            self.assertIsNone(self.placer().try_acquire())
+        self.assertEqual(self.placer().occupancy(), 0)
+
+    def test_saturated_host(self):
+        with self.placer().place(), self.placer().place():
+            with self.assertRaises(TimeoutError):
+                self.placer(timeout=0.05).acquire()
+
+    def test_release_on_error(self):
+        placer = self.placer()
+        with self.assertRaises(ValueError):
+            with placer.place():
+                raise ValueError()
+        self.assertEqual(placer.occupancy(), 0)
+
+
+class FakePlacer(object):
+    """
+    Records when the core of a run is acquired and released.
+    """
+    def __init__(self, events):
+        self.events = events
+
+    def place(self):
+        placer = self
+
+        class Placement(object):
+            def __enter__(self):
+                placer.events.append('acquire')
+                return '0'
+
+            def __exit__(self, exc_type, exc_value, traceback):
+                placer.events.append('release')
+        return Placement()
+
+
+class FakeDockerClient(object):
+    """
+    Docker client whose container never exits on its own.
+    """
+    def __init__(self, events):
+        self.events = events
+        self.killed = False
+
+    def create_container(self, **kwargs):
+        return 'container'
+
+    def start(self, **kwargs):
+        self.events.append('start')
+
+    def wait(self, container, timeout):
+        from requests.exceptions import ReadTimeout
+        if not self.killed:
+            raise ReadTimeout()
+        return 137
+
+    def kill(self, container):
+        self.events.append('kill')
+        self.killed = True
+
+    def stop(self, container):
+        self.events.append('stop')
+
+    def remove_container(self, container):
+        pass
+
+    def remove_image(self, image):
+        pass
+
+    def containers(self, all=False):
+        return []
+
+    def images(self):
+        return []
+
+
+class FakeProject(object):
+    target = 'target'
+    limits = {'cpu_time': 1, 'wall_time': 1, 'memory': 2**22}
+
+
+@unittest.skipIf(importlib.util.find_spec('docker') is None or importlib.util.find_spec('requests') is None,
+                 'docker-py or requests not found')
+class DockerRunnerPlacementTest(unittest.TestCase):
+    def test_container_is_killed_before_core_is_released(self):
+        events = []
+        runner = DockerRunner.__new__(DockerRunner)
+        runner.client = FakeDockerClient(events)
+        runner.placer = FakePlacer(events)
+        runner.stats = None
+        runner.max_age = 600
+        runner.build_image = lambda project, img, token: None
+        error_code, data = runner.run(FakeProject())
+        self.assertEqual(error_code, -1)
+        # the removal may run in the background, but not the container
+        self.assertLess(events.index('acquire'), events.index('start'))
+        self.assertLess(events.index('kill'), events.index('release'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import json
+import unittest
+
+from libConCoct.report import Report, ReportPart, Message, message_pattern
+
+
+def create_part():
+    messages = [Message('error', 'a.c', 3, "'x' undeclared"),
+                Message('warning', 'a.c', 4, "unused variable 'y'"),
+                Message('error', 'a.c', 7, "'z' undeclared"),
+                Message('error', 'b.c', 1, "'x' undeclared"),
+                Message('error', 'a.c', 9, "'x' undeclared")]
+    return ReportPart('gcc', 1, messages, truncated={'stderr': 10})
+
+
+def summary(messages):
+    return [(m.type, m.file, m.line, m.desc, getattr(m, 'count', 1), getattr(m, 'lines', None)) for m in messages]
+
+
+class MessagePatternTest(unittest.TestCase):
+    def test_pattern(self):
+        self.assertEqual(message_pattern("'x' undeclared"), message_pattern("'y' undeclared"))
+        self.assertEqual(message_pattern('‘x’ undeclared'), "'*' undeclared")
+        self.assertEqual(message_pattern('expected "int" in line 12'), "expected '*' in line 0")
+        self.assertNotEqual(message_pattern("'x' undeclared"), message_pattern("unused variable 'x'"))
+        self.assertEqual(message_pattern(None), '')
+
+
+class AggregateTest(unittest.TestCase):
+    def test_collapse(self):
+        part = create_part()
+        aggregated = part.aggregate()
+        self.assertEqual(summary(aggregated.messages), [
+            ('error', 'a.c', 3, "'x' undeclared", 3, [3, 7, 9]),
+            ('warning', 'a.c', 4, "unused variable 'y'", 1, None),
+            ('error', 'b.c', 1, "'x' undeclared", 1, None)])
+        self.assertEqual(aggregated.truncated, {'stderr': 10})
+        self.assertEqual((aggregated.source, aggregated.returncode), ('gcc', 1))
+        # the original part is not changed
+        self.assertEqual(len(part.messages), 5)
+        self.assertFalse(hasattr(part.messages[0], 'count'))
+
+    def test_limit(self):
+        aggregated = create_part().aggregate(limit=1)
+        self.assertEqual(len(aggregated.messages), 1)
+        # dropped messages are counted with all their occurrences
+        self.assertEqual(aggregated.truncated, {'stderr': 10, 'messages': 2})
+        self.assertIn('[... 2 more messages ...]', str(aggregated))
+        self.assertIn('(3 times)', str(aggregated))
+        again = aggregated.aggregate(limit=0)
+        self.assertEqual(again.messages, [])
+        self.assertEqual(again.truncated, {'stderr': 10, 'messages': 5})
+        self.assertEqual(len(create_part().aggregate(limit=None).messages), 3)
+
+    def test_merge_aggregated(self):
+        # aggregating twice, e.g. after merging parts, keeps all occurrences
+        first = create_part().aggregate()
+        merged = ReportPart('gcc', 1, first.messages + [Message('error', 'a.c', 11, "'w' undeclared")])
+        aggregated = merged.aggregate()
+        self.assertEqual(summary(aggregated.messages)[0], ('error', 'a.c', 3, "'x' undeclared", 4, [3, 7, 9, 11]))
+        again = ReportPart('gcc', 1, first.messages + first.messages).aggregate()
+        self.assertEqual(summary(again.messages)[0][4:], (6, [3, 7, 9, 3, 7, 9]))
+        # the lines of the aggregated part are not shared
+        self.assertEqual(first.messages[0].lines, [3, 7, 9])
+
+    def test_report(self):
+        report = Report()
+        report.add_part(create_part())
+        report.add_part(ReportPart('cunit', 0, [], tests={'Suite': {'a': True}}, stats={'cpu_time': 0.1}))
+        aggregated = report.aggregate(limit=2)
+        self.assertEqual([p.source for p in aggregated.parts], ['gcc', 'cunit'])
+        self.assertEqual(len(aggregated.parts[0].messages), 2)
+        self.assertEqual(aggregated.parts[0].truncated['messages'], 1)
+        self.assertEqual(aggregated.parts[1].tests, {'Suite': {'a': True}})
+        self.assertEqual(aggregated.parts[1].stats, {'cpu_time': 0.1})
+
+
+class FromDictTest(unittest.TestCase):
+    def test_message(self):
+        message = Message.from_dict({'type': 'error', 'file': 'a.c', 'line': 3, 'desc': 'x', 'count': 2,
+                                     'lines': [3, 5]})
+        self.assertEqual(summary([message]), [('error', 'a.c', 3, 'x', 2, [3, 5])])
+        self.assertEqual(json.loads(message.to_json()), {'type': 'error', 'file': 'a.c', 'line': 3, 'desc': 'x',
+                                                         'count': 2, 'lines': [3, 5]})
+
+    def test_round_trip(self):
+        report = Report()
+        report.add_part(create_part().aggregate(limit=2))
+        report.add_part(ReportPart('cunit', 0, [Message('error', 'test.c', 12, 'Suite - a - Condition: 0')],
+                                   tests={'Suite': {'a': False}}, stats={'cpu_time': 0.1, 'max_rss': 1024}))
+        loaded = Report.from_json(report.to_json())
+        self.assertEqual(loaded.to_json(), report.to_json())
+        gcc, cunit = sorted(loaded.parts, key=lambda p: p.source != 'gcc')
+        self.assertEqual(summary(gcc.messages), summary(report.parts[0].messages))
+        self.assertEqual(gcc.truncated, {'stderr': 10, 'messages': 1})
+        self.assertEqual((cunit.returncode, cunit.tests, cunit.stats),
+                         (0, {'Suite': {'a': False}}, {'cpu_time': 0.1, 'max_rss': 1024}))
+        part = ReportPart.from_dict('cppcheck', {'returncode': 0, 'messages': []})
+        self.assertEqual((part.tests, part.truncated, part.stats), (None, None, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
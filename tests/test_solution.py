@@ -0,0 +1,87 @@
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from libConCoct.compiler import CompilerGcc
+from libConCoct.concoct import Project, Solution, Task
+
+
+TASK_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tasks', 'fizzbuzz')
+SOLUTION = """#include <stdio.h>
+#include "solution.h"
+
+void fizzbuzz(int number, char* string)
+{
+    sprintf(string, "%d", number);
+}
+"""
+
+
+class SolutionSourcesTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.task = Task(TASK_PATH)
+
+    def test_write_sources(self):
+        project = Project('FizzBuzz', [], sources={'solution.c': 'ä\n', 'extra.c': b'\xff\n'})
+        self.assertEqual(project.file_list, [])
+        project.write_sources(self.directory.name)
+        source_dir = os.path.join(self.directory.name, 'sources')
+        self.assertEqual(project.file_list, [os.path.join(source_dir, 'extra.c'),
+                                             os.path.join(source_dir, 'solution.c')])
+        with open(project.file_list[1], 'rb') as fd:
+            self.assertEqual(fd.read(), 'ä\n'.encode('utf-8'))
+        with open(project.file_list[0], 'rb') as fd:
+            self.assertEqual(fd.read(), b'\xff\n')
+        # the sources are only written once per directory
+        with open(project.file_list[1], 'w') as fd:
+            fd.write('changed')
+        project.write_sources(self.directory.name)
+        with open(project.file_list[1]) as fd:
+            self.assertEqual(fd.read(), 'changed')
+
+    def test_invalid_names(self):
+        for name in ('', '../solution.c', 'src/solution.c', '/tmp/solution.c'):
+            with self.assertRaises(ValueError):
+                Project('FizzBuzz', [], sources={name: SOLUTION})
+
+    def test_task_projects(self):
+        solution = Solution(self.task, solution_files={'solution.c': SOLUTION})
+        task_solution = os.path.join(TASK_PATH, 'src', 'solution.c')
+        for project in (self.task.get_main_project(solution), self.task.get_test_project(solution)):
+            # the solution of the task is replaced by the given sources
+            self.assertNotIn(task_solution, project.file_list)
+            self.assertEqual(project.solution_paths, [])
+            self.assertEqual(project.sources, {'solution.c': SOLUTION})
+        project = self.task.get_main_project(None)
+        self.assertIn(task_solution, project.file_list)
+        self.assertEqual(project.sources, {})
+
+    @unittest.skipIf(shutil.which('gcc') is None, 'gcc not found')
+    def test_check_syntax(self):
+        solution = Solution(self.task, solution_files={'solution.c': SOLUTION})
+        project = self.task.get_main_project(solution)
+        project.write_sources(self.directory.name)
+        self.assertEqual(CompilerGcc().check_syntax(project).returncode, 0)
+        solution = Solution(self.task, solution_files={'solution.c': SOLUTION.replace(';', '', 1)})
+        project = self.task.get_main_project(solution)
+        project.write_sources(os.path.join(self.directory.name, 'broken'))
+        part = CompilerGcc().check_syntax(project)
+        self.assertNotEqual(part.returncode, 0)
+        self.assertIn(os.path.join(self.directory.name, 'broken', 'sources', 'solution.c'),
+                      [m.file for m in part.messages if m.type == 'error'])
+
+    def test_codeblocks_project(self):
+        solution = Solution(self.task, solution_files={'solution.c': SOLUTION})
+        file_name = os.path.join(self.directory.name, 'project.zip')
+        self.task.get_main_project(solution).create_cb_project(file_name)
+        with zipfile.ZipFile(file_name) as project_zip:
+            self.assertEqual(project_zip.read('solution.c').decode('utf-8'), SOLUTION)
+            self.assertIn('main.c', project_zip.namelist())
+
+
+if __name__ == '__main__':
+    unittest.main()
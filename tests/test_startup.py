@@ -0,0 +1,42 @@
+import os
+import subprocess
+import sys
+import unittest
+
+
+# maximum time in seconds for importing libConCoct.concoct, measured around
+# 60 ms, the budget leaves room for slow test hosts
+IMPORT_TIME_BUDGET = 0.3
+# libraries that must only be imported when a runner is used
+BACKEND_MODULES = ['docker', 'paramiko', 'requests', 'numpy']
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class StartupTest(unittest.TestCase):
+    def import_concoct(self):
+        code = ('import sys, libConCoct.concoct; '
+                'print(" ".join(m for m in {} if m in sys.modules))'.format(BACKEND_MODULES))
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT,
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+        return proc.stdout, proc.stderr
+
+    def test_no_backend_modules(self):
+        loaded, _ = self.import_concoct()
+        self.assertEqual(loaded.split(), [])
+
+    def test_import_time(self):
+        _, report = self.import_concoct()
+        # lines of -X importtime: "import time: <self us> | <cumulative us> | <module>"
+        times = {}
+        for line in report.splitlines():
+            fields = [f.strip() for f in line.split('|')]
+            if len(fields) == 3 and fields[1].isdigit():
+                times[fields[2]] = int(fields[1]) / 1e6
+        self.assertIn('libConCoct.concoct', times)
+        self.assertLess(times['libConCoct.concoct'], IMPORT_TIME_BUDGET)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import os
+import tempfile
+import unittest
+
+from libConCoct.report import Report, ReportPart, Message
+from libConCoct.store import ReportStore
+
+
+def create_report(tests):
+    report = Report()
+    report.add_part(ReportPart('compiler', 0, [Message('warning', 'solution.c', 3, 'unused variable')]))
+    report.add_part(ReportPart('unittest', 0, [], tests=tests))
+    return report
+
+
+class ReportStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, 'reports.db')
+        self.store = ReportStore(self.path)
+        self.addCleanup(self.store.close)
+
+    def add_submissions(self):
+        self.store.add('fizzbuzz', 'alice', create_report({'Suite': {'a': False, 'b': True}}), submitted=10)
+        # reports can also be given as JSON
+        self.store.add('fizzbuzz', 'bob', create_report({'Suite': {'a': True, 'b': True}}).to_json(), submitted=20)
+        self.store.add('fizzbuzz', 'alice', create_report({'Suite': {'a': True, 'b': True}}), submitted=30)
+        self.store.add('other', 'carol', create_report({'Other': {'c': False}}), submitted=40)
+
+    def test_add(self):
+        report = create_report({'Suite': {'a': False, 'b': True}})
+        first = self.store.add('fizzbuzz', 'alice', report, submitted=10)
+        second = self.store.add('fizzbuzz', 'bob', report.to_json())
+        self.assertNotEqual(first, second)
+        self.assertEqual(self.store.get_report(first).to_json(), report.to_json())
+        self.assertEqual(self.store.get_report(second).to_json(), report.to_json())
+        self.assertIsNone(self.store.get_report(second + 1))
+        message = self.store.get_report(first).parts[0].messages[0]
+        self.assertEqual((message.type, message.file, message.line), ('warning', 'solution.c', 3))
+
+    def test_add_many(self):
+        entries = [('fizzbuzz', 'alice', create_report({'Suite': {'a': True}}), 10),
+                   ('fizzbuzz', 'bob', create_report({'Suite': {'a': False}}).to_json(), 20)]
+        self.assertEqual(self.store.add_many(entries), 2)
+        self.assertEqual([row['user'] for row in self.store.query_submissions()], ['alice', 'bob'])
+        # all reports are stored in one transaction
+        with self.assertRaises(ValueError):
+            self.store.add_many([('fizzbuzz', 'carol', create_report({'Suite': {'a': True}}), 30),
+                                 ('fizzbuzz', 'dave', 'no JSON', 40)])
+        self.assertEqual(len(self.store.query_submissions()), 2)
+        self.assertEqual(len(self.store.query_tests()), 2)
+
+    def test_query(self):
+        self.add_submissions()
+        rows = self.store.query_submissions(task='fizzbuzz', user='alice')
+        self.assertEqual([row['submitted'] for row in rows], [10, 30])
+        rows = self.store.query_submissions(since=20, until=40)
+        self.assertEqual([row['user'] for row in rows], ['bob', 'alice'])
+        rows = self.store.query_tests(task='fizzbuzz', result=False)
+        self.assertEqual([(row['user'], row['suite'], row['test']) for row in rows], [('alice', 'Suite', 'a')])
+        rows = self.store.query_tests(task='fizzbuzz', test='b', result=True)
+        self.assertEqual([row['submitted'] for row in rows], [10, 20, 30])
+
+    def test_failing_users(self):
+        self.add_submissions()
+        self.store.add('fizzbuzz', 'dave', create_report({'Suite': {'b': False}}), submitted=50)
+        self.assertEqual(self.store.failing_users('fizzbuzz'), ['alice', 'dave'])
+        self.assertEqual(self.store.failing_users('fizzbuzz', test='a'), ['alice'])
+        self.assertEqual(self.store.failing_users('fizzbuzz', suite='Other'), [])
+        self.assertEqual(self.store.failing_users('other'), ['carol'])
+
+    def test_iter_reports(self):
+        self.add_submissions()
+        reports = []
+        for data, info in self.store.iter_reports(task='fizzbuzz'):
+            # other queries are possible while iterating
+            self.assertIsNotNone(self.store.get_report(info['id']))
+            reports.append((Report.from_json(data), info))
+        self.assertEqual([(info['user'], info['submitted']) for _, info in reports],
+                         [('alice', 10), ('bob', 20), ('alice', 30)])
+        self.assertEqual(reports[0][0].parts[1].tests, {'Suite': {'a': False, 'b': True}})
+        self.assertEqual(list(self.store.iter_reports(user='carol', since=50)), [])
+
+    def test_shared_database(self):
+        self.add_submissions()
+        with ReportStore(self.path) as other:
+            other.add('fizzbuzz', 'erin', create_report({'Suite': {'a': False}}), submitted=60)
+            self.assertEqual(len(other.query_submissions()), 5)
+        self.assertEqual(self.store.failing_users('fizzbuzz', test='a'), ['alice', 'erin'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+import gzip
+import hashlib
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest import mock
+
+from libConCoct.transfer import strip_executable, file_digest, gzip_stream, gzip_file
+from libConCoct.unittest import VMRunner
+
+
+class TransferTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def create_file(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'wb') as fd:
+            fd.write(content)
+        return path
+
+    def test_file_digest(self):
+        content = os.urandom(10000)
+        path = self.create_file('data', content)
+        self.assertEqual(file_digest(path, chunk_size=1000), hashlib.sha256(content).hexdigest())
+        self.assertEqual(file_digest(self.create_file('empty', b'')), hashlib.sha256(b'').hexdigest())
+
+    def test_gzip(self):
+        content = os.urandom(1000) + b'\0' * 100000
+        chunks = [content[i:i + 4096] for i in range(0, len(content), 4096)]
+        compressed = b''.join(gzip_stream(chunks, level=1))
+        self.assertEqual(gzip.decompress(compressed), content)
+        self.assertLess(len(compressed), len(content) // 10)
+        self.assertEqual(gzip.decompress(b''.join(gzip_stream([]))), b'')
+        path = self.create_file('data', content)
+        self.assertEqual(gzip.decompress(b''.join(gzip_file(path, chunk_size=1000))), content)
+
+    @unittest.skipIf(shutil.which('gcc') is None or shutil.which('strip') is None, 'gcc or strip not found')
+    def test_strip_executable(self):
+        source = self.create_file('main.c', b'#include <stdio.h>\nint main(void) { puts("ok"); return 0; }\n')
+        executable = os.path.join(self.directory.name, 'main')
+        subprocess.check_call(['gcc', '-g', '-o', executable, source])
+        size = os.path.getsize(executable)
+        stripped = strip_executable(executable)
+        self.assertEqual(stripped, executable + '.stripped')
+        self.assertLess(os.path.getsize(stripped), size)
+        # the original executable keeps its debug information
+        self.assertEqual(os.path.getsize(executable), size)
+        self.assertEqual(subprocess.check_output([stripped]), b'ok\n')
+
+    def test_strip_failed(self):
+        path = self.create_file('data', b'no executable')
+        self.assertEqual(strip_executable(path), path)
+        with mock.patch('libConCoct.transfer.subprocess.call', side_effect=FileNotFoundError()):
+            self.assertEqual(strip_executable(path), path)
+
+
+class FakeStream(object):
+    def __init__(self, data, returncode):
+        self.data = data
+        self.channel = mock.Mock()
+        self.channel.recv_exit_status.return_value = returncode
+
+    def read(self):
+        return self.data
+
+
+class FakeSSHClient(object):
+    """
+    Runs all commands with the local shell, the remote machine is the local
+    file system.
+    """
+    def __init__(self, failing=None):
+        self.failing = failing
+        self.commands = []
+
+    def exec_command(self, command):
+        self.commands.append(command)
+        if self.failing and self.failing in command:
+            return None, FakeStream(b'', 1), FakeStream(b'failed', 1)
+        proc = subprocess.run(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        return None, FakeStream(proc.stdout, proc.returncode), FakeStream(proc.stderr, proc.returncode)
+
+
+class FakeRemoteFile(io.FileIO):
+    def set_pipelined(self, pipelined):
+        pass
+
+
+class FakeSFTPClient(object):
+    def __init__(self):
+        self.uploads = []
+
+    def open(self, path, mode):
+        self.uploads.append(path)
+        return FakeRemoteFile(path, mode.replace('b', ''))
+
+
+class UploadExecutableTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.runner = VMRunner()
+        self.runner.cache_path = os.path.join(self.directory.name, 'cache')
+        self.run_path = os.path.join(self.directory.name, 'run')
+        os.makedirs(self.run_path)
+        self.content = b'\x7fELF' + os.urandom(1000) + b'\0' * 10000
+        self.executable = os.path.join(self.directory.name, 'test')
+        with open(self.executable, 'wb') as fd:
+            fd.write(self.content)
+        self.digest = hashlib.sha256(self.content).hexdigest()
+
+    def upload(self, name, client=None):
+        client = client or FakeSSHClient()
+        sftp = FakeSFTPClient()
+        remote_file = os.path.join(self.run_path, name)
+        self.runner.upload_executable(client, sftp, self.executable, remote_file)
+        return sftp.uploads, remote_file
+
+    def read(self, path):
+        with open(path, 'rb') as fd:
+            return fd.read()
+
+    def test_cache_miss_and_hit(self):
+        uploads, remote_file = self.upload('first')
+        self.assertEqual(uploads, [remote_file + '.gz'])
+        self.assertEqual(self.read(remote_file), self.content)
+        self.assertTrue(os.access(remote_file, os.X_OK))
+        self.assertEqual(os.listdir(self.run_path), ['first'])
+        self.assertEqual(os.listdir(self.runner.cache_path), [self.digest])
+        uploads, remote_file = self.upload('second')
+        self.assertEqual(uploads, [])
+        self.assertEqual(self.read(remote_file), self.content)
+
+    def test_changed_cache(self):
+        self.upload('first')
+        # an executable in the cache changed by a unit test is not used
+        cached_file = os.path.join(self.runner.cache_path, self.digest)
+        with open(cached_file, 'wb') as fd:
+            fd.write(b'changed')
+        uploads, remote_file = self.upload('second')
+        self.assertEqual(uploads, [remote_file + '.gz'])
+        self.assertEqual(self.read(remote_file), self.content)
+        self.assertEqual(self.read(cached_file), self.content)
+
+    def test_unpack_failed(self):
+        with self.assertRaises(OSError):
+            self.upload('first', FakeSSHClient(failing='gzip -dc'))
+
+
+if __name__ == '__main__':
+    unittest.main()
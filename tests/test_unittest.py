@@ -0,0 +1,136 @@
+import unittest
+
+from libConCoct.output import DEFAULT_OUTPUT_LIMIT
+from libConCoct.unittest import CunitChecker, CunitStreamParser
+
+
+RESULTS = b"""<?xml version="1.0" ?>
+<CUNIT_TEST_RUN_REPORT>
+  <CUNIT_HEADER/>
+  <CUNIT_RESULT_LISTING>
+    <CUNIT_RUN_SUITE>
+      <CUNIT_RUN_SUITE_SUCCESS>
+        <SUITE_NAME> Suite </SUITE_NAME>
+        <CUNIT_RUN_TEST_RECORD>
+          <CUNIT_RUN_TEST_SUCCESS>
+            <TEST_NAME> test_one </TEST_NAME>
+          </CUNIT_RUN_TEST_SUCCESS>
+        </CUNIT_RUN_TEST_RECORD>
+      </CUNIT_RUN_SUITE_SUCCESS>
+    </CUNIT_RUN_SUITE>
+  </CUNIT_RESULT_LISTING>
+</CUNIT_TEST_RUN_REPORT>
+"""
+
+
+class FakeProject(object):
+    stream_results = False
+
+
+class FakeRunner(object):
+    """
+    Passes the given results to the parser like a runner after a clean exit.
+    """
+    def __init__(self, data):
+        self.data = data
+        self.output_limit = DEFAULT_OUTPUT_LIMIT
+        self.truncated = None
+        self.stats = None
+
+    def run(self, project, consume=None):
+        return 0, consume(self.data)
+
+
+class FakeStreamProject(object):
+    stream_results = True
+
+
+class FakeStreamRunner(FakeRunner):
+    """
+    Feeds the given output to the stream parser like a runner after a clean
+    exit, "{token}" is replaced by the token of the parser.
+    """
+    def run(self, project, consume=None, stream=None):
+        stream.feed(self.data.format(token=stream.token).encode('utf-8'))
+        return 0, None
+
+
+class CunitCheckerTest(unittest.TestCase):
+    def test_complete_results(self):
+        checker = CunitChecker('docker', runner=FakeRunner(RESULTS))
+        part = checker.run(FakeProject())
+        self.assertEqual(part.returncode, 0)
+        self.assertEqual(part.tests, {' Suite ': {' test_one ': True}})
+
+    def test_truncated_results(self):
+        checker = CunitChecker('docker', runner=FakeRunner(RESULTS[:len(RESULTS) // 2]))
+        part = checker.run(FakeProject())
+        self.assertEqual(part.returncode, -1)
+        self.assertEqual(part.messages, [])
+
+
+class CunitStreamParserTest(unittest.TestCase):
+    def setUp(self):
+        self.failures = []
+        self.parser = CunitStreamParser(on_failure=self.failures.append)
+
+    def record(self, name, result='success', token=None):
+        line = '\n\x1eCUNIT {} <test suite="Suite" name="{}" result="{}" file="test.c" line="7" ' \
+               'condition="x &lt; 3"/>\n'
+        return line.format(token or self.parser.token, name, result).encode('utf-8')
+
+    def end(self):
+        return '\x1eCUNIT {} <end/>\n'.format(self.parser.token).encode('utf-8')
+
+    def test_records_split_across_chunks(self):
+        data = b'output of the tests\n' + self.record('one') + self.record('two', 'failure') + self.end()
+        for i in range(0, len(data), 5):
+            self.parser.feed(data[i:i + 5])
+        self.assertTrue(self.parser.complete)
+        self.assertEqual(dict(self.parser.list_of_tests), {'Suite': {'one': True, 'two': False}})
+        self.assertEqual(len(self.failures), 1)
+        self.assertEqual(self.failures[0].desc, 'Suite - two - Condition: x < 3')
+        self.assertEqual(self.failures[0].line, '7')
+
+    def test_wrong_or_missing_token(self):
+        self.parser.feed(self.record('wrong', token='0' * 32))
+        self.parser.feed(b'\x1eCUNIT <test suite="Suite" name="missing" result="success"/>\n')
+        self.parser.feed(b'<test suite="Suite" name="plain" result="success"/>\n')
+        self.parser.feed('\x1eCUNIT {} <end/>\n'.format('0' * 32).encode('utf-8'))
+        self.assertEqual(dict(self.parser.list_of_tests), {})
+        self.assertFalse(self.parser.complete)
+
+    def test_overlong_lines(self):
+        # output without newline must not be kept in memory
+        for _ in range(100):
+            self.parser.feed(b'x' * 10000)
+        self.assertLessEqual(len(self.parser.pending), len(self.parser.prefix))
+        # a result that never ends is dropped, the next line is parsed
+        self.parser.feed(self.record('long')[:-3])
+        for _ in range(10):
+            self.parser.feed(b'x' * 10000)
+        self.assertLessEqual(len(self.parser.pending), self.parser.max_line)
+        self.parser.feed(b'\n' + self.record('next') + self.end())
+        self.assertEqual(dict(self.parser.list_of_tests), {'Suite': {'next': True}})
+        self.assertTrue(self.parser.complete)
+
+    def test_invalid_record(self):
+        self.parser.feed('\x1eCUNIT {} <test name="broken\n'.format(self.parser.token).encode('utf-8'))
+        self.parser.feed(self.record('one'))
+        self.assertEqual(dict(self.parser.list_of_tests), {'Suite': {'one': True}})
+
+    def test_stream_without_end(self):
+        self.parser.feed(self.record('one') + self.record('two', 'failure'))
+        self.assertFalse(self.parser.complete)
+        record = '\x1eCUNIT {token} <test suite="Suite" name="one" result="success"/>\n'
+        part = CunitChecker('docker', runner=FakeStreamRunner(record)).run(FakeStreamProject())
+        self.assertEqual(part.returncode, -1)
+        self.assertEqual(part.messages, [])
+        part = CunitChecker('docker', runner=FakeStreamRunner(record + '\x1eCUNIT {token} <end/>\n')).run(
+            FakeStreamProject())
+        self.assertEqual(part.returncode, 0)
+        self.assertEqual(part.tests, {'Suite': {'one': True}})
+
+
+if __name__ == '__main__':
+    unittest.main()